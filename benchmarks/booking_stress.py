@@ -0,0 +1,165 @@
+"""
+Нагрузочная проверка записи на тренировку: сотни клиентов одновременно
+записываются на одну тренировку с ограниченным числом мест.
+
+Скрипт создаёт в базе из DATABASE_URL временную тренировку и клиентов,
+запускает параллельные записи через services.booking, затем параллельно
+отменяет часть подтверждённых записей и проверяет, что:
+  * подтверждённых записей ровно столько, сколько мест;
+  * остальные клиенты в листе ожидания, ошибок нет;
+  * освободившиеся места заняты первыми из очереди;
+  * счётчики на тренировке совпадают с таблицей участников.
+Созданные данные удаляются в конце. Код возврата 1 — инвариант нарушен.
+
+Запуск:
+    python benchmarks/booking_stress.py --clients 300 --capacity 20 --workers 64
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, models, reports
+from services import booking
+from services.utils import generate_id
+
+from login_load import percentile
+
+
+def create_fixture(clients: int, capacity: int):
+    db = SessionLocal()
+    try:
+        section = db.query(models.Section).first()
+        if section is None:
+            raise SystemExit("В базе нет ни одной секции: сначала запустите setup_database.py")
+        training = models.Training(
+            id=generate_id(), name="Нагрузочный тест записи", section_id=section.id,
+            start_time=datetime.now() + timedelta(days=1), end_time=datetime.now() + timedelta(days=1, hours=1),
+            is_group=True, max_participants=capacity
+        )
+        client_ids = [generate_id() for _ in range(clients)]
+        db.add(training)
+        db.add_all(
+            models.Client(id=client_id, last_name="Нагрузка", first_name=str(i), reg_date=datetime.now().date())
+            for i, client_id in enumerate(client_ids)
+        )
+        db.commit()
+        return training.id, client_ids
+    finally:
+        db.close()
+
+def drop_fixture(training_id, client_ids):
+    db = SessionLocal()
+    try:
+        # Пакетные DELETE идут в обход событий ORM — тренировка вычитается из агрегата посещаемости явно.
+        reports.shift_trainings(db, models.Training.id == training_id, -1)
+        db.query(models.TrainingParticipant).filter_by(training_id=training_id).delete()
+        db.query(models.Training).filter_by(id=training_id).delete()
+        db.query(models.Client).filter(models.Client.id.in_(client_ids)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def run_parallel(action, training_id, client_ids, workers):
+    """Выполняет action(db, training_id, client_id) для всех клиентов одновременно."""
+    barrier = threading.Barrier(min(workers, len(client_ids)))
+    results, latencies, errors = {}, [], []
+
+    def one(client_id):
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        db = SessionLocal()
+        started = time.perf_counter()
+        try:
+            results[client_id] = action(db, training_id, client_id)
+        except Exception as e:
+            errors.append(f"{client_id}: {type(e).__name__}: {e}")
+        finally:
+            latencies.append(time.perf_counter() - started)
+            db.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, client_ids))
+    return results, errors, latencies, time.perf_counter() - started
+
+def participants(training_id):
+    db = SessionLocal()
+    try:
+        return db.query(models.TrainingParticipant).filter_by(training_id=training_id).all()
+    finally:
+        db.close()
+
+def check_counters(training_id, rows, failures):
+    db = SessionLocal()
+    try:
+        training = db.get(models.Training, training_id)
+        actual = (training.confirmed_count, training.waitlisted_count)
+    finally:
+        db.close()
+    expected = (sum(p.status_name == booking.CONFIRMED for p in rows), sum(p.status_name == booking.WAITLISTED for p in rows))
+    if actual != expected:
+        failures.append(f"счётчики тренировки {actual} не совпадают с записями {expected}")
+
+def report(title, latencies, elapsed):
+    ms = [v * 1000 for v in latencies]
+    print(f"{title}: {len(ms)} операций за {elapsed:.2f} с; "
+          f"p50 {percentile(ms, 50):.1f} мс, p95 {percentile(ms, 95):.1f} мс, p99 {percentile(ms, 99):.1f} мс")
+
+def main(args):
+    training_id, client_ids = create_fixture(args.clients, args.capacity)
+    failures = []
+    try:
+        results, errors, latencies, elapsed = run_parallel(booking.book, training_id, client_ids, args.workers)
+        report("Запись", latencies, elapsed)
+        failures += errors
+        rows = participants(training_id)
+        confirmed = [p for p in rows if p.status_name == booking.CONFIRMED]
+        waitlisted = sorted((p for p in rows if p.status_name == booking.WAITLISTED),
+                            key=lambda p: (p.booked_at, p.client_id))
+        expected_confirmed = min(args.capacity, args.clients)
+        if len(confirmed) != expected_confirmed:
+            failures.append(f"подтверждено {len(confirmed)} записей при {args.capacity} местах")
+        if len(waitlisted) != args.clients - expected_confirmed:
+            failures.append(f"в листе ожидания {len(waitlisted)}, ожидалось {args.clients - expected_confirmed}")
+        if list(results.values()).count(booking.CONFIRMED) != len(confirmed):
+            failures.append("ответы book() не совпадают с состоянием базы")
+        check_counters(training_id, rows, failures)
+
+        to_cancel = [p.client_id for p in confirmed[:args.cancel]]
+        promoted_lists, errors, latencies, elapsed = run_parallel(booking.cancel, training_id, to_cancel, args.workers)
+        report("Отмена", latencies, elapsed)
+        failures += errors
+        promoted = {client_id for ids in promoted_lists.values() for client_id in ids}
+        expected_promoted = {p.client_id for p in waitlisted[:len(to_cancel)]}
+        rows = participants(training_id)
+        confirmed_after = sum(p.status_name == booking.CONFIRMED for p in rows)
+        if confirmed_after != expected_confirmed:
+            failures.append(f"после отмен подтверждено {confirmed_after}, ожидалось {expected_confirmed}")
+        if promoted != expected_promoted:
+            failures.append("из листа ожидания переведены не первые по очереди клиенты")
+        check_counters(training_id, rows, failures)
+    finally:
+        drop_fixture(training_id, client_ids)
+
+    if failures:
+        print("ОШИБКИ:")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"OK: мест {args.capacity}, клиентов {args.clients}, отменено {args.cancel}, инварианты соблюдены")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--cancel", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=64)
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+"""
+Регрессионная проверка планов запросов дашбордов.
+
+Скрипт открывает дашборды и JSON-API всех ролей через TestClient, перехватывает
+все SELECT, которые они выполняют, и прогоняет каждый через EXPLAIN (FORMAT JSON).
+Если в плане есть Seq Scan по таблице, в которой больше --min-rows строк,
+проверка считается проваленной (код возврата 1).
+
+Нужна база Postgres из DATABASE_URL, заполненная большим объёмом данных
+(маленькие таблицы планировщик законно читает целиком). Статистика
+обновляется командой ANALYZE перед проверкой.
+
+Запуск:
+    python benchmarks/explain_check.py --min-rows 1000
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.chdir(PROJECT_ROOT)  # main.py подключает static/ и templates/ по относительным путям
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database import engine
+from main import app
+
+# (роль, пароль, страницы); логины — из начальных данных setup_database.py.
+SCENARIOS = [
+    ("admin", "admin123", [
+        "/admin/dashboard",
+        "/admin/api/clients", "/admin/api/clients?sort=reg_date", "/admin/api/clients?sort=first_name&desc=true",
+        "/admin/api/staff", "/admin/api/staff?sort=hire_date",
+        "/admin/api/sections", "/admin/api/subscription_types",
+        "/admin/api/client_subscriptions", "/admin/api/client_subscriptions?status_name=active",
+        "/admin/api/trainings", "/admin/api/trainings?is_group=true", "/admin/api/trainings?sort=name",
+    ]),
+    ("manager", "manager123", ["/manager/dashboard", "/manager/api/clients/search?q=Иванов Иван"]),
+    ("cashier", "cashier123", [
+        "/cashier/dashboard",
+        # Поиск клиента: префикс фамилии, ФИО, опечатка, цифры телефона.
+        "/cashier/api/clients/search?q=Ив", "/cashier/api/clients/search?q=Петров Анна",
+        "/cashier/api/clients/search?q=Кузнецоф", "/cashier/api/clients/search?q=912 34",
+    ]),
+    ("trainer", "trainer123", ["/trainer/dashboard"]),
+    ("client1", "client123", ["/client/dashboard"]),
+    ("tech_admin", "tech123", ["/tech_admin/dashboard"]),
+]
+
+# Осознанные полные чтения: страница, таблица → причина.
+ALLOWED_SEQ_SCANS = {
+    ("/tech_admin/dashboard", "equipment"): "полный перечень оборудования",
+}
+
+
+def capture_queries():
+    """Обходит страницы и возвращает {(страница, SQL): параметры} для всех SELECT."""
+    captured = {}
+    current = {"path": None}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current["path"] and statement.lstrip().upper().startswith("SELECT"):
+            captured.setdefault((current["path"], statement), parameters)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for username, password, paths in SCENARIOS:
+            with TestClient(app) as client:
+                client.post("/login", data={"username": username, "password": password}, follow_redirects=False)
+                if "access_token" not in client.cookies:
+                    raise SystemExit(f"Не удалось войти как {username}")
+                for path in paths:
+                    current["path"] = path
+                    response = client.get(path)
+                    current["path"] = None
+                    if response.status_code != 200:
+                        raise SystemExit(f"{path}: HTTP {response.status_code}")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+def seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+def main(args):
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Проверка планов поддерживается только для Postgres")
+    captured = capture_queries()
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if args.analyze:
+            cursor.execute("ANALYZE")
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+        table_rows = dict(cursor.fetchall())
+
+        problems = defaultdict(set)
+        for (path, statement), parameters in captured.items():
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            for table in seq_scans(plan):
+                if table_rows.get(table, 0) >= args.min_rows and (path, table) not in ALLOWED_SEQ_SCANS:
+                    problems[(path, table)].add(" ".join(statement.split())[:args.sql_width])
+        connection.rollback()
+    finally:
+        connection.close()
+
+    print(f"Проверено запросов: {len(captured)} на {len({path for path, _ in captured})} страницах")
+    if not problems:
+        print(f"OK: нет последовательных сканирований таблиц больше {args.min_rows} строк")
+        return
+    print("Последовательные сканирования:")
+    for (path, table), statements in sorted(problems.items()):
+        print(f"  {path}: {table} (~{int(table_rows[table])} строк)")
+        for statement in sorted(statements):
+            print(f"      {statement}")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-rows", type=int, default=1000)
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false")
+    parser.add_argument("--sql-width", type=int, default=160)
+    main(parser.parse_args())
@@ -0,0 +1,298 @@
+"""
+Генератор синтетических данных в объёмах реального клуба.
+
+По умолчанию добавляет к базе из DATABASE_URL 100 тыс. клиентов (с телефонами),
+1 млн проданных абонементов с платежами, 60 залов-секций, 200 тыс. тренировок с
+участниками (без пересечений по тренеру и секции — их запрещают ограничения
+services/schedule.py) и
+пользователей для нагрузочного теста (load_client_N / load_trainer_N, пароль
+load123). Данные вставляются пакетами через crud.bulk_insert (COPY на Postgres),
+каждый пакет — отдельная транзакция, поэтому память не растёт с объёмом; в конце
+пересчитываются отчётные агрегаты (database/reports.py).
+Генерация детерминирована: одинаковый --seed даёт одинаковые данные, а префикс
+идентификаторов зависит от seed, так что разные seed можно загружать в одну базу.
+
+Нужна база, подготовленная setup_database.py (справочники, секции, типы абонементов).
+
+Запуск:
+    python benchmarks/generate_data.py                 # полный объём
+    python benchmarks/generate_data.py --scale 0.01    # быстрый прогон, 1% объёма
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from database import SessionLocal, crud, models, reports
+from services.auth import get_password_hash
+
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+              "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров"]
+FIRST_NAMES = ["Александр", "Мария", "Дмитрий", "Анна", "Максим", "Елена", "Сергей", "Ольга",
+               "Андрей", "Татьяна", "Алексей", "Наталья", "Иван", "Ирина", "Михаил", "Екатерина"]
+TRAINING_NAMES = ["Йога", "Пилатес", "Кроссфит", "Функциональный тренинг", "Аквааэробика",
+                  "Стретчинг", "Бокс", "Персональная тренировка", "Силовая тренировка", "Сайкл"]
+LOAD_PASSWORD = "load123"
+SCHEDULE_DAYS_BACK, SCHEDULE_DAYS_AHEAD = 365, 90
+# Шаг обхода часов расписания, взаимно простой с их числом: часы заполняются вразброс, а не подряд.
+SLOT_STRIDE = 7919
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.prefix = f"g{args.seed}"
+        self.today = date.today()
+        self.now = datetime.now().replace(second=0, microsecond=0)
+
+    def flush(self, db, model, rows):
+        crud.bulk_insert(db, model, rows)
+        rows.clear()
+
+    def batches(self, total, make_rows):
+        """Вызывает make_rows(db, start, stop) пакетами по --batch-size с фиксацией каждого пакета."""
+        started = time.perf_counter()
+        for start in range(0, total, self.args.batch_size):
+            stop = min(start + self.args.batch_size, total)
+            db = SessionLocal()
+            try:
+                make_rows(db, start, stop)
+                db.commit()
+            finally:
+                db.close()
+            rate = stop / max(time.perf_counter() - started, 1e-9)
+            print(f"\r  {stop}/{total} ({rate:,.0f} в секунду)", end="", flush=True)
+        print()
+
+    def client_id(self, i):
+        return f"{self.prefix}c{i}"
+
+    def load_references(self):
+        db = SessionLocal()
+        try:
+            self.subscription_types = [(t.id, t.cost) for t in db.query(models.SubscriptionType)]
+            self.section_ids = [s.id for s in db.query(models.Section)]
+            self.methods = [m.id for m in db.query(models.PaymentMethod)]
+            if not (self.subscription_types and self.section_ids and self.methods):
+                raise SystemExit("Справочники пусты: сначала запустите setup_database.py")
+        finally:
+            db.close()
+
+    def clients(self, db, start, stop):
+        clients, contacts = [], []
+        for i in range(start, stop):
+            clients.append({
+                "id": self.client_id(i),
+                "last_name": self.rng.choice(LAST_NAMES),
+                "first_name": self.rng.choice(FIRST_NAMES),
+                "middle_name": None,
+                "reg_date": self.today - timedelta(days=self.rng.randint(0, 5 * 365)),
+                "discount": Decimal(self.rng.choice((0, 0, 0, 5, 10, 15))),
+            })
+            contacts.append({"client_id": self.client_id(i), "contact_type": "phone",
+                             "contact_value": f"+79{self.rng.randint(0, 999_999_999):09d}"})
+        self.flush(db, models.Client, clients)
+        self.flush(db, models.ClientContact, contacts)
+
+    def trainers(self, db, start, stop):
+        staff = []
+        for i in range(start, stop):
+            staff.append({
+                "id": f"{self.prefix}s{i}",
+                "last_name": self.rng.choice(LAST_NAMES), "first_name": self.rng.choice(FIRST_NAMES),
+                "birth_date": date(1970, 1, 1) + timedelta(days=self.rng.randint(0, 30 * 365)),
+                "gender": self.rng.choice("МЖ"),
+                # Префиксы 7/8 не пересекаются с начальными данными setup_database.py.
+                "inn": f"7{self.args.seed % 1000:03d}{i:08d}", "snils": f"8{self.args.seed % 100:02d}{i:08d}",
+                "hire_date": self.today - timedelta(days=self.rng.randint(30, 3000)),
+                "position_id": "pos_trainer", "salary": Decimal(self.rng.randint(60, 100) * 1000),
+            })
+        self.flush(db, models.Staff, staff)
+
+    def sections(self, db, start, stop):
+        self.flush(db, models.Section, [
+            {"id": f"{self.prefix}sec{i}", "name": f"Зал {i + 1}", "status_name": "active"}
+            for i in range(start, stop)
+        ])
+
+    def busy_hours(self, db):
+        """Часы, уже занятые тренерами и секциями в базе (начальные данные, прежние запуски)."""
+        busy = set()
+        rows = db.query(models.Training.trainer_id, models.Training.section_id,
+                        models.Training.start_time, models.Training.end_time)
+        for trainer_id, section_id, start_time, end_time in rows:
+            hour = start_time.replace(minute=0, second=0, microsecond=0)
+            while hour < end_time:
+                busy.update({("trainer", trainer_id, hour), ("section", section_id, hour)})
+                hour += timedelta(hours=1)
+        return busy
+
+    def schedule_slots(self, busy):
+        """
+        Бесконечный поток часовых слотов (начало, тренер, секция) без пересечений: в каждом
+        часе до min(тренеров, секций) тренировок, тренеры и секции внутри часа разные.
+        """
+        base = (self.now - timedelta(days=SCHEDULE_DAYS_BACK)).replace(minute=0)
+        total_hours = (SCHEDULE_DAYS_BACK + SCHEDULE_DAYS_AHEAD) * 24
+        per_hour = min(len(self.trainer_ids), len(self.section_ids))
+        h = 0
+        while True:
+            # После заполнения всего диапазона слоты уходят дальше в будущее.
+            start_time = base + timedelta(hours=(h * SLOT_STRIDE) % total_hours + h // total_hours * total_hours)
+            for j in range(per_hour):
+                trainer_id = self.trainer_ids[(h * per_hour + j) % len(self.trainer_ids)]
+                section_id = self.section_ids[(h + j) % len(self.section_ids)]
+                if ("trainer", trainer_id, start_time) in busy or ("section", section_id, start_time) in busy:
+                    continue
+                yield start_time, trainer_id, section_id
+            h += 1
+
+    def payments(self, db, start, stop):
+        subscriptions, payments = [], []
+        for i in range(start, stop):
+            subscription_type_id, cost = self.rng.choice(self.subscription_types)
+            start_date = self.today - timedelta(days=self.rng.randint(-30, 3 * 365))
+            end_date = start_date + timedelta(days=30)
+            status_name = "pending" if start_date > self.today else "expired" if end_date < self.today else "active"
+            subscription_id = f"{self.prefix}cs{i}"
+            subscriptions.append({
+                "id": subscription_id, "client_id": self.client_id(self.rng.randrange(self.clients_total)),
+                "subscription_type_id": subscription_type_id,
+                "start_date": start_date, "end_date": end_date, "status_name": status_name,
+            })
+            payments.append({
+                "id": f"{self.prefix}p{i}", "client_subscription_id": subscription_id,
+                "amount": crud.discounted_price(cost, self.rng.choice((0, 0, 5, 10))),
+                "date": min(start_date, self.today), "method_id": self.rng.choice(self.methods),
+            })
+        self.flush(db, models.ClientSubscription, subscriptions)
+        self.flush(db, models.Payment, payments)
+
+    def trainings(self, db, start, stop):
+        trainings, participants, access = [], [], []
+        for i in range(start, stop):
+            training_id = f"{self.prefix}t{i}"
+            start_time, trainer_id, section_id = next(self.slots)
+            is_group = self.rng.random() < 0.8
+            max_participants = self.rng.randint(5, 20) if is_group else 1
+            past = start_time < self.now
+            confirmed = self.rng.randint(0, max_participants) if is_group else 1
+            waitlisted = self.rng.randint(0, 3) if is_group and not past and confirmed == max_participants else 0
+            client_numbers = self.rng.sample(range(self.clients_total), confirmed + waitlisted)
+            for n, client_number in enumerate(client_numbers):
+                participants.append({
+                    "training_id": training_id, "client_id": self.client_id(client_number),
+                    "status_name": "confirmed" if n < confirmed else "waitlisted",
+                    "booked_at": start_time - timedelta(days=2) + timedelta(minutes=n),
+                })
+            if is_group:
+                for subscription_type_id, _ in self.rng.sample(self.subscription_types,
+                                                               self.rng.randint(1, len(self.subscription_types))):
+                    access.append({"training_id": training_id, "subscription_type_id": subscription_type_id})
+            trainings.append({
+                "id": training_id, "name": self.rng.choice(TRAINING_NAMES),
+                "section_id": section_id, "trainer_id": trainer_id,
+                "start_time": start_time, "end_time": start_time + timedelta(hours=1),
+                "is_group": is_group, "max_participants": max_participants,
+                # bulk_insert идёт в обход ORM-событий, поэтому счётчики заполняются сразу.
+                "confirmed_count": confirmed, "waitlisted_count": waitlisted,
+            })
+        self.flush(db, models.Training, trainings)
+        crud.bulk_insert(db, models.training_subscription_access, access)
+        self.flush(db, models.TrainingParticipant, participants)
+
+    def load_users(self, db):
+        """Пользователи для benchmarks/load_test.py: клиенты с активным абонементом и тренеры."""
+        hashed_password = get_password_hash(LOAD_PASSWORD)
+        full_access_type = self.subscription_types[0][0]
+        users, subscriptions = [], []
+        for i in range(self.args.load_users):
+            client_id = self.client_id(i)
+            users.append({"id": f"{self.prefix}uc{i}", "username": f"load_client_{self.args.seed}_{i}",
+                          "password": hashed_password, "role": "client", "client_id": client_id, "staff_id": None})
+            subscriptions.append({"id": f"{self.prefix}lcs{i}", "client_id": client_id,
+                                  "subscription_type_id": full_access_type, "status_name": "active",
+                                  "start_date": self.today - timedelta(days=1),
+                                  "end_date": self.today + timedelta(days=365)})
+        for i, staff_id in enumerate(self.generated_trainer_ids[:self.args.load_users]):
+            users.append({"id": f"{self.prefix}ut{i}", "username": f"load_trainer_{self.args.seed}_{i}",
+                          "password": hashed_password, "role": "trainer", "client_id": None, "staff_id": staff_id})
+        crud.bulk_insert(db, models.User, users)
+        crud.bulk_insert(db, models.ClientSubscription, subscriptions)
+
+    def run(self):
+        args = self.args
+        self.load_references()
+        self.clients_total = int(args.clients * args.scale)
+        trainers_total = max(1, int(args.trainers * args.scale))
+        payments_total = int(args.payments * args.scale)
+        trainings_total = int(args.trainings * args.scale)
+        sections_total = max(1, int(args.sections * args.scale))
+
+        print(f"Клиенты: {self.clients_total}")
+        self.batches(self.clients_total, self.clients)
+        print(f"Тренеры: {trainers_total}")
+        self.batches(trainers_total, self.trainers)
+        self.generated_trainer_ids = [f"{self.prefix}s{i}" for i in range(trainers_total)]
+
+        db = SessionLocal()
+        try:
+            # В расписание попадают и тренеры из начальных данных, чтобы их дашборды тоже были наполнены.
+            existing = [s.id for s in db.query(models.Staff.id).filter(
+                models.Staff.position_id == "pos_trainer", ~models.Staff.id.in_(self.generated_trainer_ids))]
+            self.trainer_ids = self.generated_trainer_ids + existing
+            self.load_users(db)
+            db.commit()
+        finally:
+            db.close()
+
+        print(f"Абонементы и платежи: {payments_total}")
+        self.batches(payments_total, self.payments)
+        print(f"Залы: {sections_total}")
+        self.batches(sections_total, self.sections)
+        self.section_ids += [f"{self.prefix}sec{i}" for i in range(sections_total)]
+        print(f"Тренировки: {trainings_total}")
+        db = SessionLocal()
+        try:
+            self.slots = self.schedule_slots(self.busy_hours(db))
+        finally:
+            db.close()
+        self.batches(trainings_total, self.trainings)
+
+        db = SessionLocal()
+        try:
+            print("Отчётные агрегаты...")
+            reports.rebuild(db)
+            db.commit()
+            if db.get_bind().dialect.name == "postgresql":
+                print("ANALYZE...")
+                db.execute(text("ANALYZE"))
+                db.commit()
+        finally:
+            db.close()
+        print(f"Готово. Пользователи для нагрузки: load_client_{args.seed}_N и "
+              f"load_trainer_{args.seed}_N, пароль {LOAD_PASSWORD}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель всех объёмов")
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--trainers", type=int, default=300)
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--sections", type=int, default=60, help="залы: секция не может вести две тренировки сразу")
+    parser.add_argument("--trainings", type=int, default=200_000)
+    parser.add_argument("--load-users", type=int, default=50, help="сколько клиентов и тренеров получат логины")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    if args.load_users > int(args.clients * args.scale):
+        parser.error("--load-users больше числа клиентов")
+    Generator(args).run()
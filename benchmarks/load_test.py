@@ -0,0 +1,264 @@
+"""
+Нагрузочный тест всех ролей: виртуальные пользователи параллельно открывают
+дашборды и выполняют операции записи, а скрипт сводит задержки p50/p95/p99 и
+число SQL-запросов на запрос по каждой операции.
+
+По умолчанию приложение запускается в этом же процессе (httpx.ASGITransport),
+с --base-url нагрузка идёт на внешний сервер. Число SQL-запросов берётся из
+заголовка X-DB-Query-Count (services/sql_profiler.py). С --query-budget N скрипт
+завершается с кодом 1, если хоть один запрос выполнил больше N выражений.
+
+Все виртуальные пользователи входят с одного адреса, а у ролей персонала общие
+логины, поэтому ограничение попыток входа (services/rate_limit.py) отклонило бы
+большую часть логинов. При запуске приложения в этом процессе скрипт поднимает
+лимиты через LOGIN_IP_BURST и LOGIN_USER_BURST (если они не заданы явно); внешний
+сервер для --base-url нужно запускать с такими же переменными окружения.
+
+Сначала наполните базу: python benchmarks/generate_data.py --scale 0.1
+Пользователи load_client_* / load_trainer_* (пароль load123) берутся из базы,
+остальные роли — из начальных данных setup_database.py.
+
+Запуск (нужны зависимости из requirements-dev.txt):
+    python benchmarks/load_test.py --users 50 --duration 60
+    LOGIN_IP_BURST=100000 LOGIN_USER_BURST=100000 uvicorn main:app
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --mix client=70,cashier=30
+    python benchmarks/load_test.py --users 10 --duration 20 --query-budget 15
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.chdir(PROJECT_ROOT)  # main.py подключает static/ и templates/ по относительным путям
+# Лимиты читаются при импорте services.rate_limit — задаём их до импорта приложения.
+os.environ.setdefault("LOGIN_IP_BURST", "100000")
+os.environ.setdefault("LOGIN_USER_BURST", "100000")
+
+import httpx
+
+from database import SessionLocal, dispose_async_engine, models
+from services.sql_profiler import QUERY_COUNT_HEADER
+
+from login_load import percentile
+
+DEFAULT_MIX = "client=50,cashier=15,manager=10,trainer=10,admin=10,tech_admin=5"
+STAFF_LOGINS = {
+    "admin": [("admin", "admin123")],
+    "manager": [("manager", "manager123")],
+    "cashier": [("cashier", "cashier123")],
+    "tech_admin": [("tech_admin", "tech123")],
+}
+LOAD_PASSWORD = "load123"
+
+class Fixtures:
+    """Идентификаторы из базы, которые нужны сценариям записи."""
+
+    def __init__(self):
+        db = SessionLocal()
+        try:
+            self.logins = dict(STAFF_LOGINS)
+            load_users = db.query(models.User).filter(models.User.username.like("load_%")).all()
+            self.logins["client"] = [(u.username, LOAD_PASSWORD) for u in load_users if u.role == "client"] \
+                or [("client1", "client123")]
+            self.logins["trainer"] = [(u.username, LOAD_PASSWORD) for u in load_users if u.role == "trainer"] \
+                or [("trainer", "trainer123")]
+            self.client_of = {u.username: u.client_id for u in load_users if u.role == "client"}
+            self.client_ids = [c for (c,) in db.query(models.Client.id).limit(5000)]
+            self.subscription_types = [t for (t,) in db.query(models.SubscriptionType.id)]
+            self.sections = [s for (s,) in db.query(models.Section.id)]
+            self.methods = [m for (m,) in db.query(models.PaymentMethod.id)]
+            self.trainers = [s for (s,) in db.query(models.Staff.id).filter(models.Staff.position_id == "pos_trainer").limit(100)]
+        finally:
+            db.close()
+
+    def bookable_trainings(self, username):
+        """Будущие групповые тренировки, доступные по активным абонементам клиента."""
+        client_id = self.client_of.get(username)
+        if client_id is None:
+            return []
+        db = SessionLocal()
+        try:
+            type_ids = [t for (t,) in db.query(models.ClientSubscription.subscription_type_id).filter(
+                models.ClientSubscription.client_id == client_id,
+                models.ClientSubscription.status_name == "active")]
+            return [t for (t,) in db.query(models.Training.id).join(models.training_subscription_access).filter(
+                models.training_subscription_access.c.subscription_type_id.in_(type_ids),
+                models.Training.is_group == True,
+                models.Training.start_time > datetime.now() + timedelta(hours=1)
+            ).distinct().limit(50)]
+        finally:
+            db.close()
+
+
+def scenario(role, fixtures, username, rng):
+    """Бесконечный цикл шагов роли: (имя операции, метод, путь, данные формы)."""
+    if role == "admin":
+        steps = [
+            lambda: ("GET /admin/dashboard", "GET", "/admin/dashboard", None),
+            lambda: ("GET /admin/api/clients", "GET", "/admin/api/clients", None),
+            lambda: ("GET /admin/api/trainings", "GET", "/admin/api/trainings", None),
+            lambda: ("GET /admin/api/client_subscriptions", "GET", "/admin/api/client_subscriptions", None),
+            lambda: ("POST /admin/add_client", "POST", "/admin/add_client",
+                     {"last_name": "Нагрузочный", "first_name": f"Клиент{rng.randint(0, 10**6)}", "discount": "0"}),
+        ]
+    elif role == "manager":
+        def add_training():
+            start = datetime.now() + timedelta(days=rng.randint(1, 60), hours=rng.randint(0, 12))
+            return ("POST /manager/add_training", "POST", "/manager/add_training", {
+                "name": "Нагрузочная тренировка", "section_id": rng.choice(fixtures.sections),
+                "start_time": start.isoformat(timespec="minutes"),
+                "end_time": (start + timedelta(hours=1)).isoformat(timespec="minutes"),
+                "is_group": "true", "max_participants": "10",
+                "trainer_id": rng.choice(fixtures.trainers) if fixtures.trainers else "",
+                "allowed_subscription_type_ids": fixtures.subscription_types,
+            })
+        steps = [lambda: ("GET /manager/dashboard", "GET", "/manager/dashboard", None), add_training]
+    elif role == "cashier":
+        def sell():
+            start = date.today() + timedelta(days=rng.randint(0, 30))
+            return ("POST /cashier/sell_subscription", "POST", "/cashier/sell_subscription", {
+                "client_id": rng.choice(fixtures.client_ids), "subscription_type_id": rng.choice(fixtures.subscription_types),
+                "start_date": start.isoformat(), "end_date": (start + timedelta(days=30)).isoformat(),
+                "method_id": rng.choice(fixtures.methods),
+            })
+        steps = [lambda: ("GET /cashier/dashboard", "GET", "/cashier/dashboard", None), sell]
+    elif role == "trainer":
+        steps = [lambda: ("GET /trainer/dashboard", "GET", "/trainer/dashboard", None)]
+    elif role == "tech_admin":
+        steps = [lambda: ("GET /tech_admin/dashboard", "GET", "/tech_admin/dashboard", None)]
+    elif role == "client":
+        trainings = fixtures.bookable_trainings(username)
+        steps = [lambda: ("GET /client/dashboard", "GET", "/client/dashboard", None)]
+        if trainings:
+            # Запись и сразу отмена: состояние базы не меняется от прогона к прогону.
+            chosen = {}
+            def book():
+                chosen["id"] = rng.choice(trainings)
+                return ("POST /client/book_training", "POST", "/client/book_training", {"training_id": chosen["id"]})
+            steps += [book, lambda: ("POST /client/cancel_booking", "POST", "/client/cancel_booking",
+                                     {"training_id": chosen["id"]})]
+    else:
+        raise ValueError(f"Неизвестная роль: {role}")
+    while True:
+        for step in steps:
+            yield step()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, elapsed, response):
+        self.latencies[name].append(elapsed)
+        # Формы сообщают об ошибке редиректом с ?error=.
+        if response is None or response.status_code >= 400 or "error=" in response.headers.get("location", ""):
+            self.errors[name] += 1
+            return
+        count = response.headers.get(QUERY_COUNT_HEADER)
+        if count is not None:
+            self.queries[name].append(int(count))
+
+    def print(self, elapsed):
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\nЗапросов: {total} за {elapsed:.1f} с ({total / elapsed:.1f} запр/с)\n")
+        print(f"{'операция':<40} {'n':>6} {'ошиб.':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} "
+              f"{'SQL/запр':>9} {'SQL макс':>9}")
+        for name in sorted(self.latencies):
+            ms = [v * 1000 for v in self.latencies[name]]
+            queries = self.queries[name]
+            per_request = f"{sum(queries) / len(queries):.1f}" if queries else "–"
+            print(f"{name:<40} {len(ms):>6} {self.errors[name]:>6} {percentile(ms, 50):>9.1f} "
+                  f"{percentile(ms, 95):>9.1f} {percentile(ms, 99):>9.1f} {per_request:>9} {max(queries, default='–'):>9}")
+
+    def over_budget(self, budget):
+        """Операции, где хоть один запрос выполнил больше budget SQL-выражений: {имя: максимум}."""
+        return {name: max(queries) for name, queries in self.queries.items() if queries and max(queries) > budget}
+
+
+async def virtual_user(client, role, username, password, fixtures, stats, deadline, think_time, seed):
+    rng = random.Random(seed)
+    for attempt in range(10):
+        await client.post("/login", data={"username": username, "password": password})
+        if "access_token" in client.cookies:
+            break
+        await asyncio.sleep(0.2 * (attempt + 1))
+    else:
+        stats.record(f"login {role}", 0.0, None)
+        return
+    steps = await asyncio.to_thread(lambda: scenario(role, fixtures, username, rng))
+    while time.monotonic() < deadline:
+        name, method, path, data = next(steps)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, data=data)
+        except httpx.HTTPError:
+            response = None
+        stats.record(name, time.perf_counter() - started, response)
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        role, weight = part.split("=")
+        mix[role.strip()] = float(weight)
+    return mix
+
+async def main(args):
+    fixtures = await asyncio.to_thread(Fixtures)
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    roles = rng.choices(list(mix), weights=list(mix.values()), k=args.users)
+
+    if args.base_url:
+        make_client = lambda: httpx.AsyncClient(base_url=args.base_url, timeout=120, follow_redirects=False)
+    else:
+        from main import app
+        transport = httpx.ASGITransport(app=app)
+        make_client = lambda: httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120,
+                                                follow_redirects=False)
+
+    stats = Stats()
+    clients = [make_client() for _ in roles]
+    print(f"Виртуальных пользователей: {args.users} "
+          f"({', '.join(f'{r}: {roles.count(r)}' for r in mix if roles.count(r))}), длительность {args.duration} с")
+    started = time.monotonic()
+    deadline = started + args.duration
+    try:
+        await asyncio.gather(*(
+            virtual_user(client, role, *fixtures.logins[role][i % len(fixtures.logins[role])],
+                         fixtures, stats, deadline, args.think_time, args.seed + i)
+            for i, (client, role) in enumerate(zip(clients, roles))
+        ))
+    finally:
+        for client in clients:
+            await client.aclose()
+        # ASGITransport не выполняет lifespan приложения, поэтому пул асинхронного движка закрываем сами.
+        await dispose_async_engine()
+    stats.print(time.monotonic() - started)
+    if args.query_budget is not None:
+        over_budget = stats.over_budget(args.query_budget)
+        if over_budget:
+            print(f"\nПревышен бюджет {args.query_budget} SQL-выражений на запрос:")
+            for name, count in sorted(over_budget.items()):
+                print(f"  {name}: до {count}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес внешнего сервера; по умолчанию приложение в процессе")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза между шагами, с")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли ролей, например client=50,cashier=15")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--query-budget", type=int, help="код возврата 1, если запрос выполнил больше SQL-выражений")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Нагрузочный тест: влияет ли волна логинов на задержку дашбордов.
+
+Сценарий: сначала измеряется задержка дашборда без нагрузки, затем то же
+самое на фоне непрерывного потока логинов (каждый — полная проверка bcrypt).
+Если хеширование блокирует цикл событий, p99 дашборда во второй фазе
+вырастет до сотен миллисекунд; при выполнении bcrypt в пуле потоков — нет.
+
+Поток логинов идёт с одного адреса под одним именем, поэтому сервер нужно
+запускать с поднятыми лимитами попыток входа (services/rate_limit.py): иначе
+почти все логины отклоняются до bcrypt и тест измеряет не хеширование, а отказы.
+Отклонённые лимитом логины скрипт считает и при их наличии завершается с кодом 1.
+
+Запуск (сервер должен быть поднят, нужны зависимости из requirements-dev.txt):
+    LOGIN_IP_BURST=100000 LOGIN_USER_BURST=100000 uvicorn main:app --workers 1
+    python benchmarks/login_load.py --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from urllib.parse import unquote
+
+import httpx
+
+# Начало сообщения об отказе из main.login_for_access_token.
+RATE_LIMITED_MESSAGE = "Слишком много попыток входа"
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def report(title, latencies):
+    ms = [v * 1000 for v in latencies]
+    print(f"{title:<40} n={len(ms):<5} p50={percentile(ms, 50):7.1f} мс  "
+          f"p95={percentile(ms, 95):7.1f} мс  p99={percentile(ms, 99):7.1f} мс  "
+          f"mean={statistics.fmean(ms) if ms else 0:7.1f} мс")
+
+async def login(client, username, password):
+    """Возвращает (длительность, дошёл ли вход до проверки пароля — не отклонён ли лимитом)."""
+    started = time.perf_counter()
+    response = await client.post("/login", data={"username": username, "password": password})
+    elapsed = time.perf_counter() - started
+    return elapsed, RATE_LIMITED_MESSAGE not in unquote(response.headers.get("location", ""))
+
+async def measure_dashboard(client, path, requests, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+async def login_storm(base_url, username, password, concurrency, stop):
+    latencies, rejected = [], 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def worker():
+            nonlocal rejected
+            while not stop.is_set():
+                elapsed, passed = await login(client, username, password)
+                if passed:
+                    latencies.append(elapsed)
+                else:
+                    rejected += 1
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, rejected
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as dashboard_client:
+        await dashboard_client.post("/login", data={"username": args.username, "password": args.password})
+        if "access_token" not in dashboard_client.cookies:
+            raise SystemExit("Не удалось войти: проверьте логин и пароль")
+
+        await measure_dashboard(dashboard_client, args.dashboard, 5, 1)
+        baseline = await measure_dashboard(dashboard_client, args.dashboard, args.requests, args.concurrency)
+
+        stop = asyncio.Event()
+        storm = asyncio.create_task(login_storm(args.base_url, args.username, args.password, args.login_concurrency, stop))
+        await asyncio.sleep(0.5)
+        under_load = await measure_dashboard(dashboard_client, args.dashboard, args.requests, args.concurrency)
+        stop.set()
+        logins, rejected = await storm
+
+    report(f"{args.dashboard} без нагрузки", baseline)
+    report(f"{args.dashboard} во время логинов", under_load)
+    report(f"POST /login x{args.login_concurrency} параллельно", logins)
+    if rejected:
+        print(f"Отклонено лимитом попыток входа: {rejected}. Перезапустите сервер с "
+              f"LOGIN_IP_BURST=100000 LOGIN_USER_BURST=100000 — иначе замер не отражает нагрузку bcrypt.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--dashboard", default="/admin/api/sections")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Объём передаваемых данных по страницам: HTML дашбордов и подключённая статика
+без сжатия, с gzip и с brotli, при первом и повторном посещении.
+
+Считаются байты тела ответа так, как они идут по сети (до распаковки), без
+заголовков. Повторное посещение: статика с хешем в адресе отдаётся с
+Cache-Control: immutable, браузер её не запрашивает вовсе; файлы без хеша
+перепроверяются запросом с If-None-Match. Ресурсы с CDN (Bootstrap) не входят.
+
+Запуск (нужны зависимости из requirements-dev.txt):
+    python benchmarks/page_weight.py
+    python benchmarks/page_weight.py --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.chdir(PROJECT_ROOT)  # main.py подключает static/ и templates/ по относительным путям
+
+import httpx
+
+from database import dispose_async_engine
+
+PAGES = (
+    ("admin", "admin123", "/admin/dashboard"),
+    ("manager", "manager123", "/manager/dashboard"),
+    ("manager", "manager123", "/manager/reports"),
+    ("cashier", "cashier123", "/cashier/dashboard"),
+    ("trainer", "trainer123", "/trainer/dashboard"),
+    ("client1", "client123", "/client/dashboard"),
+    ("tech_admin", "tech123", "/tech_admin/dashboard"),
+)
+ENCODINGS = ("identity", "gzip", "br")
+STATIC_LINK = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+
+
+async def fetch(client, path, encoding, headers=None):
+    """(статус, байт тела по сети, заголовки, текст или None)."""
+    request_headers = {"Accept-Encoding": encoding, **(headers or {})}
+    async with client.stream("GET", path, headers=request_headers) as response:
+        raw = b"".join([chunk async for chunk in response.aiter_raw()])
+    text = None
+    if response.headers.get("content-encoding") in (None, "identity"):
+        text = raw.decode(response.encoding or "utf-8", errors="replace")
+    return response.status_code, len(raw), response.headers, text
+
+async def measure_page(client, path):
+    row = {}
+    assets = []
+    for encoding in ENCODINGS:
+        status, size, headers, text = await fetch(client, path, encoding)
+        if status != 200:
+            raise RuntimeError(f"{path}: HTTP {status}")
+        row[encoding] = size
+        if text is not None:
+            assets = sorted(set(STATIC_LINK.findall(text)))
+    for encoding in ENCODINGS:
+        first = repeat = 0
+        for asset in assets:
+            status, size, headers, _ = await fetch(client, asset, encoding)
+            first += size
+            if "immutable" not in headers.get("cache-control", ""):
+                status, size, _, _ = await fetch(client, asset, encoding, {"If-None-Match": headers.get("etag", "")})
+                repeat += size
+        row[f"static_{encoding}"] = first
+        row[f"static_repeat_{encoding}"] = repeat
+    row["assets"] = len(assets)
+    return row
+
+def kb(value):
+    return f"{value / 1024:.1f}"
+
+async def main(args):
+    if args.base_url:
+        make_client = lambda: httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from main import app
+        transport = httpx.ASGITransport(app=app)
+        make_client = lambda: httpx.AsyncClient(transport=transport, base_url="http://pageweight", timeout=60)
+
+    rows = []
+    try:
+        for username, password, path in PAGES:
+            async with make_client() as client:
+                response = await client.post("/login", data={"username": username, "password": password},
+                                             follow_redirects=False)
+                if "access_token" not in response.cookies:
+                    print(f"{path}: не удалось войти как {username}, пропущено")
+                    continue
+                rows.append((path, await measure_page(client, path)))
+    finally:
+        await dispose_async_engine()
+
+    print(f"\n{'страница':<24} {'HTML, КБ':>10} {'gzip':>8} {'br':>8} {'сжатие':>7} "
+          f"{'статика':>8} {'gzip':>7} {'br':>7} {'повторно':>9}")
+    for path, row in rows:
+        ratio = row["identity"] / row["gzip"] if row["gzip"] else 0
+        print(f"{path:<24} {kb(row['identity']):>10} {kb(row['gzip']):>8} {kb(row['br']):>8} {ratio:>6.1f}x "
+              f"{kb(row['static_identity']):>8} {kb(row['static_gzip']):>7} {kb(row['static_br']):>7} "
+              f"{kb(row['static_repeat_gzip']):>9}")
+    total_identity = sum(row["identity"] + row["static_identity"] for _, row in rows)
+    total_gzip = sum(row["gzip"] + row["static_gzip"] for _, row in rows)
+    print(f"\nВсего за первое посещение всех страниц: {kb(total_identity)} КБ без сжатия, {kb(total_gzip)} КБ с gzip")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес внешнего сервера; по умолчанию приложение в процессе")
+    asyncio.run(main(parser.parse_args()))
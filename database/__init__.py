@@ -1,26 +1,31 @@
-from .session import SessionLocal, engine, get_db
+from .session import SessionLocal, engine, get_db, get_async_db, get_async_engine, dispose_async_engine, get_pool_stats
 from .initial_data import initialize_database
 from .sql_objects import create_sql_objects
+from . import data_versions, reference_data, training_counters, reports
 from .models import (
-    Base, User, Client, Staff, Status, Position, Section, Training, 
+    Base, User, Client, Staff, Status, Position, Section, Training, TrainingSeries,
     Payment, PaymentMethod, Warning, Equipment,
-    SubscriptionType, ClientSubscription, TrainingParticipant
+    SubscriptionType, ClientSubscription, TrainingParticipant,
+    RevenueDaily, AttendanceWeekly, RevokedToken
 )
 from .crud import (
     get_clients, get_client, create_client, delete_client,
     get_staff, get_single_staff, create_staff, delete_staff, 
     get_user_by_username, create_user,
-    get_sections
+    get_sections, get_all_sections, get_subscription_types,
+    get_client_subscriptions, get_trainings, paginate
 )
 
 __all__ = [
-    'SessionLocal', 'engine', 'get_db', 
+    'SessionLocal', 'engine', 'get_db', 'get_async_db', 'get_async_engine', 'dispose_async_engine', 'get_pool_stats',
     'Base', 'User', 'Client', 'Staff', 'Status', 'Position', 'Section', 
-    'Training', 'Payment', 'PaymentMethod', 'Warning', 'Equipment',
+    'Training', 'TrainingSeries', 'Payment', 'PaymentMethod', 'Warning', 'Equipment',
     'SubscriptionType', 'ClientSubscription', 'TrainingParticipant',
+    'RevenueDaily', 'AttendanceWeekly', 'RevokedToken',
     'get_clients', 'get_client', 'create_client', 'delete_client',
     'get_staff', 'get_single_staff', 'create_staff', 'delete_staff', 
     'get_user_by_username', 'create_user',
-    'get_sections',
-    'initialize_database', 'create_sql_objects'
+    'get_sections', 'get_all_sections', 'get_subscription_types',
+    'get_client_subscriptions', 'get_trainings', 'paginate',
+    'initialize_database', 'create_sql_objects', 'data_versions', 'reference_data', 'training_counters', 'reports'
 ]
\ No newline at end of file
@@ -1,14 +1,279 @@
-from sqlalchemy.orm import Session
-from . import models
-from services.utils import generate_id
+from sqlalchemy import and_, case, exists, func, insert, literal, literal_column, or_, tuple_
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from datetime import date, datetime
+from decimal import Decimal
+import csv
+import io
+import re
+from . import data_versions, models, reports
+from services.utils import generate_id, encode_cursor, decode_cursor
 from services.auth import get_password_hash
 
-def get_clients(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Client).offset(skip).limit(limit).all()
+MAX_PAGE_SIZE = 200
+CLIENT_SEARCH_LIMIT = 10
+CLIENT_SEARCH_MIN_LENGTH = 2
+
+CLIENT_SORTS = {
+    "last_name": (models.Client.last_name, models.Client.id),
+    "first_name": (models.Client.first_name, models.Client.id),
+    "reg_date": (models.Client.reg_date, models.Client.id),
+}
+STAFF_SORTS = {
+    "last_name": (models.Staff.last_name, models.Staff.id),
+    "hire_date": (models.Staff.hire_date, models.Staff.id),
+}
+SECTION_SORTS = {
+    "name": (models.Section.name, models.Section.id),
+}
+SUBSCRIPTION_TYPE_SORTS = {
+    "name": (models.SubscriptionType.name, models.SubscriptionType.id),
+    "cost": (models.SubscriptionType.cost, models.SubscriptionType.id),
+}
+CLIENT_SUBSCRIPTION_SORTS = {
+    "end_date": (models.ClientSubscription.end_date, models.ClientSubscription.id),
+    "start_date": (models.ClientSubscription.start_date, models.ClientSubscription.id),
+}
+TRAINING_SORTS = {
+    "start_time": (models.Training.start_time, models.Training.id),
+    "name": (models.Training.name, models.Training.id),
+}
+
+def _cursor_value(column, raw):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(raw)
+    if python_type is date:
+        return date.fromisoformat(raw)
+    return python_type(raw)
+
+def paginate(query, sorts: dict, sort: str, cursor: str = None, limit: int = 50, descending: bool = False):
+    """
+    Keyset-пагинация: вместо OFFSET страница начинается строго после последней
+    строки предыдущей, поэтому глубокие страницы стоят столько же, сколько первая.
+    Возвращает (элементы, токен следующей страницы или None).
+    """
+    if sort not in sorts:
+        raise ValueError(f"Недопустимое поле сортировки: {sort}")
+    columns = sorts[sort]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if cursor:
+        payload = decode_cursor(cursor)
+        values = payload.get("v")
+        if payload.get("s") != sort or bool(payload.get("d")) != descending or not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("Курсор не соответствует параметрам сортировки")
+        try:
+            values = [_cursor_value(col, val) for col, val in zip(columns, values)]
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise ValueError("Некорректный курсор") from e
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    order = [col.desc() for col in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor({
+            "s": sort, "d": descending,
+            "v": [getattr(last, col.key) for col in columns],
+        })
+    return rows, next_cursor
+
+def _name_filter(query, model, search: str):
+    pattern = f"{search.strip()}%"
+    return query.filter(model.last_name.ilike(pattern) | model.first_name.ilike(pattern))
+
+def get_clients(db: Session, cursor: str = None, limit: int = 50, sort: str = "last_name",
+                descending: bool = False, search: str = None):
+    query = db.query(models.Client).options(selectinload(models.Client.contacts))
+    if search and search.strip():
+        query = query.filter(client_search_condition(db, search))
+    return paginate(query, CLIENT_SORTS, sort, cursor, limit, descending)
+
+# Поиск клиентов по ФИО и телефону. На Postgres выражения совпадают с индексами из
+# sql_objects.sql: триграммный GIN по ФИО и по цифрам телефона (подстрока и нечёткое
+# совпадение) и B-tree text_pattern_ops по фамилии для коротких префиксов.
+def _client_full_name():
+    space = literal_column("' '")
+    return func.lower(models.Client.last_name + space + models.Client.first_name + space
+                      + func.coalesce(models.Client.middle_name, literal_column("''")))
+
+def _phone_digits(dialect_name: str, column):
+    if dialect_name == "postgresql":
+        return func.regexp_replace(column, literal_column(r"'\D'"), literal_column("''"), literal_column("'g'"))
+    # Приложение хранит телефон нормализованным: '+' и цифры (services/validators.normalize_phone).
+    return func.replace(column, "+", "")
+
+def _search_digits(search: str):
+    """Цифры телефона из запроса или None, если запрос — не номер. Код страны (+7/8) отбрасывается."""
+    if re.sub(r"[\d\s()+\-]", "", search):
+        return None
+    digits = re.sub(r"\D", "", search)
+    if len(digits) < 3:
+        return None
+    if search.startswith("+7") or (len(digits) == 11 and digits[0] in "78"):
+        digits = digits[1:]
+    return digits
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def client_search_condition(db: Session, search: str):
+    """Условие поиска клиента по строке: номер телефона (подстрока цифр) либо ФИО."""
+    search = search.strip()
+    dialect_name = db.get_bind().dialect.name
+    digits = _search_digits(search)
+    if digits:
+        # Псевдоним: search_clients сам присоединяет client_contacts для вывода телефона.
+        contact = aliased(models.ClientContact)
+        return exists().where(
+            contact.client_id == models.Client.id,
+            contact.contact_type == "phone",
+            _phone_digits(dialect_name, contact.contact_value).like(f"%{digits}%"),
+        )
+    words = search.lower().split()[:4]
+    if dialect_name != "postgresql":
+        # lower() в SQLite не понимает кириллицу: сравниваем и с вариантом «с заглавной».
+        return and_(*[or_(
+            *(column.like(f"%{_like_escape(variant)}%", escape="\\")
+              for column in (models.Client.last_name, models.Client.first_name, models.Client.middle_name)
+              for variant in {word, word.capitalize()})
+        ) for word in words])
+    if len(search) < 3:
+        # Для триграмм слишком коротко — префикс фамилии по B-tree индексу.
+        return func.lower(models.Client.last_name).like(f"{_like_escape(search.lower())}%", escape="\\")
+    full_name = _client_full_name()
+    return or_(
+        and_(*[full_name.like(f"%{_like_escape(word)}%", escape="\\") for word in words]),
+        # Нечёткое совпадение (опечатки): word_similarity не ниже pg_trgm.word_similarity_threshold.
+        literal(search.lower()).op("<%")(full_name),
+    )
+
+def search_clients(db: Session, search: str, limit: int = CLIENT_SEARCH_LIMIT) -> list:
+    """
+    Первые limit клиентов для подсказки при вводе: [{id, name, phone}]. Сначала
+    совпадения по началу фамилии, затем по убыванию сходства (на Postgres).
+    """
+    search = (search or "").strip()
+    if len(search) < CLIENT_SEARCH_MIN_LENGTH:
+        return []
+    phone = models.ClientContact
+    query = db.query(
+        models.Client.id, models.Client.last_name, models.Client.first_name, models.Client.middle_name,
+        phone.contact_value.label("phone")
+    ).outerjoin(phone, and_(phone.client_id == models.Client.id, phone.contact_type == "phone")).filter(
+        client_search_condition(db, search)
+    )
+    order = [models.Client.last_name, models.Client.id]
+    if not _search_digits(search):
+        first_word = _like_escape(search.lower().split()[0])
+        if db.get_bind().dialect.name == "postgresql":
+            prefix = func.lower(models.Client.last_name).like(f"{first_word}%", escape="\\")
+            order.insert(0, func.word_similarity(search.lower(), _client_full_name()).desc())
+        else:
+            prefix = or_(*(models.Client.last_name.like(f"{variant}%", escape="\\")
+                           for variant in {first_word, first_word.capitalize()}))
+        order.insert(0, case((prefix, 0), else_=1))
+    rows = query.order_by(*order).limit(min(limit, MAX_PAGE_SIZE)).all()
+    return [{
+        "id": row.id,
+        "name": " ".join(part for part in (row.last_name, row.first_name, row.middle_name) if part),
+        "phone": row.phone,
+    } for row in rows]
+
+def get_staff(db: Session, cursor: str = None, limit: int = 50, sort: str = "last_name",
+              descending: bool = False, search: str = None, position_id: str = None):
+    query = db.query(models.Staff).options(joinedload(models.Staff.position))
+    if search and search.strip():
+        query = _name_filter(query, models.Staff, search)
+    if position_id:
+        query = query.filter(models.Staff.position_id == position_id)
+    return paginate(query, STAFF_SORTS, sort, cursor, limit, descending)
+
+def get_sections(db: Session, cursor: str = None, limit: int = 50, sort: str = "name",
+                 descending: bool = False, search: str = None, status_name: str = None):
+    query = db.query(models.Section)
+    if search and search.strip():
+        query = query.filter(models.Section.name.ilike(f"{search.strip()}%"))
+    if status_name:
+        query = query.filter(models.Section.status_name == status_name)
+    return paginate(query, SECTION_SORTS, sort, cursor, limit, descending)
+
+def get_all_sections(db: Session):
+    """Полный список секций для выпадающих списков форм (небольшой справочник)."""
+    return db.query(models.Section).order_by(models.Section.name, models.Section.id).all()
+
+def get_subscription_types(db: Session, cursor: str = None, limit: int = 50, sort: str = "name",
+                           descending: bool = False, search: str = None):
+    query = db.query(models.SubscriptionType)
+    if search and search.strip():
+        query = query.filter(models.SubscriptionType.name.ilike(f"{search.strip()}%"))
+    return paginate(query, SUBSCRIPTION_TYPE_SORTS, sort, cursor, limit, descending)
+
+def get_client_subscriptions(db: Session, cursor: str = None, limit: int = 50, sort: str = "end_date",
+                             descending: bool = True, status_name: str = None, client_id: str = None):
+    query = db.query(models.ClientSubscription).options(
+        joinedload(models.ClientSubscription.client),
+        joinedload(models.ClientSubscription.subscription_type)
+    )
+    if status_name:
+        query = query.filter(models.ClientSubscription.status_name == status_name)
+    if client_id:
+        query = query.filter(models.ClientSubscription.client_id == client_id)
+    return paginate(query, CLIENT_SUBSCRIPTION_SORTS, sort, cursor, limit, descending)
+
+def get_trainings(db: Session, cursor: str = None, limit: int = 50, sort: str = "start_time",
+                  descending: bool = True, section_id: str = None, trainer_id: str = None,
+                  is_group: bool = None):
+    query = db.query(models.Training).options(
+        joinedload(models.Training.section),
+        joinedload(models.Training.trainer),
+        selectinload(models.Training.allowed_subscriptions)
+    )
+    if section_id:
+        query = query.filter(models.Training.section_id == section_id)
+    if trainer_id:
+        query = query.filter(models.Training.trainer_id == trainer_id)
+    if is_group is not None:
+        query = query.filter(models.Training.is_group == is_group)
+    return paginate(query, TRAINING_SORTS, sort, cursor, limit, descending)
+
+def get_training_client_names(db: Session, training_ids: list) -> dict:
+    """Имена подтверждённых участников для набора тренировок одним запросом: {training_id: [ФИО, ...]}."""
+    names = {}
+    if not training_ids:
+        return names
+    rows = db.query(
+        models.TrainingParticipant.training_id, models.Client.first_name, models.Client.last_name
+    ).join(models.Client, models.Client.id == models.TrainingParticipant.client_id).filter(
+        models.TrainingParticipant.training_id.in_(training_ids),
+        models.TrainingParticipant.status_name == "confirmed"
+    ).order_by(models.Client.last_name, models.Client.first_name)
+    for training_id, first_name, last_name in rows:
+        names.setdefault(training_id, []).append(f"{first_name} {last_name}")
+    return names
 
 def get_client(db: Session, client_id: str):
     return db.query(models.Client).filter(models.Client.id == client_id).first()
 
+def set_client_contacts(db: Session, client: models.Client, contacts: dict):
+    """Приводит контакты клиента к {тип: значение}; пустое значение удаляет контакт. Один SELECT на все типы."""
+    existing = {contact.contact_type: contact for contact in client.contacts}
+    for contact_type, value in contacts.items():
+        contact = existing.get(contact_type)
+        if value:
+            if contact:
+                contact.contact_value = value
+            else:
+                client.contacts.append(models.ClientContact(contact_type=contact_type, contact_value=value))
+        elif contact:
+            client.contacts.remove(contact)
+
 def create_client(db: Session, client_data: dict):
     client_id = generate_id()
     client = models.Client(
@@ -32,12 +297,6 @@ def delete_client(db: Session, client_id: str):
         return True
     return False
 
-def get_staff(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Staff).offset(skip).limit(limit).all()
-
-def get_sections(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Section).offset(skip).limit(limit).all()
-
 def get_single_staff(db: Session, staff_id: str):
     return db.query(models.Staff).filter(models.Staff.id == staff_id).first()
 
@@ -79,7 +338,8 @@ def get_user_by_username(db: Session, username: str):
 
 def create_user(db: Session, user_data: dict):
     user_id = generate_id()
-    hashed_password = get_password_hash(user_data["password"])
+    # Роутеры хешируют пароль заранее в пуле потоков и передают готовый хеш.
+    hashed_password = user_data.get("hashed_password") or get_password_hash(user_data["password"])
     user = models.User(
         id=user_id,
         username=user_data["username"],
@@ -91,4 +351,128 @@ def create_user(db: Session, user_data: dict):
     db.add(user)
     db.commit()
     db.refresh(user)
-    return user
\ No newline at end of file
+    return user
+
+def discounted_price(cost, discount_percent) -> Decimal:
+    """Цена абонемента с учётом персональной скидки клиента (в процентах), с округлением до копеек."""
+    discount = Decimal(discount_percent or 0)
+    return (Decimal(cost) * (100 - discount) / 100).quantize(Decimal("0.01"))
+
+def sell_subscriptions(db: Session, client_ids: list, subscription_type, start_date: date, end_date: date, method_id: str):
+    """
+    Продаёт абонемент одного типа нескольким клиентам в одной транзакции: абонементы
+    и платежи вставляются пакетно, скидки клиентов читаются одним запросом.
+    subscription_type — снимок из кэша справочников (нужны id и cost).
+    Возвращает id созданных абонементов; при ошибке ничего не сохраняется.
+    """
+    client_ids = list(dict.fromkeys(client_ids))
+    discounts = dict(
+        db.query(models.Client.id, models.Client.discount).filter(models.Client.id.in_(client_ids))
+    )
+    missing = [client_id for client_id in client_ids if client_id not in discounts]
+    if missing:
+        raise ValueError(f"Клиенты не найдены: {', '.join(missing)}")
+
+    # Импорт здесь: services.jobs импортирует пакет database.
+    from services.jobs import subscription_status
+
+    today = datetime.now().date()
+    # Статус по датам сразу, чтобы абонемент с сегодняшним началом не ждал запуска activate_subscriptions.
+    status_name = subscription_status(start_date, end_date, today)
+    subscriptions, payments = [], []
+    for client_id in client_ids:
+        subscription_id = generate_id()
+        subscriptions.append({
+            "id": subscription_id, "client_id": client_id,
+            "subscription_type_id": subscription_type.id,
+            "start_date": start_date, "end_date": end_date, "status_name": status_name,
+        })
+        amount = discounted_price(subscription_type.cost, discounts[client_id])
+        if amount > 0:
+            payments.append({
+                "id": generate_id(), "client_subscription_id": subscription_id,
+                "amount": amount, "date": today, "method_id": method_id,
+            })
+
+    db.execute(insert(models.ClientSubscription), subscriptions)
+    if payments:
+        db.execute(insert(models.Payment), payments)
+        reports.add_revenue(db, today, method_id, subscription_type.id, len(payments),
+                            sum(payment["amount"] for payment in payments))
+    db.commit()
+    return [sub["id"] for sub in subscriptions]
+
+def _sum_into(buckets: dict, key, values: tuple):
+    current = buckets.get(key)
+    buckets[key] = values if current is None else tuple(a + b for a, b in zip(current, values))
+
+def get_revenue_report(db: Session, date_from: date, date_to: date) -> dict:
+    """
+    Выручка за период по агрегату report_revenue_daily (платежи не читаются):
+    итог и разбивки по дням, способам оплаты и типам абонементов — пары (ключ, (число, сумма)).
+    """
+    rows = db.query(models.RevenueDaily).filter(models.RevenueDaily.day.between(date_from, date_to)).all()
+    by_day, by_method, by_type = {}, {}, {}
+    for row in rows:
+        values = (row.payments_count, Decimal(row.amount))
+        _sum_into(by_day, row.day, values)
+        _sum_into(by_method, row.method_id, values)
+        _sum_into(by_type, row.subscription_type_id, values)
+    return {
+        "payments_count": sum(count for count, _ in by_day.values()),
+        "amount": sum((amount for _, amount in by_day.values()), Decimal(0)),
+        "by_day": sorted(by_day.items()),
+        "by_method": sorted(by_method.items(), key=lambda item: -item[1][1]),
+        "by_subscription_type": sorted(by_type.items(), key=lambda item: -item[1][1]),
+    }
+
+def get_attendance_report(db: Session, date_from: date, date_to: date) -> dict:
+    """
+    Посещаемость недель, пересекающих период, по агрегату report_attendance_weekly:
+    разбивки по неделям, секциям и тренерам — пары (ключ, (тренировок, мест, записей)).
+    Ключ тренера '' — тренировки без тренера; trainer_names — {id: "Фамилия Имя"}.
+    """
+    rows = db.query(models.AttendanceWeekly).filter(
+        models.AttendanceWeekly.week_start.between(reports.week_start(date_from), date_to)
+    ).all()
+    by_week, by_section, by_trainer = {}, {}, {}
+    for row in rows:
+        values = (row.trainings_count, row.capacity, row.visits)
+        _sum_into(by_week, row.week_start, values)
+        _sum_into(by_section, row.section_id, values)
+        _sum_into(by_trainer, row.trainer_id, values)
+    trainer_ids = [trainer_id for trainer_id in by_trainer if trainer_id]
+    trainer_names = {
+        staff_id: f"{last_name} {first_name}"
+        for staff_id, last_name, first_name in db.query(
+            models.Staff.id, models.Staff.last_name, models.Staff.first_name
+        ).filter(models.Staff.id.in_(trainer_ids))
+    } if trainer_ids else {}
+    return {
+        "by_week": sorted(by_week.items()),
+        "by_section": sorted(by_section.items(), key=lambda item: -item[1][2]),
+        "by_trainer": sorted(by_trainer.items(), key=lambda item: -item[1][2]),
+        "trainer_names": trainer_names,
+    }
+
+def bulk_insert(db: Session, table, rows: list):
+    """
+    Пакетная вставка словарей в таблицу в рамках текущей транзакции сессии.
+    На Postgres (psycopg2) используется COPY FROM STDIN, на остальных СУБД — executemany.
+    """
+    if not rows:
+        return
+    table = getattr(table, "__table__", table)
+    columns = [column.name for column in table.columns if column.name in rows[0]]
+    connection = db.connection()
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row.get(column) for column in columns])
+        buffer.seek(0)
+        with connection.connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        data_versions.mark_changed(db, table.name)
+    else:
+        db.execute(insert(table), rows)
@@ -0,0 +1,92 @@
+"""
+Счётчики изменений по таблицам — версия данных для кэшей отрисовки.
+
+Сессия запоминает таблицы, которые она меняет: объекты из flush и ORM-выражения
+INSERT/UPDATE/DELETE (пакетные вставки, задачи services/jobs.py). После commit
+счётчики этих таблиц увеличиваются; кэш, ключ которого включает version(...),
+после этого просто перестаёт попадать. Счётчики живут в памяти процесса: при
+REFERENCE_CACHE_NOTIFY=1 изменения рассылаются другим воркерам по тому же каналу
+NOTIFY, что и сброс справочников (см. reference_data.py). Без него записи других
+процессов версии не меняют вовсе, поэтому каждый потребитель сам ограничивает
+отставание: кэш фрагментов — своим TTL, ETag (services/http_cache.py) —
+HTTP_ETAG_MAX_AGE, проверка токенов — TOKEN_REVOCATION_REFRESH_SECONDS.
+"""
+import itertools
+import threading
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+NOTIFY_PREFIX = "table:"
+
+_lock = threading.Lock()
+_versions = {}
+_epoch = 0
+
+
+def version(*tables: str) -> tuple:
+    """Текущие версии таблиц; меняется при каждой зафиксированной записи в любую из них."""
+    return (_epoch,) + tuple(_versions.get(table, 0) for table in tables)
+
+def bump(*tables: str):
+    """Отмечает таблицы изменёнными; без аргументов — все сразу (например, после потери уведомлений)."""
+    global _epoch
+    with _lock:
+        if not tables:
+            _epoch += 1
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+def _remember(session: Session, tables):
+    session.info.setdefault("changed_tables", set()).update(tables)
+
+def mark_changed(session: Session, *tables: str):
+    """Для записи в обход сессии (COPY, сырое соединение): таблицы получат новую версию после commit."""
+    _remember(session, tables)
+
+def _flushed_tables(instance, deleted: bool) -> set:
+    """Таблица объекта и связующие таблицы (secondary) его изменённых связей многие-ко-многим."""
+    state = inspect(instance)
+    tables = {instance.__table__.name}
+    for relationship in state.mapper.relationships:
+        if relationship.secondary is not None and (deleted or state.attrs[relationship.key].history.has_changes()):
+            tables.add(relationship.secondary.name)
+    return tables
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    deleted = set(session.deleted)
+    _remember(session, set().union(*(
+        _flushed_tables(instance, instance in deleted)
+        for instance in itertools.chain(session.new, session.dirty, deleted)
+        if hasattr(instance, "__table__")
+    )))
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _remember(orm_execute_state.session, {table.name})
+
+@event.listens_for(Session, "before_commit")
+def _notify_other_workers(session):
+    from . import reference_data
+
+    if not reference_data.REFERENCE_CACHE_NOTIFY or session.get_bind().dialect.name != "postgresql":
+        return
+    # commit сбросит изменения уже после этого события — без flush их таблицы не попали бы в уведомление.
+    session.flush()
+    for table in session.info.get("changed_tables", ()):
+        session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": reference_data.NOTIFY_CHANNEL, "payload": NOTIFY_PREFIX + table})
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        bump(*tables)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("changed_tables", None)
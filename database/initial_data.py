@@ -8,7 +8,8 @@ def initialize_database(db: Session):
 
     print("База данных пуста. Создание начальных данных...")
 
-    statuses = [models.Status(name=n, description=d) for n, d in [("active", "Активный"), ("expired", "Истекший"), ("blocked", "Заблокирован"), ("pending", "Ожидает активации"), ("confirmed", "Подтвержден"), ("cancelled", "Отменен")]]
+    existing_statuses = {name for (name,) in db.query(models.Status.name)}
+    statuses = [models.Status(name=n, description=d) for n, d in [("active", "Активный"), ("expired", "Истекший"), ("blocked", "Заблокирован"), ("pending", "Ожидает активации"), ("confirmed", "Подтвержден"), ("cancelled", "Отменен"), ("waitlisted", "В листе ожидания")] if n not in existing_statuses]
     db.add_all(statuses)
     positions = [
         models.Position(id="pos_admin", name="Администратор", min_salary=50000, max_salary=80000),
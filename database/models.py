@@ -1,9 +1,10 @@
 # database/models.py
 
 from sqlalchemy import (
-    Column, String, Date, Integer, ForeignKey, Boolean, Numeric, TIMESTAMP, Table
+    Column, String, Date, Integer, ForeignKey, Boolean, Numeric, TIMESTAMP, Table, Index
 )
 from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 
 Base = declarative_base()
 
@@ -81,10 +82,18 @@ class User(Base):
     role = Column(String(20), nullable=False)
     client_id = Column(String(50), ForeignKey('clients.id'))
     staff_id = Column(String(50), ForeignKey('staff.id'))
+    # Растёт при смене логина, пароля, роли или привязки: выданные раньше токены перестают действовать.
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     client = relationship("Client", back_populates="user")
     staff = relationship("Staff", back_populates="user")
 
+class RevokedToken(Base):
+    """Отозванный до истечения токен (выход) или 'user:<id>' — все токены удалённого пользователя."""
+    __tablename__ = 'revoked_tokens'
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(TIMESTAMP, nullable=False)  # UTC; после этого момента запись не нужна
+
 class Section(Base):
     __tablename__ = 'sections'
     id = Column(String(50), primary_key=True)
@@ -101,6 +110,16 @@ class SubscriptionType(Base):
     instances = relationship("ClientSubscription", back_populates="subscription_type")
     accessible_trainings = relationship("Training", secondary=training_subscription_access, back_populates="allowed_subscriptions")
 
+class TrainingSeries(Base):
+    """Повторяющаяся тренировка: правило RRULE, по которому развёрнуты её вхождения (services/series.py)."""
+    __tablename__ = 'training_series'
+    id = Column(String(50), primary_key=True)
+    name = Column(String(100), nullable=False)
+    rule = Column(String(200), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+
+    trainings = relationship("Training", back_populates="series")
+
 class Training(Base):
     __tablename__ = 'trainings'
     id = Column(String(50), primary_key=True)
@@ -111,14 +130,97 @@ class Training(Base):
     end_time = Column(TIMESTAMP, nullable=False)
     is_group = Column(Boolean, default=False, nullable=False)
     max_participants = Column(Integer, default=1, nullable=False)
+    # Счётчики записей поддерживаются database/training_counters.py — спискам не нужно загружать участников.
+    confirmed_count = Column(Integer, default=0, server_default="0", nullable=False)
+    waitlisted_count = Column(Integer, default=0, server_default="0", nullable=False)
+    series_id = Column(String(50), ForeignKey('training_series.id'), nullable=True)
     
     section = relationship("Section")
     trainer = relationship("Staff", back_populates="trainings")
+    series = relationship("TrainingSeries", back_populates="trainings")
     participants = relationship("TrainingParticipant", back_populates="training", cascade="all, delete-orphan")
     allowed_subscriptions = relationship("SubscriptionType", secondary=training_subscription_access, back_populates="accessible_trainings")
 
+    @hybrid_property
+    def participant_count(self):
+        return self.confirmed_count + self.waitlisted_count
+
+    @property
+    def free_places(self):
+        return max(self.max_participants - self.confirmed_count, 0)
+
 class ClientSubscription(Base): __tablename__ = 'client_subscriptions'; id = Column(String(50), primary_key=True); client_id = Column(String(50), ForeignKey('clients.id'), nullable=False); subscription_type_id = Column(String(50), ForeignKey('subscription_types.id'), nullable=False); start_date = Column(Date, nullable=False); end_date = Column(Date, nullable=False); status_name = Column(String(50), ForeignKey('statuses.name')); client = relationship("Client", back_populates="subscriptions"); subscription_type = relationship("SubscriptionType", back_populates="instances"); status = relationship("Status"); payment = relationship("Payment", back_populates="client_subscription", uselist=False, cascade="all, delete-orphan")
-class TrainingParticipant(Base): __tablename__ = 'training_participants'; training_id = Column(String(50), ForeignKey('trainings.id'), primary_key=True); client_id = Column(String(50), ForeignKey('clients.id'), primary_key=True); status_name = Column(String(50), ForeignKey('statuses.name')); training = relationship("Training", back_populates="participants"); client = relationship("Client", back_populates="participants"); status = relationship("Status")
+class TrainingParticipant(Base): __tablename__ = 'training_participants'; training_id = Column(String(50), ForeignKey('trainings.id'), primary_key=True); client_id = Column(String(50), ForeignKey('clients.id'), primary_key=True); status_name = Column(String(50), ForeignKey('statuses.name')); booked_at = Column(TIMESTAMP, nullable=True); training = relationship("Training", back_populates="participants"); client = relationship("Client", back_populates="participants"); status = relationship("Status")
 class ClientContact(Base): __tablename__ = 'client_contacts'; client_id = Column(String(50), ForeignKey('clients.id'), primary_key=True); contact_type = Column(String(20), primary_key=True); contact_value = Column(String(254), nullable=False); client = relationship("Client", back_populates="contacts")
 class Payment(Base): __tablename__ = 'payments'; id = Column(String(50), primary_key=True); client_subscription_id = Column(String(50), ForeignKey('client_subscriptions.id'), nullable=False, unique=True); amount = Column(Numeric(10, 2), nullable=False); date = Column(Date, nullable=False); method_id = Column(String(20), ForeignKey('payment_methods.id'), nullable=False); client_subscription = relationship("ClientSubscription", back_populates="payment"); method = relationship("PaymentMethod")
-class Warning(Base): __tablename__ = 'warnings'; id = Column(Integer, primary_key=True, autoincrement=True); client_id = Column(String(50), ForeignKey('clients.id'), nullable=False); staff_id = Column(String(50), ForeignKey('staff.id'), nullable=False); date = Column(Date, nullable=False); reason = Column(String(200), nullable=False); client = relationship("Client", back_populates="warnings"); staff = relationship("Staff", back_populates="warnings")
\ No newline at end of file
+class Warning(Base): __tablename__ = 'warnings'; id = Column(Integer, primary_key=True, autoincrement=True); client_id = Column(String(50), ForeignKey('clients.id'), nullable=False); staff_id = Column(String(50), ForeignKey('staff.id'), nullable=False); date = Column(Date, nullable=False); reason = Column(String(200), nullable=False); client = relationship("Client", back_populates="warnings"); staff = relationship("Staff", back_populates="warnings")
+
+
+
+# Отчётные агрегаты. Обновляются database/reports.py в том же flush, что и платежи,
+# записи и тренировки, поэтому страница отчётов не читает исходные таблицы.
+class RevenueDaily(Base):
+    __tablename__ = 'report_revenue_daily'
+    day = Column(Date, primary_key=True)
+    method_id = Column(String(20), ForeignKey('payment_methods.id'), primary_key=True)
+    subscription_type_id = Column(String(50), ForeignKey('subscription_types.id'), primary_key=True)
+    payments_count = Column(Integer, default=0, server_default="0", nullable=False)
+    amount = Column(Numeric(14, 2), default=0, server_default="0", nullable=False)
+
+    method = relationship("PaymentMethod")
+    subscription_type = relationship("SubscriptionType")
+
+class AttendanceWeekly(Base):
+    __tablename__ = 'report_attendance_weekly'
+    week_start = Column(Date, primary_key=True)  # понедельник
+    section_id = Column(String(50), ForeignKey('sections.id'), primary_key=True)
+    trainer_id = Column(String(50), primary_key=True)  # '' — тренировки без тренера
+    trainings_count = Column(Integer, default=0, server_default="0", nullable=False)
+    capacity = Column(Integer, default=0, server_default="0", nullable=False)
+    visits = Column(Integer, default=0, server_default="0", nullable=False)  # подтверждённые записи
+
+# Индексы под фильтры и сортировки дашбордов. Составные индексы (поле, id) повторяют
+# ключи курсорной пагинации crud.paginate, частичные покрывают самые частые выборки.
+# Для уже существующих баз их создаёт database.sql_objects.create_indexes().
+Index("ix_clients_last_name_id", Client.last_name, Client.id)
+Index("ix_clients_first_name_id", Client.first_name, Client.id)
+Index("ix_clients_reg_date_id", Client.reg_date, Client.id)
+
+Index("ix_staff_last_name_id", Staff.last_name, Staff.id)
+Index("ix_staff_hire_date_id", Staff.hire_date, Staff.id)
+Index("ix_staff_position_id", Staff.position_id)
+
+Index("ix_users_client_id", User.client_id)
+Index("ix_users_staff_id", User.staff_id)
+Index("ix_revoked_tokens_expires_at", RevokedToken.expires_at)
+
+Index("ix_trainings_start_time_id", Training.start_time, Training.id)
+Index("ix_trainings_name_id", Training.name, Training.id)
+Index("ix_trainings_trainer_start_time", Training.trainer_id, Training.start_time)
+Index("ix_trainings_section_start_time", Training.section_id, Training.start_time)
+Index("ix_trainings_series_start_time", Training.series_id, Training.start_time)
+Index("ix_training_access_subscription_type", training_subscription_access.c.subscription_type_id)
+
+Index("ix_training_participants_client_id", TrainingParticipant.client_id)
+Index(
+    "ix_training_participants_waitlist", TrainingParticipant.training_id, TrainingParticipant.booked_at,
+    postgresql_where=TrainingParticipant.status_name == "waitlisted",
+    sqlite_where=TrainingParticipant.status_name == "waitlisted",
+)
+
+Index("ix_client_subscriptions_client_status", ClientSubscription.client_id, ClientSubscription.status_name)
+Index("ix_client_subscriptions_end_date_id", ClientSubscription.end_date, ClientSubscription.id)
+Index("ix_client_subscriptions_start_date_id", ClientSubscription.start_date, ClientSubscription.id)
+Index("ix_client_subscriptions_type_id", ClientSubscription.subscription_type_id)
+Index(
+    "ix_client_subscriptions_active_end_date", ClientSubscription.end_date,
+    postgresql_where=ClientSubscription.status_name == "active",
+    sqlite_where=ClientSubscription.status_name == "active",
+)
+
+Index("ix_payments_date_id", Payment.date, Payment.id)
+Index("ix_payments_method_id", Payment.method_id)
+
+Index("ix_warnings_client_id", Warning.client_id)
+Index("ix_warnings_staff_id", Warning.staff_id)
+Index("ix_equipment_section_id", Equipment.section_id)
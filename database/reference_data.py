@@ -0,0 +1,194 @@
+"""
+Кэш справочников (статусы, должности, способы оплаты, секции, типы абонементов).
+
+Справочники меняются редко, а нужны почти каждой странице, поэтому хранятся в
+памяти процесса в виде неизменяемых снимков, не привязанных к сессии. Код,
+изменяющий справочник, вызывает mark_changed(db, ...) до commit: после фиксации
+транзакции локальный кэш сбрасывается, а при REFERENCE_CACHE_NOTIFY=1 остальные
+воркеры узнают об изменении через Postgres LISTEN/NOTIFY. Тот же канал переносит
+изменения таблиц для data_versions.py.
+"""
+import os
+import select
+import threading
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from . import crud, data_versions, models
+from .session import engine
+
+NOTIFY_CHANNEL = "reference_data"
+REFERENCE_CACHE_NOTIFY = os.getenv("REFERENCE_CACHE_NOTIFY", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class StatusRef(NamedTuple):
+    name: str
+    description: Optional[str]
+
+class PositionRef(NamedTuple):
+    id: str
+    name: str
+    min_salary: Decimal
+    max_salary: Decimal
+
+class PaymentMethodRef(NamedTuple):
+    id: str
+    name: str
+
+class SectionRef(NamedTuple):
+    id: str
+    name: str
+    status_name: Optional[str]
+
+class SubscriptionTypeRef(NamedTuple):
+    id: str
+    name: str
+    cost: Decimal
+    description: Optional[str]
+
+
+_LOADERS = {
+    "statuses": lambda db: [
+        StatusRef(s.name, s.description)
+        for s in db.query(models.Status).order_by(models.Status.name)
+    ],
+    "positions": lambda db: [
+        PositionRef(p.id, p.name, p.min_salary, p.max_salary)
+        for p in db.query(models.Position).order_by(models.Position.name)
+    ],
+    "payment_methods": lambda db: [
+        PaymentMethodRef(m.id, m.name)
+        for m in db.query(models.PaymentMethod).order_by(models.PaymentMethod.id)
+    ],
+    "sections": lambda db: [
+        SectionRef(s.id, s.name, s.status_name)
+        for s in crud.get_all_sections(db)
+    ],
+    "subscription_types": lambda db: [
+        SubscriptionTypeRef(t.id, t.name, t.cost, t.description)
+        for t in db.query(models.SubscriptionType).order_by(models.SubscriptionType.name)
+    ],
+}
+KINDS = tuple(_LOADERS)
+
+_lock = threading.Lock()
+_cache = {}
+_generation = {kind: 0 for kind in KINDS}
+
+
+def get_reference(db: Session, kind: str) -> tuple:
+    items = _cache.get(kind)
+    if items is not None:
+        return items
+    with _lock:
+        generation = _generation[kind]
+    items = tuple(_LOADERS[kind](db))
+    with _lock:
+        # Если справочник сбросили, пока шла загрузка, результат мог устареть — не кэшируем.
+        if _generation[kind] == generation:
+            _cache[kind] = items
+    return items
+
+def get_statuses(db: Session):
+    return get_reference(db, "statuses")
+
+def get_positions(db: Session):
+    return get_reference(db, "positions")
+
+def get_payment_methods(db: Session):
+    return get_reference(db, "payment_methods")
+
+def get_sections(db: Session):
+    return get_reference(db, "sections")
+
+def get_subscription_types(db: Session):
+    return get_reference(db, "subscription_types")
+
+def get_subscription_type(db: Session, subscription_type_id: str) -> Optional[SubscriptionTypeRef]:
+    return next((t for t in get_subscription_types(db) if t.id == subscription_type_id), None)
+
+def invalidate(*kinds: str):
+    """Сбрасывает локальный кэш указанных справочников (всех, если не указаны)."""
+    with _lock:
+        for kind in kinds or KINDS:
+            if kind in _generation:
+                _generation[kind] += 1
+                _cache.pop(kind, None)
+
+def mark_changed(db: Session, *kinds: str):
+    """
+    Отмечает справочники, изменённые в текущей транзакции. Вызывается до commit:
+    NOTIFY в Postgres транзакционный и будет доставлен другим воркерам только при фиксации.
+    """
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Неизвестные справочники: {', '.join(sorted(unknown))}")
+    db.info.setdefault("reference_changes", set()).update(kinds)
+    if REFERENCE_CACHE_NOTIFY and engine.dialect.name == "postgresql":
+        for kind in kinds:
+            db.execute(text("SELECT pg_notify(:channel, :kind)"), {"channel": NOTIFY_CHANNEL, "kind": kind})
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    kinds = session.info.pop("reference_changes", None)
+    if kinds:
+        invalidate(*kinds)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("reference_changes", None)
+
+
+def _dispatch(payload: str):
+    if payload.startswith(data_versions.NOTIFY_PREFIX):
+        data_versions.bump(payload[len(data_versions.NOTIFY_PREFIX):])
+    else:
+        invalidate(payload)
+
+class _NotifyListener(threading.Thread):
+    """Фоновый поток, слушающий канал NOTIFY и сбрасывающий кэш по сигналам других воркеров."""
+
+    def __init__(self):
+        super().__init__(name="reference-data-listener", daemon=True)
+        self.stopped = threading.Event()
+
+    def run(self):
+        import psycopg2
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while not self.stopped.is_set():
+            try:
+                connection = psycopg2.connect(dsn)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Пока соединения не было, уведомления могли потеряться.
+                invalidate()
+                data_versions.bump()
+                while not self.stopped.is_set():
+                    if select.select([connection], [], [], 5)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            _dispatch(connection.notifies.pop(0).payload)
+                connection.close()
+            except psycopg2.Error as e:
+                print(f"Слушатель справочников потерял соединение: {e}")
+                self.stopped.wait(5)
+
+_listener = None
+
+def start_listener():
+    global _listener
+    if not REFERENCE_CACHE_NOTIFY or engine.dialect.name != "postgresql" or _listener is not None:
+        return
+    _listener = _NotifyListener()
+    _listener.start()
+
+def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stopped.set()
+        _listener = None
@@ -0,0 +1,239 @@
+"""
+Отчётные агрегаты report_revenue_daily и report_attendance_weekly.
+
+Как и счётчики тренировок (training_counters.py), агрегаты сдвигаются в том же
+flush, что и исходные строки: вставка, изменение или удаление Payment,
+TrainingParticipant и Training добавляет дельту к своей строке агрегата одним
+INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x; пакетная продажа
+абонементов учитывает свои платежи явно через add_revenue(). Страница отчётов читает
+только эти таблицы, их размер зависит от числа дней и секций, а не от числа
+платежей и записей.
+
+Любая запись в эти таблицы в обход событий ORM — bulk_insert, COPY, выражения
+insert()/update()/delete(), Query.update()/Query.delete() — должна либо сдвинуть
+агрегаты сама (shift_trainings(), add_revenue()), либо завершиться вызовом
+rebuild(); иначе в отчётах останутся строки удалённых или старые значения
+изменённых данных. rebuild() посещаемость берёт из счётчиков тренировок, поэтому
+после массовой вставки участников сначала нужен training_counters.recount().
+Пакетные операции над частью тренировок (серии в services/series.py, очистка в
+benchmarks/booking_stress.py) вызывают shift_trainings() до своего DELETE или
+до и после UPDATE.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import Date, cast, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import models
+
+CONFIRMED = "confirmed"
+TRAINING_KEY_FIELDS = ("start_time", "section_id", "trainer_id")
+PAYMENT_KEY_FIELDS = ("date", "method_id", "client_subscription_id", "amount")
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def _add(connection, model, key: dict, deltas: dict):
+    """Прибавляет deltas к строке агрегата с ключом key, создавая её при необходимости."""
+    if not any(deltas.values()):
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_ = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert_(model).values({**key, **deltas})
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: getattr(model, name) + statement.excluded[name] for name in deltas},
+        )
+        connection.execute(statement)
+        return
+    key_filter = [getattr(model, name) == value for name, value in key.items()]
+    updated = connection.execute(
+        update(model).where(*key_filter).values({name: getattr(model, name) + delta for name, delta in deltas.items()})
+    )
+    if updated.rowcount == 0:
+        connection.execute(insert(model).values({**key, **deltas}))
+
+def _old_values(target, fields) -> dict:
+    """Значения полей до изменения в текущем flush."""
+    values = {}
+    for field in fields:
+        history = get_history(target, field)
+        values[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    return values
+
+def _changed(target, fields) -> bool:
+    return any(get_history(target, field).has_changes() for field in fields)
+
+
+# --- Выручка ---
+
+def _subscription_type_id(connection, target, client_subscription_id):
+    subscription = target.__dict__.get("client_subscription")
+    if subscription is not None and subscription.id == client_subscription_id and "subscription_type_id" in subscription.__dict__:
+        return subscription.subscription_type_id
+    return connection.execute(
+        select(models.ClientSubscription.subscription_type_id).where(models.ClientSubscription.id == client_subscription_id)
+    ).scalar_one()
+
+def _shift_revenue(connection, target, values: dict, sign: int):
+    _add(connection, models.RevenueDaily, {
+        "day": values["date"],
+        "method_id": values["method_id"],
+        "subscription_type_id": _subscription_type_id(connection, target, values["client_subscription_id"]),
+    }, {"payments_count": sign, "amount": sign * values["amount"]})
+
+def add_revenue(db: Session, day: date, method_id: str, subscription_type_id: str, payments_count: int, amount):
+    """Учитывает платежи, вставленные пакетом в обход ORM (crud.sell_subscriptions), в рамках транзакции db."""
+    _add(db.connection(), models.RevenueDaily,
+         {"day": day, "method_id": method_id, "subscription_type_id": subscription_type_id},
+         {"payments_count": payments_count, "amount": amount})
+
+@event.listens_for(models.Payment, "after_insert")
+def _payment_inserted(mapper, connection, target):
+    _shift_revenue(connection, target, {field: getattr(target, field) for field in PAYMENT_KEY_FIELDS}, 1)
+
+@event.listens_for(models.Payment, "after_delete")
+def _payment_deleted(mapper, connection, target):
+    _shift_revenue(connection, target, _old_values(target, PAYMENT_KEY_FIELDS), -1)
+
+@event.listens_for(models.Payment, "after_update")
+def _payment_updated(mapper, connection, target):
+    if _changed(target, PAYMENT_KEY_FIELDS):
+        _shift_revenue(connection, target, _old_values(target, PAYMENT_KEY_FIELDS), -1)
+        _shift_revenue(connection, target, {field: getattr(target, field) for field in PAYMENT_KEY_FIELDS}, 1)
+
+
+# --- Посещаемость ---
+
+def _attendance_key(start_time, section_id, trainer_id) -> dict:
+    return {"week_start": week_start(start_time.date()), "section_id": section_id, "trainer_id": trainer_id or ""}
+
+def _training_key(session, connection, training_id) -> dict:
+    # Тренировка при записи обычно уже загружена (booking блокирует её строку) — обходимся без SELECT.
+    training = session.identity_map.get(session.identity_key(models.Training, training_id)) if session else None
+    if training is not None and not set(TRAINING_KEY_FIELDS) & inspect(training).unloaded:
+        return _attendance_key(training.start_time, training.section_id, training.trainer_id)
+    row = connection.execute(
+        select(models.Training.start_time, models.Training.section_id, models.Training.trainer_id)
+        .where(models.Training.id == training_id)
+    ).one()
+    return _attendance_key(*row)
+
+def _shift_visits(target, connection, delta: int):
+    session = Session.object_session(target)
+    _add(connection, models.AttendanceWeekly, _training_key(session, connection, target.training_id), {"visits": delta})
+
+@event.listens_for(models.TrainingParticipant, "after_insert")
+def _participant_inserted(mapper, connection, target):
+    if target.status_name == CONFIRMED:
+        _shift_visits(target, connection, 1)
+
+@event.listens_for(models.TrainingParticipant, "after_delete")
+def _participant_deleted(mapper, connection, target):
+    if _old_values(target, ("status_name",))["status_name"] == CONFIRMED:
+        _shift_visits(target, connection, -1)
+
+@event.listens_for(models.TrainingParticipant, "after_update")
+def _participant_updated(mapper, connection, target):
+    history = get_history(target, "status_name")
+    was_confirmed = (history.deleted[0] if history.deleted else target.status_name) == CONFIRMED
+    is_confirmed = target.status_name == CONFIRMED
+    if was_confirmed != is_confirmed:
+        _shift_visits(target, connection, 1 if is_confirmed else -1)
+
+@event.listens_for(models.Training, "after_insert")
+def _training_inserted(mapper, connection, target):
+    _add(connection, models.AttendanceWeekly,
+         _attendance_key(target.start_time, target.section_id, target.trainer_id),
+         {"trainings_count": 1, "capacity": target.max_participants})
+
+@event.listens_for(models.Training, "after_delete")
+def _training_deleted(mapper, connection, target):
+    old = _old_values(target, TRAINING_KEY_FIELDS + ("max_participants",))
+    _add(connection, models.AttendanceWeekly,
+         _attendance_key(old["start_time"], old["section_id"], old["trainer_id"]),
+         {"trainings_count": -1, "capacity": -old["max_participants"]})
+
+@event.listens_for(models.Training, "after_update")
+def _training_updated(mapper, connection, target):
+    if not _changed(target, TRAINING_KEY_FIELDS + ("max_participants",)):
+        return
+    old = _old_values(target, TRAINING_KEY_FIELDS + ("max_participants",))
+    # Счётчик в базе актуален: атрибут мог устареть после сдвига из training_counters.
+    confirmed = connection.execute(
+        select(models.Training.confirmed_count).where(models.Training.id == target.id)
+    ).scalar_one()
+    _add(connection, models.AttendanceWeekly,
+         _attendance_key(old["start_time"], old["section_id"], old["trainer_id"]),
+         {"trainings_count": -1, "capacity": -old["max_participants"], "visits": -confirmed})
+    _add(connection, models.AttendanceWeekly,
+         _attendance_key(target.start_time, target.section_id, target.trainer_id),
+         {"trainings_count": 1, "capacity": target.max_participants, "visits": confirmed})
+
+def shift_trainings(db: Session, condition, sign: int):
+    """
+    Вычитает (sign=-1) или прибавляет (sign=1) тренировки, отобранные condition,
+    к агрегату посещаемости — для вставок, изменений и удалений в обход ORM.
+    На Postgres и SQLite это один INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    """
+    connection = db.connection()
+    dialect = connection.dialect.name
+    week = _week_start_expression(dialect, models.Training.start_time)
+    trainer = func.coalesce(models.Training.trainer_id, "")
+    deltas = select(
+        week.label("week_start"), models.Training.section_id, trainer.label("trainer_id"),
+        (sign * func.count()).label("trainings_count"),
+        (sign * func.sum(models.Training.max_participants)).label("capacity"),
+        (sign * func.sum(models.Training.confirmed_count)).label("visits"),
+    ).where(condition).group_by(week, models.Training.section_id, trainer)
+    if dialect in ("postgresql", "sqlite"):
+        insert_ = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        columns = ["week_start", "section_id", "trainer_id", "trainings_count", "capacity", "visits"]
+        statement = insert_(models.AttendanceWeekly).from_select(columns, deltas)
+        statement = statement.on_conflict_do_update(
+            index_elements=columns[:3],
+            set_={name: getattr(models.AttendanceWeekly, name) + statement.excluded[name] for name in columns[3:]},
+        )
+        connection.execute(statement)
+        return
+    for row in connection.execute(deltas).all():
+        _add(connection, models.AttendanceWeekly,
+             {"week_start": row.week_start, "section_id": row.section_id, "trainer_id": row.trainer_id},
+             {"trainings_count": row.trainings_count, "capacity": row.capacity, "visits": row.visits})
+
+
+# --- Полный пересчёт ---
+
+def _week_start_expression(dialect_name, column):
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc("week", column), Date)
+    if dialect_name == "sqlite":
+        return func.date(column, "weekday 0", "-6 days", type_=Date)
+    raise NotImplementedError(f"rebuild() не поддерживает {dialect_name}")
+
+def rebuild(db: Session):
+    """Пересчитывает агрегаты целиком по исходным таблицам; фиксирует транзакцию вызывающий."""
+    db.execute(delete(models.RevenueDaily))
+    db.execute(insert(models.RevenueDaily).from_select(
+        ["day", "method_id", "subscription_type_id", "payments_count", "amount"],
+        select(
+            models.Payment.date, models.Payment.method_id, models.ClientSubscription.subscription_type_id,
+            func.count(), func.sum(models.Payment.amount)
+        ).join(models.ClientSubscription, models.Payment.client_subscription_id == models.ClientSubscription.id)
+        .group_by(models.Payment.date, models.Payment.method_id, models.ClientSubscription.subscription_type_id)
+    ))
+
+    week = _week_start_expression(db.get_bind().dialect.name, models.Training.start_time)
+    trainer = func.coalesce(models.Training.trainer_id, "")
+    db.execute(delete(models.AttendanceWeekly))
+    db.execute(insert(models.AttendanceWeekly).from_select(
+        ["week_start", "section_id", "trainer_id", "trainings_count", "capacity", "visits"],
+        select(
+            week, models.Training.section_id, trainer,
+            func.count(), func.sum(models.Training.max_participants), func.sum(models.Training.confirmed_count)
+        ).group_by(week, models.Training.section_id, trainer)
+    ))
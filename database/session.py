@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,7 +14,76 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("Необходимо установить переменную окружения DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")
+# "transaction" — соединения идут через PgBouncer в режиме transaction pooling:
+# пулом управляет PgBouncer, а приложение не держит своих соединений и не кэширует
+# подготовленные выражения (они не переживают смену серверного соединения).
+DB_PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER_MODE", "").strip().lower()
+
+if DB_PGBOUNCER_MODE not in ("", "session", "transaction"):
+    raise ValueError("DB_PGBOUNCER_MODE должен быть пустым, 'session' или 'transaction'")
+
+
+_pool_stats_lock = threading.Lock()
+_pool_wait = {}
+_pool_timeouts = {}
+
+def _record_pool_wait(label: str, seconds: float, timed_out: bool):
+    # Импорт здесь, а не в начале модуля: services импортирует database при инициализации пакета.
+    from services.metrics import Histogram
+    with _pool_stats_lock:
+        histogram = _pool_wait.get(label)
+        if histogram is None:
+            histogram = _pool_wait[label] = Histogram()
+        if timed_out:
+            _pool_timeouts[label] = _pool_timeouts.get(label, 0) + 1
+    histogram.observe(seconds)
+
+class _WaitTimingMixin:
+    """Замеряет, сколько запрос ждал свободного соединения из пула."""
+    stats_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            _record_pool_wait(self.stats_label, time.perf_counter() - started, timed_out)
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    stats_label = "sync"
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    stats_label = "async"
+
+def engine_options(async_mode: bool = False) -> dict:
+    """Параметры create_engine / create_async_engine с учётом настроек пула из окружения."""
+    if DB_PGBOUNCER_MODE == "transaction":
+        options = {"poolclass": NullPool}
+        if async_mode and make_url(get_async_database_url()).get_backend_name() == "postgresql":
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if async_mode else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, **engine_options())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -19,4 +92,76 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Асинхронные драйверы для диалектов синхронного DATABASE_URL.
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+_async_engine = None
+_AsyncSessionLocal = None
+
+def get_async_database_url() -> str:
+    """ASYNC_DATABASE_URL, либо DATABASE_URL с заменой драйвера на асинхронный."""
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    url = make_url(DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"Нет асинхронного драйвера для {url.get_backend_name()}, задайте ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+def get_async_engine():
+    """Создаёт AsyncEngine при первом обращении, чтобы драйвер (asyncpg) требовался только при использовании."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        _async_engine = create_async_engine(get_async_database_url(), **engine_options(async_mode=True))
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+async def get_async_db():
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _AsyncSessionLocal = None
+
+def _describe_pool(label: str, pool) -> dict:
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+        })
+    with _pool_stats_lock:
+        histogram = _pool_wait.get(label)
+        stats["timeouts"] = _pool_timeouts.get(label, 0)
+    stats["wait_seconds"] = histogram.snapshot() if histogram else None
+    return stats
+
+def get_pool_stats() -> dict:
+    """Состояние пулов соединений: занятость, переполнение, таймауты и гистограмма ожидания."""
+    stats = {
+        "settings": {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "pgbouncer_mode": DB_PGBOUNCER_MODE or None,
+        },
+        "sync": _describe_pool("sync", engine.pool),
+    }
+    if _async_engine is not None:
+        stats["async"] = _describe_pool("async", _async_engine.pool)
+    return stats
@@ -1,6 +1,7 @@
 import os
 from sqlalchemy import text
 from .session import engine
+from .models import Base
 
 def create_sql_objects():
     """Создает триггеры, представления и другие SQL-объекты, выполняя скрипт целиком."""
@@ -19,9 +20,23 @@ def create_sql_objects():
             connection.execute(text(sql_script))
             connection.commit()
         print("SQL-скрипт успешно выполнен.")
+        create_indexes()
     except Exception as e:
         print("="*50)
         print("!!! ПРОИЗОШЛА ОШИБКА ПРИ ВЫПОЛНЕНИИ SQL-СКРИПТА !!!")
         print(f"Файл: {sql_file_path}")
         print(f"Ошибка: {e}")
-        print("="*50)
\ No newline at end of file
+        print("="*50)
+
+def create_indexes():
+    """Создает недостающие индексы, объявленные в моделях (create_all не добавляет их к существующим таблицам)."""
+    created = []
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not connection.dialect.has_index(connection, table.name, index.name):
+                    index.create(connection)
+                    created.append(index.name)
+    if created:
+        print(f"Созданы индексы: {', '.join(created)}")
+    return created
@@ -39,13 +39,24 @@ BEFORE INSERT OR UPDATE ON client_subscriptions
 FOR EACH ROW EXECUTE FUNCTION update_client_subscription_status();
 
 
+-- Лист ожидания (для баз, созданных до его появления)
+ALTER TABLE training_participants ADD COLUMN IF NOT EXISTS booked_at TIMESTAMP;
+INSERT INTO statuses (name, description) VALUES ('waitlisted', 'В листе ожидания') ON CONFLICT (name) DO NOTHING;
+
+-- Счётчики записей на тренировки (поддерживаются приложением, см. database/training_counters.py)
+ALTER TABLE trainings ADD COLUMN IF NOT EXISTS confirmed_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE trainings ADD COLUMN IF NOT EXISTS waitlisted_count INTEGER NOT NULL DEFAULT 0;
+UPDATE trainings t SET
+    confirmed_count = (SELECT COUNT(*) FROM training_participants tp WHERE tp.training_id = t.id AND tp.status_name = 'confirmed'),
+    waitlisted_count = (SELECT COUNT(*) FROM training_participants tp WHERE tp.training_id = t.id AND tp.status_name = 'waitlisted');
+
 CREATE OR REPLACE FUNCTION check_max_participants()
 RETURNS TRIGGER AS $$
 DECLARE
     max_allowed INT;
     current_count INT;
 BEGIN
-    IF NEW.status_name = 'confirmed' THEN
+    IF NEW.status_name = 'confirmed' AND (TG_OP = 'INSERT' OR OLD.status_name IS DISTINCT FROM 'confirmed') THEN
         SELECT t.max_participants INTO max_allowed FROM trainings t WHERE t.id = NEW.training_id;
         SELECT COUNT(*) INTO current_count FROM training_participants tp WHERE tp.training_id = NEW.training_id AND tp.status_name = 'confirmed';
 
@@ -59,9 +70,51 @@ $$ LANGUAGE plpgsql;
 
 DROP TRIGGER IF EXISTS trg_check_max_participants ON training_participants;
 CREATE TRIGGER trg_check_max_participants
-BEFORE INSERT ON training_participants
+BEFORE INSERT OR UPDATE OF status_name ON training_participants
 FOR EACH ROW EXECUTE FUNCTION check_max_participants();
 
+-- Пересечения расписания (см. services/schedule.py): тренер и секция не могут быть
+-- заняты двумя тренировками одновременно. btree_gist нужен для "=" по строковым
+-- колонкам в GiST. Если в базе уже есть пересечения, ограничение не создаётся —
+-- новые тренировки всё равно проверяет приложение.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_trainings_trainer_period') THEN
+        ALTER TABLE trainings ADD CONSTRAINT ex_trainings_trainer_period
+            EXCLUDE USING gist (trainer_id WITH =, tsrange(start_time, end_time) WITH &&)
+            WHERE (trainer_id IS NOT NULL);
+    END IF;
+EXCEPTION WHEN exclusion_violation OR data_exception THEN
+    RAISE NOTICE 'ex_trainings_trainer_period не создано: в расписании есть пересечения тренеров (%)', SQLERRM;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_trainings_section_period') THEN
+        ALTER TABLE trainings ADD CONSTRAINT ex_trainings_section_period
+            EXCLUDE USING gist (section_id WITH =, tsrange(start_time, end_time) WITH &&);
+    END IF;
+EXCEPTION WHEN exclusion_violation OR data_exception THEN
+    RAISE NOTICE 'ex_trainings_section_period не создано: в расписании есть пересечения секций (%)', SQLERRM;
+END $$;
+
+-- Серии повторяющихся тренировок (таблицу training_series создаёт create_all)
+ALTER TABLE trainings ADD COLUMN IF NOT EXISTS series_id VARCHAR(50) REFERENCES training_series(id);
+
+-- Поиск клиентов (database/crud.py: client_search_condition). Выражения индексов
+-- должны совпадать с выражениями в запросах.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_clients_full_name_trgm ON clients
+    USING gin (lower(last_name || ' ' || first_name || ' ' || coalesce(middle_name, '')) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_clients_last_name_prefix ON clients (lower(last_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_client_contacts_phone_digits_trgm ON client_contacts
+    USING gin (regexp_replace(contact_value, '\D', '', 'g') gin_trgm_ops) WHERE contact_type = 'phone';
+
+-- Версия токенов пользователя (services/auth.py; таблицу revoked_tokens создаёт create_all)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
 
 DROP VIEW IF EXISTS client_full_info_view CASCADE;
 CREATE VIEW client_full_info_view AS
@@ -96,10 +149,10 @@ FROM staff s
 LEFT JOIN positions p ON s.position_id = p.id;
 
 
+-- Индексы объявлены в database/models.py; здесь удаляются их прежние версии.
 DROP INDEX IF EXISTS idx_subscription_client_status;
 DROP INDEX IF EXISTS idx_subscription_dates;
-
-CREATE INDEX IF NOT EXISTS idx_client_subscription_client_status ON client_subscriptions(client_id, status_name);
-CREATE INDEX IF NOT EXISTS idx_client_subscription_dates ON client_subscriptions(start_date, end_date);
-CREATE INDEX IF NOT EXISTS idx_training_start_time ON trainings(start_time);
-CREATE INDEX IF NOT EXISTS idx_warnings_client ON warnings(client_id);
\ No newline at end of file
+DROP INDEX IF EXISTS idx_client_subscription_client_status;
+DROP INDEX IF EXISTS idx_client_subscription_dates;
+DROP INDEX IF EXISTS idx_training_start_time;
+DROP INDEX IF EXISTS idx_warnings_client;
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Поддержка счётчиков Training.confirmed_count / waitlisted_count.
+
+Любая вставка, смена статуса или удаление TrainingParticipant через ORM
+(запись, отмена, каскадное удаление клиента) в том же flush сдвигает счётчик
+тренировки атомарным UPDATE ... SET x = x + delta. Массовые операции в обход
+ORM (bulk_insert, query.delete) должны обновлять счётчики сами либо вызывать
+recount().
+"""
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import models
+
+COUNTER_COLUMNS = {
+    "confirmed": models.Training.confirmed_count,
+    "waitlisted": models.Training.waitlisted_count,
+}
+
+
+def _shift(session, connection, training_id, status_name, delta):
+    column = COUNTER_COLUMNS.get(status_name)
+    if column is None:
+        return
+    connection.execute(
+        update(models.Training).where(models.Training.id == training_id).values({column.key: column + delta})
+    )
+    if session is not None:
+        session.info.setdefault("touched_trainings", set()).add(training_id)
+
+def _committed_status(target):
+    history = get_history(target, "status_name")
+    if history.deleted:
+        return history.deleted[0]
+    return target.status_name
+
+@event.listens_for(models.TrainingParticipant, "after_insert")
+def _after_insert(mapper, connection, target):
+    _shift(Session.object_session(target), connection, target.training_id, target.status_name, 1)
+
+@event.listens_for(models.TrainingParticipant, "after_delete")
+def _after_delete(mapper, connection, target):
+    _shift(Session.object_session(target), connection, target.training_id, _committed_status(target), -1)
+
+@event.listens_for(models.TrainingParticipant, "after_update")
+def _after_update(mapper, connection, target):
+    history = get_history(target, "status_name")
+    if not history.has_changes():
+        return
+    session = Session.object_session(target)
+    if history.deleted:
+        _shift(session, connection, target.training_id, history.deleted[0], -1)
+    _shift(session, connection, target.training_id, target.status_name, 1)
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_touched_trainings(session, flush_context):
+    # Счётчики изменены в обход ORM: загруженные тренировки перечитают их при следующем обращении.
+    for training_id in session.info.pop("touched_trainings", ()):
+        training = session.identity_map.get(session.identity_key(models.Training, training_id))
+        if training is not None:
+            session.expire(training, ["confirmed_count", "waitlisted_count"])
+
+
+def recount(db: Session, training_ids=None):
+    """Пересчитывает счётчики по таблице участников (после массовых операций в обход ORM)."""
+    for status_name, column in COUNTER_COLUMNS.items():
+        count = select(func.count()).select_from(models.TrainingParticipant).where(
+            models.TrainingParticipant.training_id == models.Training.id,
+            models.TrainingParticipant.status_name == status_name
+        ).scalar_subquery()
+        statement = update(models.Training).values({column.key: count})
+        if training_ids is not None:
+            statement = statement.where(models.Training.id.in_(training_ids))
+        db.execute(statement, execution_options={"synchronize_session": False})
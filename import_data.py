@@ -0,0 +1,41 @@
+import argparse
+import sys
+import os
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from database import SessionLocal
+from services import bulk_import
+
+
+def import_data():
+    """
+    Загружает клиентов или сотрудников из CSV/XLSX-файла.
+    Пример: python import_data.py clients clients.csv --batch-size 5000
+    """
+    parser = argparse.ArgumentParser(description="Массовый импорт клиентов и сотрудников")
+    parser.add_argument("kind", choices=sorted(bulk_import.IMPORTERS))
+    parser.add_argument("file")
+    parser.add_argument("--batch-size", type=int, default=bulk_import.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.file, "rb") as stream:
+            report = bulk_import.import_file(db, args.kind, stream, args.file, args.batch_size)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"Импортировано записей: {report.imported}")
+    if report.errors:
+        print(f"Строк с ошибками: {len(report.errors)}")
+        for row_number, message in report.errors:
+            print(f"  строка {row_number}: {message}")
+
+
+if __name__ == "__main__":
+    import_data()
@@ -1,15 +1,38 @@
 from fastapi import FastAPI, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from datetime import datetime
-
-from database import get_db, models
-from services.auth import authenticate_user, create_access_token, get_current_user_from_cookie
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+import hmac
+import os
+
+from database import get_async_db, dispose_async_engine, models, reference_data
+from services.auth import CurrentUser, PasswordHashingBusy, authenticate_user, create_access_token, get_current_user_from_cookie, revoke_token
+from services.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from services import rate_limit, scheduler, templating
+from services.sql_profiler import QueryStatsMiddleware
+from services.static_assets import HashedStaticFiles
 from routers import admin_router, tech_admin_router, manager_router, cashier_router, trainer_router, client_router
 
-app = FastAPI(title="Спортивный клуб")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    templating.warm_up(app.state.templates)
+    reference_data.start_listener()
+    if scheduler.SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    reference_data.stop_listener()
+    await dispose_async_engine()
+
+app = FastAPI(title="Спортивный клуб", lifespan=lifespan)
+app.add_middleware(QueryStatsMiddleware)
+# HTML дашбордов сжимается на лету; статика уже сжата заранее и проходит без изменений.
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+
+# Токен для сборщика метрик (Authorization: Bearer ...); без него /metrics доступен только сессиям
+# tech_admin и admin — admin, как и в require_role, проходит любую проверку роли.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
 app.include_router(tech_admin_router, prefix="/tech_admin", tags=["Tech Admin"])
@@ -18,34 +41,50 @@ app.include_router(cashier_router, prefix="/cashier", tags=["Cashier"])
 app.include_router(trainer_router, prefix="/trainer", tags=["Trainer"])
 app.include_router(client_router, prefix="/client", tags=["Client"])
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
-
-def datetime_format_filter(value, format='%d.%m.%Y %H:%M'):
-    if isinstance(value, datetime): return value.strftime(format)
-    return value
-templates.env.filters['datetimeformat'] = datetime_format_filter
+static_files = HashedStaticFiles(directory="static", mount_path="/static")
+app.mount("/static", static_files, name="static")
+templates = templating.create_templates("templates")
+templates.env.globals["static_url"] = static_files.url
 app.state.templates = templates
 
 
 @app.get("/", response_class=HTMLResponse)
-async def login_page(request: Request, user: models.User = Depends(get_current_user_from_cookie)):
+async def login_page(request: Request, user: CurrentUser = Depends(get_current_user_from_cookie)):
     if user:
         return RedirectResponse(url=f"/{user.role}/dashboard")
     return templates.TemplateResponse("login.html", {"request": request, "current_user": None})
 
 @app.post("/login", response_class=RedirectResponse)
-async def login_for_access_token(db: Session = Depends(get_db), username: str = Form(...), password: str = Form(...)):
-    user = authenticate_user(db, username, password)
+async def login_for_access_token(request: Request, db: AsyncSession = Depends(get_async_db), username: str = Form(...), password: str = Form(...)):
+    try:
+        # Лимит проверяется первым: отклонённая попытка не стоит ни запроса к базе, ни bcrypt.
+        rate_limit.check_login(request.client.host if request.client else None, username)
+    except rate_limit.LoginRateLimited as e:
+        return RedirectResponse(url=f"/?error=Слишком много попыток входа, повторите через {e.retry_after} с", status_code=303)
+    try:
+        user = await authenticate_user(db, username, password)
+    except PasswordHashingBusy:
+        return RedirectResponse(url="/?error=Сервер перегружен, повторите попытку входа позже", status_code=303)
+    rate_limit.record_login(username, user is not None)
     if not user:
         return RedirectResponse(url="/?error=Неверное имя пользователя или пароль", status_code=303)
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(user)
     response = RedirectResponse(url=f"/{user.role}/dashboard", status_code=303)
     response.set_cookie(key="access_token", value=f"Bearer {access_token}", httponly=True)
     return response
 
 @app.get("/logout", response_class=RedirectResponse)
-async def logout():
+async def logout(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Выход отзывает сам токен: его копия (например, перехваченная cookie) больше не действует.
+    await revoke_token(db, request.cookies.get("access_token"))
     response = RedirectResponse(url="/", status_code=303)
     response.delete_cookie("access_token")
-    return response
\ No newline at end of file
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request, user: CurrentUser = Depends(get_current_user_from_cookie)):
+    authorization = request.headers.get("authorization", "")
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}")
+    if not token_ok and not (user and user.role in ("tech_admin", "admin")):
+        return PlainTextResponse("Доступ запрещен", status_code=403)
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,32 @@
+import sys
+import os
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from database import SessionLocal, engine, models, reports, training_counters
+
+
+def refresh_reports():
+    """
+    Создаёт таблицы отчётных агрегатов, если их нет, и пересчитывает их целиком
+    по платежам и тренировкам. Нужен один раз для существующей базы и после
+    массовых загрузок в обход ORM; в остальное время агрегаты обновляются сами.
+    """
+    models.Base.metadata.create_all(bind=engine, tables=[
+        models.RevenueDaily.__table__, models.AttendanceWeekly.__table__
+    ])
+    db = SessionLocal()
+    try:
+        training_counters.recount(db)
+        reports.rebuild(db)
+        db.commit()
+        revenue_rows = db.query(models.RevenueDaily).count()
+        attendance_rows = db.query(models.AttendanceWeekly).count()
+    finally:
+        db.close()
+    print(f"Агрегаты пересчитаны: выручка — {revenue_rows} строк, посещаемость — {attendance_rows} строк")
+
+
+if __name__ == "__main__":
+    refresh_reports()
@@ -1,57 +1,151 @@
-from fastapi import APIRouter, Depends, Form, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, File, Form, Request, HTTPException, Query, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError, DataError, InternalError
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
-from database import crud, models, get_db
-from services.auth import require_role
+from database import crud, models, get_db, reference_data
+from services import bulk_import, export, http_cache
+from services.auth import CurrentUser, require_role
 from services.utils import generate_id
+from services.validators import validate_staff
 
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def admin_dashboard(
+def admin_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("positions")),
     db: Session = Depends(get_db)
 ):
-    all_clients = db.query(models.Client).options(joinedload(models.Client.contacts)).order_by(models.Client.last_name).all()
-    all_staff = db.query(models.Staff).options(joinedload(models.Staff.position)).order_by(models.Staff.last_name).all()
-    all_client_subscriptions = db.query(models.ClientSubscription).options(joinedload(models.ClientSubscription.client), joinedload(models.ClientSubscription.subscription_type), joinedload(models.ClientSubscription.status)).all()
-    all_sections = db.query(models.Section).order_by(models.Section.name).all()
-    all_trainings = db.query(models.Training).options(joinedload(models.Training.section), joinedload(models.Training.trainer), joinedload(models.Training.allowed_subscriptions), joinedload(models.Training.participants).joinedload(models.TrainingParticipant.client)).order_by(models.Training.start_time.desc()).all()
-    
-    all_subscription_types = db.query(models.SubscriptionType).order_by(models.SubscriptionType.name).all()
-    all_trainers = db.query(models.Staff).join(models.Position).filter(models.Position.name == 'Тренер').all()
-    all_positions = db.query(models.Position).all()
-    all_statuses = db.query(models.Status).all()
-
-    clients_for_js = [serialize_client(c) for c in all_clients]
-    
+    # Таблицы вкладок подгружаются постранично через /admin/api/*, здесь только справочник для формы.
+    all_positions = reference_data.get_positions(db)
+
     context = {
         "request": request,
         "current_user": user,
-        "clients": all_clients,
-        "staff": all_staff,
-        "client_subscriptions": all_client_subscriptions,
-        "sections": all_sections,
-        "trainings": all_trainings,
-        "all_clients": all_clients, 
-        "all_subscription_types": all_subscription_types,
-        "all_sections": all_sections,
-        "trainers": all_trainers,
-        "all_statuses": all_statuses,
         "positions": all_positions,
-        "clients_for_js": clients_for_js,
     }
-    return request.app.state.templates.TemplateResponse("admin.html", context)
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("admin.html", context), etag)
+
+def _page_response(rows, next_cursor, serializer, etag: Optional[str] = None):
+    page = {"items": [serializer(row) for row in rows], "next_cursor": next_cursor}
+    return http_cache.with_etag(JSONResponse(page), etag)
+
+def _load_page(user, loader, db: Session, serializer, etag: Optional[str] = None, **params):
+    if not isinstance(user, CurrentUser):
+        # require_role вернул редирект на страницу входа — отдаём его вместо данных.
+        return user
+    try:
+        rows, next_cursor = loader(db, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page_response(rows, next_cursor, serializer, etag)
+
+@router.get("/api/clients")
+def api_clients(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("clients", "client_contacts")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "last_name",
+    desc: bool = False,
+    q: Optional[str] = None
+):
+    return _load_page(user, crud.get_clients, db, serialize_client, etag,
+                      cursor=cursor, limit=limit, sort=sort, descending=desc, search=q)
+
+@router.get("/api/staff")
+def api_staff(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("staff", "positions")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "last_name",
+    desc: bool = False,
+    q: Optional[str] = None,
+    position_id: Optional[str] = None
+):
+    return _load_page(user, crud.get_staff, db, serialize_staff, etag,
+                      cursor=cursor, limit=limit, sort=sort, descending=desc, search=q, position_id=position_id)
+
+@router.get("/api/sections")
+def api_sections(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("sections")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "name",
+    desc: bool = False,
+    q: Optional[str] = None,
+    status_name: Optional[str] = None
+):
+    return _load_page(user, crud.get_sections, db, serialize_section, etag,
+                      cursor=cursor, limit=limit, sort=sort, descending=desc, search=q, status_name=status_name)
+
+@router.get("/api/subscription_types")
+def api_subscription_types(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("subscription_types")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "name",
+    desc: bool = False,
+    q: Optional[str] = None
+):
+    return _load_page(user, crud.get_subscription_types, db, serialize_subscription_type, etag,
+                      cursor=cursor, limit=limit, sort=sort, descending=desc, search=q)
+
+@router.get("/api/client_subscriptions")
+def api_client_subscriptions(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("client_subscriptions", "clients", "subscription_types")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "end_date",
+    desc: bool = True,
+    status_name: Optional[str] = None,
+    client_id: Optional[str] = None
+):
+    return _load_page(user, crud.get_client_subscriptions, db, serialize_client_subscription, etag,
+                      cursor=cursor, limit=limit, sort=sort, descending=desc,
+                      status_name=status_name, client_id=client_id)
+
+@router.get("/api/trainings")
+def api_trainings(
+    user: CurrentUser = Depends(require_role("admin")),
+    etag: Optional[str] = Depends(http_cache.etag_for("trainings", "training_participants", "training_subscription_access", "sections", "staff", "subscription_types", "clients")),
+    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.MAX_PAGE_SIZE),
+    sort: str = "start_time",
+    desc: bool = True,
+    section_id: Optional[str] = None,
+    trainer_id: Optional[str] = None,
+    is_group: Optional[bool] = None
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    try:
+        rows, next_cursor = crud.get_trainings(db, cursor=cursor, limit=limit, sort=sort, descending=desc,
+                                               section_id=section_id, trainer_id=trainer_id, is_group=is_group)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Участники нужны только индивидуальным тренировкам (показываем имя клиента) — один запрос на страницу.
+    names = crud.get_training_client_names(db, [t.id for t in rows if not t.is_group])
+    return _page_response(rows, next_cursor, lambda t: serialize_training(t, names.get(t.id, [])), etag)
 
 @router.post("/add_client")
-async def add_client(
+def add_client(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     last_name: str = Form(...),
     first_name: str = Form(...),
     middle_name: str = Form(None),
@@ -65,9 +159,9 @@ async def add_client(
     return RedirectResponse(url="/admin/dashboard?message=Клиент успешно добавлен", status_code=303)
 
 @router.post("/client/{client_id}/delete")
-async def delete_client(
+def delete_client(
     client_id: str,
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     db: Session = Depends(get_db)
 ):
     if crud.delete_client(db, client_id):
@@ -75,9 +169,9 @@ async def delete_client(
     return RedirectResponse(url="/admin/dashboard?error=Не удалось удалить клиента", status_code=303)
 
 @router.post("/add_staff")
-async def add_staff(
+def add_staff(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     last_name: str = Form(...),
     first_name: str = Form(...),
     middle_name: Optional[str] = Form(None),
@@ -95,38 +189,17 @@ async def add_staff(
     passport_number: Optional[str] = Form(None)
 ):
 
-    if not position_id:
-        return RedirectResponse(url="/admin/dashboard?error=Необходимо выбрать должность.", status_code=303)
-    if not (inn and inn.isdigit() and len(inn) == 12):
-        return RedirectResponse(url="/admin/dashboard?error=ИНН должен состоять ровно из 12 цифр.", status_code=303)  
-    if not (snils and snils.isdigit() and len(snils) == 11):
-        return RedirectResponse(url="/admin/dashboard?error=СНИЛС должен состоять ровно из 11 цифр.", status_code=303)
-    if passport_series and not (passport_series.isdigit() and len(passport_series) == 4):
-        return RedirectResponse(url="/admin/dashboard?error=Серия паспорта должна состоять ровно из 4 цифр.", status_code=303)
-    if passport_number and not (passport_number.isdigit() and len(passport_number) == 6):
-        return RedirectResponse(url="/admin/dashboard?error=Номер паспорта должен состоять ровно из 6 цифр.", status_code=303)
     try:
-        birth_date_obj = datetime.strptime(birth_date, '%Y-%m-%d').date()
-        hire_date_obj = datetime.strptime(hire_date, '%Y-%m-%d').date()
-    except ValueError:
-        return RedirectResponse(url="/admin/dashboard?error=Неверный формат даты. Используйте ГГГГ-ММ-ДД.", status_code=303)
-    if hire_date_obj > datetime.now().date():
-        return RedirectResponse(url="/admin/dashboard?error=Дата приема на работу не может быть в будущем.", status_code=303)
-    
-    from dateutil.relativedelta import relativedelta
-    age = relativedelta(datetime.now().date(), birth_date_obj).years
-    if age < 18:
-        return RedirectResponse(url="/admin/dashboard?error=Сотруднику должно быть не менее 18 лет.", status_code=303)
-
-    staff_data = {
-        "last_name": last_name, "first_name": first_name, "middle_name": middle_name,
-        "birth_date": birth_date_obj, 
-        "gender": gender, "inn": inn, "snils": snils,
-        "hire_date": hire_date_obj, 
-        "position_id": position_id, "phone": phone, "salary": salary, "education": education,
-        "address": address, "passport_series": passport_series, "passport_number": passport_number
-    }
-    
+        staff_data = validate_staff({
+            "last_name": last_name, "first_name": first_name, "middle_name": middle_name,
+            "birth_date": birth_date, "gender": gender, "inn": inn, "snils": snils,
+            "hire_date": hire_date, "position_id": position_id, "phone": phone,
+            "salary": None if salary is None else str(salary), "education": education,
+            "address": address, "passport_series": passport_series, "passport_number": passport_number
+        })
+    except ValueError as e:
+        return RedirectResponse(url=f"/admin/dashboard?error={e}", status_code=303)
+
     try:
         crud.create_staff(db, staff_data)
         return RedirectResponse(url="/admin/dashboard?message=Сотрудник успешно добавлен", status_code=303)
@@ -142,9 +215,9 @@ async def add_staff(
         return RedirectResponse(url=f"/admin/dashboard?error={error_message}", status_code=303)
 
 @router.post("/staff/{staff_id}/delete")
-async def delete_staff(
+def delete_staff(
     staff_id: str,
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     db: Session = Depends(get_db)
 ):
     if crud.delete_staff(db, staff_id):
@@ -152,30 +225,70 @@ async def delete_staff(
     return RedirectResponse(url="/admin/dashboard?error=Не удалось удалить сотрудника", status_code=303)
 
 @router.post("/add_subscription_type")
-async def add_subscription_type(
+def add_subscription_type(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     name: str = Form(...),
     cost: float = Form(...),
     description: str = Form(None)
 ):
     sub_type = models.SubscriptionType(id=generate_id(), name=name, cost=cost, description=description)
     db.add(sub_type)
+    reference_data.mark_changed(db, "subscription_types")
     db.commit()
     return RedirectResponse(url="/admin/dashboard?message=Тип абонемента создан", status_code=303)
 
 @router.post("/add_section")
-async def add_section(
+def add_section(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("admin")),
+    user: CurrentUser = Depends(require_role("admin")),
     name: str = Form(...),
     status_name: str = Form(...)
 ):
     section = models.Section(id=generate_id(), name=name, status_name=status_name)
     db.add(section)
+    reference_data.mark_changed(db, "sections")
     db.commit()
     return RedirectResponse(url="/admin/dashboard?message=Секция успешно добавлена", status_code=303)
 
+@router.post("/import/{kind}")
+def import_data(
+    kind: str,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_role("admin")),
+    file: UploadFile = File(...)
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    if kind not in bulk_import.IMPORTERS:
+        raise HTTPException(status_code=404)
+    try:
+        report = bulk_import.import_file(db, kind, file.file, file.filename or "")
+    except ValueError as e:
+        return RedirectResponse(url=f"/admin/dashboard?error={e}", status_code=303)
+    if report.errors:
+        return RedirectResponse(url=f"/admin/dashboard?error={report.summary()}", status_code=303)
+    return RedirectResponse(url=f"/admin/dashboard?message={report.summary()}", status_code=303)
+
+@router.get("/export/{kind}")
+def export_data(
+    kind: str,
+    user: CurrentUser = Depends(require_role("admin")),
+    format: str = Query("csv"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    if kind not in export.QUERIES or format not in export.FORMATS:
+        raise HTTPException(status_code=404)
+    filename = f"{kind}_{datetime.now():%Y%m%d}.{format}"
+    return StreamingResponse(
+        export.stream_export(kind, format, date_from, date_to),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 def serialize_client(client: models.Client) -> dict:
     """Преобразует объект Client SQLAlchemy в словарь, готовый для JSON."""
     return {
@@ -189,4 +302,52 @@ def serialize_client(client: models.Client) -> dict:
             {"contact_type": c.contact_type, "contact_value": c.contact_value}
             for c in client.contacts
         ]
-    }
\ No newline at end of file
+    }
+
+def serialize_staff(staff: models.Staff) -> dict:
+    return {
+        "id": staff.id,
+        "last_name": staff.last_name,
+        "first_name": staff.first_name,
+        "middle_name": staff.middle_name,
+        "position": staff.position.name if staff.position else None,
+        "phone": staff.phone,
+        "salary": float(staff.salary) if staff.salary is not None else None,
+        "hire_date": staff.hire_date.isoformat() if staff.hire_date else None,
+    }
+
+def serialize_section(section: models.Section) -> dict:
+    return {"id": section.id, "name": section.name, "status_name": section.status_name}
+
+def serialize_subscription_type(sub_type: models.SubscriptionType) -> dict:
+    return {
+        "id": sub_type.id,
+        "name": sub_type.name,
+        "cost": float(sub_type.cost),
+        "description": sub_type.description,
+    }
+
+def serialize_client_subscription(sub: models.ClientSubscription) -> dict:
+    return {
+        "id": sub.id,
+        "client": f"{sub.client.last_name} {sub.client.first_name}" if sub.client else None,
+        "subscription_type": sub.subscription_type.name if sub.subscription_type else None,
+        "start_date": sub.start_date.isoformat(),
+        "end_date": sub.end_date.isoformat(),
+        "status_name": sub.status_name,
+    }
+
+def serialize_training(training: models.Training, participant_names: List[str] = ()) -> dict:
+    return {
+        "id": training.id,
+        "name": training.name,
+        "section": training.section.name if training.section else None,
+        "trainer": f"{training.trainer.first_name} {training.trainer.last_name}" if training.trainer else None,
+        "is_group": training.is_group,
+        "start_time": training.start_time.strftime('%d.%m.%Y %H:%M'),
+        "max_participants": training.max_participants,
+        "allowed_subscriptions": [sub.name for sub in training.allowed_subscriptions] if training.is_group else [],
+        "confirmed_count": training.confirmed_count,
+        "waitlisted_count": training.waitlisted_count,
+        "participants": list(participant_names),
+    }
@@ -1,81 +1,116 @@
 from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.exc import IntegrityError, DataError
 from datetime import datetime
+from typing import List, Optional
 
-from database import crud, models, get_db
-from services.auth import require_role
+from database import crud, models, get_db, reference_data
+from services.auth import CurrentUser, PasswordHashingBusy, get_password_hash_async, require_role
+from services import http_cache
 from services.utils import generate_id
 
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def cashier_dashboard(
+def cashier_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("cashier")),
+    user: CurrentUser = Depends(require_role("cashier")),
+    etag: Optional[str] = Depends(http_cache.etag_for(
+        "payments", "client_subscriptions", "clients", "subscription_types", "payment_methods"
+    )),
     db: Session = Depends(get_db)
 ):
     payments = db.query(models.Payment).options(
         joinedload(models.Payment.client_subscription).joinedload(models.ClientSubscription.client),
         joinedload(models.Payment.method)
     ).order_by(models.Payment.date.desc()).limit(50).all()
-    all_clients = db.query(models.Client).order_by(models.Client.last_name).all()
-    all_subscription_types = db.query(models.SubscriptionType).order_by(models.SubscriptionType.name).all()
-    payment_methods = db.query(models.PaymentMethod).all()
+    all_subscription_types = reference_data.get_subscription_types(db)
+    payment_methods = reference_data.get_payment_methods(db)
 
     context = {
         "request": request,
         "current_user": user,
         "payments": payments,
-        "all_clients": all_clients,
         "all_subscription_types": all_subscription_types,
         "payment_methods": payment_methods
     }
-    return request.app.state.templates.TemplateResponse("cashier.html", context)
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("cashier.html", context), etag)
 
 
+
+@router.get("/api/clients/search")
+def search_clients(
+    user: CurrentUser = Depends(require_role("cashier")),
+    etag: Optional[str] = Depends(http_cache.etag_for("clients", "client_contacts")),
+    db: Session = Depends(get_db),
+    q: str = ""
+):
+    """Подсказка клиентов для форм продажи: по фамилии, имени или телефону."""
+    if not isinstance(user, CurrentUser):
+        return user
+    return http_cache.with_etag(JSONResponse(crud.search_clients(db, q)), etag)
+
+def _sell(db: Session, client_ids: List[str], subscription_type_id: str, start_date: datetime, end_date: datetime, method_id: str):
+    """Проверяет параметры продажи и проводит её; возвращает текст ошибки или None."""
+    sub_type = reference_data.get_subscription_type(db, subscription_type_id)
+    if not sub_type:
+        return "Тип абонемента не найден"
+    if not any(method.id == method_id for method in reference_data.get_payment_methods(db)):
+        return "Неизвестный способ оплаты"
+    if start_date.date() > end_date.date():
+        return "Дата окончания не может быть раньше даты начала"
+    if not client_ids:
+        return "Не выбран ни один клиент"
+    try:
+        crud.sell_subscriptions(db, client_ids, sub_type, start_date.date(), end_date.date(), method_id)
+    except ValueError as e:
+        return str(e)
+    except (IntegrityError, DataError):
+        db.rollback()
+        return "Не удалось оформить продажу"
+    return None
+
 @router.post("/sell_subscription")
-async def sell_subscription(
+def sell_subscription(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("cashier")),
+    user: CurrentUser = Depends(require_role("cashier")),
     client_id: str = Form(...),
     subscription_type_id: str = Form(...),
     start_date: datetime = Form(...),
     end_date: datetime = Form(...),
     method_id: str = Form(...)
 ):
-    client_sub = models.ClientSubscription(
-        id=generate_id(), 
-        client_id=client_id, 
-        subscription_type_id=subscription_type_id,
-        start_date=start_date.date(), 
-        end_date=end_date.date(), 
-        status_name='pending'
-    )
-    db.add(client_sub)
-    db.commit()
-    
-    sub_type = db.query(models.SubscriptionType).filter_by(id=subscription_type_id).first()
-    amount = sub_type.cost if sub_type else 0
+    error = _sell(db, [client_id], subscription_type_id, start_date, end_date, method_id)
+    if error:
+        return RedirectResponse(url=f"/cashier/dashboard?error={error}", status_code=303)
+    return RedirectResponse(url="/cashier/dashboard?message=Абонемент успешно продан и платеж зарегистрирован", status_code=303)
 
-    if amount > 0:
-        new_payment = models.Payment(
-            id=generate_id(), 
-            client_subscription_id=client_sub.id,
-            amount=amount, 
-            date=datetime.now().date(), 
-            method_id=method_id
-        )
-        db.add(new_payment)
-        db.commit()
 
-    return RedirectResponse(url="/cashier/dashboard?message=Абонемент успешно продан и платеж зарегистрирован", status_code=303)
+@router.post("/sell_subscriptions_bulk")
+def sell_subscriptions_bulk(
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_role("cashier")),
+    client_ids: List[str] = Form(...),
+    subscription_type_id: str = Form(...),
+    start_date: datetime = Form(...),
+    end_date: datetime = Form(...),
+    method_id: str = Form(...)
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    error = _sell(db, client_ids, subscription_type_id, start_date, end_date, method_id)
+    if error:
+        return RedirectResponse(url=f"/cashier/dashboard?error={error}", status_code=303)
+    count = len(set(client_ids))
+    return RedirectResponse(url=f"/cashier/dashboard?message=Продано абонементов: {count}", status_code=303)
 
 
 @router.post("/add_payment")
-async def add_payment(
+def add_payment(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("cashier")),
+    user: CurrentUser = Depends(require_role("cashier")),
     subscription_id: str = Form(...),
     amount: float = Form(...),
     method_id: str = Form(...)
@@ -91,17 +126,23 @@ async def add_payment(
 @router.post("/register_client")
 async def register_client(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("cashier")),
+    user: CurrentUser = Depends(require_role("cashier")),
     last_name: str = Form(...),
     first_name: str = Form(...),
     username: str = Form(...),
     password: str = Form(...)
 ):
-    new_client = crud.create_client(db, {
+    try:
+        hashed_password = await get_password_hash_async(password)
+    except PasswordHashingBusy:
+        return RedirectResponse(url="/cashier/dashboard?error=Сервер перегружен, повторите регистрацию позже", status_code=303)
+
+    # Синхронная сессия не должна блокировать цикл событий — запросы уходят в пул потоков.
+    new_client = await run_in_threadpool(crud.create_client, db, {
         "last_name": last_name, "first_name": first_name, "reg_date": datetime.now().date()
     })
-    crud.create_user(db, {
-        "username": username, "password": password, 
+    await run_in_threadpool(crud.create_user, db, {
+        "username": username, "hashed_password": hashed_password, 
         "role": "client", "client_id": new_client.id
     })
     return RedirectResponse(url="/cashier/dashboard?message=Новый клиент успешно зарегистрирован", status_code=303)
\ No newline at end of file
@@ -1,25 +1,33 @@
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from typing import Optional
 
 from database import crud, models, get_db
-from services.auth import require_role
+from services import booking, http_cache
+from services.auth import CurrentUser, require_role
+from services.validators import normalize_phone
 
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def client_dashboard(
+def client_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("client")),
+    user: CurrentUser = Depends(require_role("client")),
+    etag: Optional[str] = Depends(http_cache.etag_for(
+        "clients", "client_contacts", "client_subscriptions", "subscription_types", "statuses",
+        "training_participants", "trainings", "training_subscription_access", "sections", period=60
+    )),
     db: Session = Depends(get_db)
 ):
+    # Коллекции — selectinload: joinedload перемножил бы контакты, абонементы и записи в одной выборке.
     client = db.query(models.Client).options(
-        joinedload(models.Client.contacts),
-        joinedload(models.Client.subscriptions).joinedload(models.ClientSubscription.subscription_type),
-        joinedload(models.Client.participants).joinedload(models.TrainingParticipant.training).joinedload(models.Training.section)
+        selectinload(models.Client.contacts),
+        selectinload(models.Client.subscriptions).joinedload(models.ClientSubscription.subscription_type),
+        selectinload(models.Client.subscriptions).joinedload(models.ClientSubscription.status),
+        selectinload(models.Client.participants).joinedload(models.TrainingParticipant.training).joinedload(models.Training.section)
     ).filter_by(id=user.client_id).first()
 
     if not client:
@@ -31,7 +39,8 @@ async def client_dashboard(
         if sub.status_name == 'active' and sub.end_date >= datetime.now().date()
     }
     
-    my_training_ids = {p.training_id for p in client.participants}
+    my_participations = [p for p in client.participants if p.status_name in booking.ACTIVE_STATUSES and p.training]
+    my_training_ids = {p.training_id for p in my_participations}
     
     available_trainings = []
     if active_subscription_type_ids:
@@ -44,25 +53,29 @@ async def client_dashboard(
             ~models.Training.id.in_(my_training_ids)
         ).distinct().order_by(models.Training.start_time).all()
 
-    my_trainings_list = sorted([p.training for p in client.participants if p.training], key=lambda t: t.start_time)
+    my_trainings_list = sorted(my_participations, key=lambda p: p.training.start_time)
 
     context = {
         "request": request, "current_user": user, "client": client,
         "subscriptions": client.subscriptions, "my_trainings": my_trainings_list,
         "available_trainings": available_trainings
     }
-    return request.app.state.templates.TemplateResponse("client.html", context)
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("client.html", context), etag)
 
 
 @router.post("/book_training")
-async def book_training(
-    user: models.User = Depends(require_role("client")),
+def book_training(
+    user: CurrentUser = Depends(require_role("client")),
     db: Session = Depends(get_db),
     training_id: str = Form(...)
 ):
+    # Статусы по датам ведут фоновые задачи (services/jobs.py) — выборка идёт по индексу (client_id, status_name).
     active_subscription_type_ids = {
-        sub.subscription_type_id for sub in user.client.subscriptions 
-        if sub.status_name == 'active' and sub.end_date >= datetime.now().date()
+        type_id for type_id, in db.query(models.ClientSubscription.subscription_type_id).filter(
+            models.ClientSubscription.client_id == user.client_id,
+            models.ClientSubscription.status_name == 'active',
+            models.ClientSubscription.end_date >= datetime.now().date()
+        )
     }
     
     has_access = db.query(models.Training).filter(
@@ -76,16 +89,31 @@ async def book_training(
         return RedirectResponse(url="/client/dashboard?error=У вас нет доступа к этой тренировке.", status_code=303)
 
     try:
-        new_booking = models.TrainingParticipant(training_id=training_id, client_id=user.client_id, status_name="confirmed")
-        db.add(new_booking); db.commit()
-        return RedirectResponse(url="/client/dashboard?message=Вы успешно записаны на тренировку!", status_code=303)
+        status = booking.book(db, training_id, user.client_id)
+    except booking.BookingError as e:
+        return RedirectResponse(url=f"/client/dashboard?error={e}", status_code=303)
     except IntegrityError:
         db.rollback()
         return RedirectResponse(url="/client/dashboard?error=Вы уже записаны на эту тренировку.", status_code=303)
+    if status == booking.WAITLISTED:
+        return RedirectResponse(url="/client/dashboard?message=Мест нет — вы добавлены в лист ожидания.", status_code=303)
+    return RedirectResponse(url="/client/dashboard?message=Вы успешно записаны на тренировку!", status_code=303)
+
+@router.post("/cancel_booking")
+def cancel_booking(
+    user: CurrentUser = Depends(require_role("client")),
+    db: Session = Depends(get_db),
+    training_id: str = Form(...)
+):
+    try:
+        booking.cancel(db, training_id, user.client_id)
+    except booking.BookingError as e:
+        return RedirectResponse(url=f"/client/dashboard?error={e}", status_code=303)
+    return RedirectResponse(url="/client/dashboard?message=Запись на тренировку отменена", status_code=303)
 
 @router.post("/update_profile")
-async def update_profile(
-    user: models.User = Depends(require_role("client")),
+def update_profile(
+    user: CurrentUser = Depends(require_role("client")),
     db: Session = Depends(get_db),
     last_name: str = Form(...),
     first_name: str = Form(...),
@@ -93,17 +121,10 @@ async def update_profile(
     phone: Optional[str] = Form(None),
     email: Optional[str] = Form(None)
 ):
-    if phone:
-        cleaned_phone = "".join(filter(lambda char: char.isdigit() or char == '+', phone))
-        if cleaned_phone.startswith('+'):
-            if len(cleaned_phone) != 12 or not cleaned_phone[1:].isdigit():
-                return RedirectResponse(url="/client/dashboard?error=Неверный формат телефона: +7 и 11 цифр.", status_code=303)
-        else:
-            if len(cleaned_phone) != 11 or not cleaned_phone.isdigit():
-                return RedirectResponse(url="/client/dashboard?error=Неверный формат телефона: 11 цифр.", status_code=303)
-        phone_to_save = cleaned_phone
-    else:
-        phone_to_save = None
+    try:
+        phone_to_save = normalize_phone(phone)
+    except ValueError as e:
+        return RedirectResponse(url=f"/client/dashboard?error={e}", status_code=303)
     
     client = crud.get_client(db, user.client_id)
     if not client:
@@ -113,17 +134,6 @@ async def update_profile(
     client.first_name = first_name
     client.middle_name = middle_name
     
-    contact_details = {"phone": phone_to_save, "email": email}
-    for c_type, c_value in contact_details.items():
-        contact = db.query(models.ClientContact).filter_by(client_id=user.client_id, contact_type=c_type).first()
-        if c_value:
-            if contact:
-                contact.contact_value = c_value
-            else:
-                contact = models.ClientContact(client_id=user.client_id, contact_type=c_type, contact_value=c_value)
-                db.add(contact)
-        elif contact:
-            db.delete(contact)
-
+    crud.set_client_contacts(db, client, {"phone": phone_to_save, "email": email})
     db.commit()
     return RedirectResponse(url="/client/dashboard?message=Профиль успешно обновлен", status_code=303)
\ No newline at end of file
@@ -1,49 +1,142 @@
-from fastapi import APIRouter, Depends, Form, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Form, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError, DataError, InternalError
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 from typing import Optional, List
 
-from database import crud, models, get_db
-from services.auth import require_role
+from database import crud, models, get_db, reference_data
+from services import http_cache, schedule, series
+from services.auth import CurrentUser, require_role
+from services.templating import lazy
 from services.utils import generate_id
 
 router = APIRouter()
 
+DASHBOARD_PAGE_SIZE = 50
+REPORT_DEFAULT_DAYS = 30
+
 @router.get("/dashboard", response_class=HTMLResponse)
-async def manager_dashboard(
+def manager_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("manager")),
-    db: Session = Depends(get_db)
+    user: CurrentUser = Depends(require_role("manager")),
+    etag: Optional[str] = Depends(http_cache.etag_for(
+        "clients", "client_contacts", "staff", "positions", "trainings", "training_participants",
+        "sections", "subscription_types"
+    )),
+    db: Session = Depends(get_db),
+    tab: str = "clients",
+    clients_cursor: Optional[str] = None,
+    staff_cursor: Optional[str] = None,
+    trainings_cursor: Optional[str] = None
 ):
-    all_clients = db.query(models.Client).options(joinedload(models.Client.contacts)).order_by(models.Client.last_name).all()
-    all_staff = db.query(models.Staff).options(joinedload(models.Staff.position)).order_by(models.Staff.last_name).all()
-    all_trainings = db.query(models.Training).options(joinedload(models.Training.section), joinedload(models.Training.trainer), joinedload(models.Training.participants)).order_by(models.Training.start_time.desc()).all()
-    
-    all_sections = crud.get_sections(db)
-    all_trainers = db.query(models.Staff).join(models.Position).filter(models.Position.name == 'Тренер').all()
-    all_subscription_types = db.query(models.SubscriptionType).order_by(models.SubscriptionType.name).all()
+    try:
+        clients, clients_next = crud.get_clients(db, cursor=clients_cursor, limit=DASHBOARD_PAGE_SIZE)
+        staff, staff_next = crud.get_staff(db, cursor=staff_cursor, limit=DASHBOARD_PAGE_SIZE)
+        trainings, trainings_next = crud.get_trainings(db, cursor=trainings_cursor, limit=DASHBOARD_PAGE_SIZE)
+    except ValueError:
+        return RedirectResponse(url="/manager/dashboard?error=Некорректная ссылка на страницу списка", status_code=303)
+
+    training_clients = crud.get_training_client_names(db, [t.id for t in trainings if not t.is_group])
+    all_sections = reference_data.get_sections(db)
+    # Список тренеров для формы отрисовывается из кэша фрагментов — запрос выполнится только при промахе.
+    all_trainers = lazy(lambda: db.query(models.Staff).join(models.Position).filter(models.Position.name == 'Тренер').all())
+    all_subscription_types = reference_data.get_subscription_types(db)
 
     context = {
         "request": request,
         "current_user": user,
-        "clients": all_clients,
-        "staff": all_staff,
-        "trainings": all_trainings,
-        "all_clients": all_clients,
+        "active_tab": tab if tab in ("clients", "staff", "trainings") else "clients",
+        "clients": clients,
+        "clients_next": clients_next,
+        "staff": staff,
+        "staff_next": staff_next,
+        "trainings": trainings,
+        "trainings_next": trainings_next,
+        "training_clients": training_clients,
         "all_sections": all_sections,
         "trainers": all_trainers,
         "all_subscription_types": all_subscription_types
     }
-    return request.app.state.templates.TemplateResponse("manager.html", context)
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("manager.html", context), etag)
+
+
+@router.get("/reports", response_class=HTMLResponse)
+def manager_reports(
+    request: Request,
+    user: CurrentUser = Depends(require_role("manager")),
+    # Агрегаты отчёта меняются вместе с исходными таблицами; период по умолчанию зависит от текущей даты.
+    etag: Optional[str] = Depends(http_cache.etag_for(
+        "payments", "trainings", "training_participants", "staff",
+        "sections", "subscription_types", "payment_methods", period=3600
+    )),
+    db: Session = Depends(get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    date_to = date_to or datetime.now().date()
+    date_from = date_from or date_to - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        return RedirectResponse(url="/manager/reports?error=Начало периода позже его конца", status_code=303)
+
+    context = {
+        "request": request,
+        "current_user": user,
+        "date_from": date_from,
+        "date_to": date_to,
+        "revenue": crud.get_revenue_report(db, date_from, date_to),
+        "attendance": crud.get_attendance_report(db, date_from, date_to),
+        "method_names": {m.id: m.name for m in reference_data.get_payment_methods(db)},
+        "subscription_type_names": {t.id: t.name for t in reference_data.get_subscription_types(db)},
+        "section_names": {s.id: s.name for s in reference_data.get_sections(db)},
+    }
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("manager_reports.html", context), etag)
+
+
+@router.get("/api/free_slots")
+def api_free_slots(
+    user: CurrentUser = Depends(require_role("manager")),
+    etag: Optional[str] = Depends(http_cache.etag_for("trainings", "training_participants", period=3600)),
+    db: Session = Depends(get_db),
+    week_start: Optional[date] = None,
+    trainer_id: Optional[str] = None,
+    section_id: Optional[str] = None,
+    client_id: Optional[str] = None,
+    slot_minutes: int = Query(60, ge=15, le=240),
+    day_start: int = Query(8, ge=0, le=23),
+    day_end: int = Query(22, ge=1, le=24)
+):
+    """Сетка свободных слотов недели для тренера, секции и/или клиента."""
+    if not isinstance(user, CurrentUser):
+        return user
+    week = schedule.week_start(week_start or datetime.now().date())
+    try:
+        grid = schedule.free_slots(db, week, trainer_id, section_id, client_id, slot_minutes, day_start, day_end)
+    except schedule.ScheduleConflict as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return http_cache.with_etag(JSONResponse(grid), etag)
+
+
+@router.get("/api/clients/search")
+def search_clients(
+    user: CurrentUser = Depends(require_role("manager")),
+    etag: Optional[str] = Depends(http_cache.etag_for("clients", "client_contacts")),
+    db: Session = Depends(get_db),
+    q: str = ""
+):
+    """Подсказка клиентов для формы тренировки: по фамилии, имени или телефону."""
+    if not isinstance(user, CurrentUser):
+        return user
+    return http_cache.with_etag(JSONResponse(crud.search_clients(db, q)), etag)
 
 
 @router.get("/client/{client_id}/edit", response_class=HTMLResponse)
-async def edit_client_form(
+def edit_client_form(
     request: Request,
     client_id: str,
-    user: models.User = Depends(require_role("manager")),
+    user: CurrentUser = Depends(require_role("manager")),
     db: Session = Depends(get_db)
 ):
     client = db.query(models.Client).options(joinedload(models.Client.contacts)).filter_by(id=client_id).first()
@@ -54,10 +147,10 @@ async def edit_client_form(
     return request.app.state.templates.TemplateResponse("edit_client.html", context)
 
 @router.post("/client/{client_id}/edit")
-async def update_client_by_manager(
+def update_client_by_manager(
     client_id: str,
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("manager")),
+    user: CurrentUser = Depends(require_role("manager")),
     last_name: str = Form(...),
     first_name: str = Form(...),
     middle_name: Optional[str] = Form(None),
@@ -84,32 +177,25 @@ async def update_client_by_manager(
     
     client.last_name, client.first_name, client.middle_name, client.discount = last_name, first_name, middle_name, discount
     
-    contact_details = {"phone": phone_to_save, "email": email}
-    for c_type, c_value in contact_details.items():
-        existing_contact = db.query(models.ClientContact).filter_by(client_id=client_id, contact_type=c_type).first()
-        if c_value:
-            if existing_contact: existing_contact.contact_value = c_value
-            else: db.add(models.ClientContact(client_id=client.id, contact_type=c_type, contact_value=c_value))
-        elif existing_contact: db.delete(existing_contact)
-            
+    crud.set_client_contacts(db, client, {"phone": phone_to_save, "email": email})
     db.commit()
     return RedirectResponse(url="/manager/dashboard?message=Данные клиента обновлены", status_code=303)
 
 
 @router.get("/staff/{staff_id}/edit", response_class=HTMLResponse)
-async def edit_staff_form(request: Request, staff_id: str, user: models.User = Depends(require_role("manager")), db: Session = Depends(get_db)):
+def edit_staff_form(request: Request, staff_id: str, user: CurrentUser = Depends(require_role("manager")), db: Session = Depends(get_db)):
     staff = crud.get_single_staff(db, staff_id=staff_id)
     if not staff:
         return RedirectResponse(url="/manager/dashboard?error=Сотрудник не найден", status_code=303)
-    positions = db.query(models.Position).all()
+    positions = reference_data.get_positions(db)
     context = {"request": request, "staff": staff, "positions": positions, "current_role": user.role}
     return request.app.state.templates.TemplateResponse("edit_staff.html", context)
 
 @router.post("/staff/{staff_id}/edit")
-async def update_staff(
+def update_staff(
     staff_id: str,
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("manager")),
+    user: CurrentUser = Depends(require_role("manager")),
     last_name: str = Form(...), first_name: str = Form(...), middle_name: Optional[str] = Form(None),
     birth_date: str = Form(...), gender: str = Form(...), phone: Optional[str] = Form(None),
     passport_series: Optional[str] = Form(None), passport_number: Optional[str] = Form(None),
@@ -164,9 +250,9 @@ async def update_staff(
 
 
 @router.post("/add_training")
-async def add_training_by_manager(
+def add_training_by_manager(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("manager")),
+    user: CurrentUser = Depends(require_role("manager")),
     name: str = Form(...),
     section_id: str = Form(...),
     start_time: datetime = Form(...),
@@ -175,42 +261,49 @@ async def add_training_by_manager(
     trainer_id: Optional[str] = Form(None),
     max_participants: Optional[int] = Form(None),
     client_id: Optional[str] = Form(None),
-    allowed_subscription_type_ids: Optional[List[str]] = Form(None)
+    allowed_subscription_type_ids: Optional[List[str]] = Form(None),
+    repeat_weekdays: Optional[List[int]] = Form(None),
+    repeat_until: Optional[date] = Form(None),
+    repeat_interval: int = Form(1)
 ):
+    if not is_group and not client_id:
+        return RedirectResponse(url="/manager/dashboard?error=Для индивидуальной тренировки необходимо выбрать клиента", status_code=303)
+    if is_group and not allowed_subscription_type_ids:
+        return RedirectResponse(url="/manager/dashboard?error=Для групповой тренировки необходимо выбрать тип абонемента", status_code=303)
+    if repeat_weekdays and not is_group:
+        return RedirectResponse(url="/manager/dashboard?error=Повторять можно только групповые тренировки", status_code=303)
+    if repeat_weekdays and not repeat_until:
+        return RedirectResponse(url="/manager/dashboard?error=Укажите дату окончания повторений", status_code=303)
+    trainer_id = trainer_id or None
+
     try:
+        if repeat_weekdays:
+            rule = series.build_rule(repeat_weekdays, repeat_until, repeat_interval)
+            _, count = series.create_series(db, name, rule, start_time, end_time, section_id, trainer_id,
+                                            max_participants, allowed_subscription_type_ids)
+            db.commit()
+            return RedirectResponse(url=f"/manager/dashboard?tab=trainings&message=Создана серия из {count} тренировок", status_code=303)
+
+        schedule.check_free(db, start_time, end_time, trainer_id=trainer_id, section_id=section_id,
+                            client_id=None if is_group else client_id)
         new_training = models.Training(
             id=generate_id(),
             name=name,
             section_id=section_id,
-            trainer_id=trainer_id if trainer_id else None,
+            trainer_id=trainer_id,
             start_time=start_time,
             end_time=end_time,
             is_group=is_group,
             max_participants=1 if not is_group else max_participants
         )
         db.add(new_training)
-        db.commit()
-        db.refresh(new_training)
-        
-        message = ""
 
         if not is_group:
-            if not client_id:
-                db.delete(new_training)
-                db.commit()
-                return RedirectResponse(url="/manager/dashboard?error=Для индивидуальной тренировки необходимо выбрать клиента", status_code=303)
-            
-            participant = models.TrainingParticipant(
+            db.add(models.TrainingParticipant(
                 training_id=new_training.id, client_id=client_id, status_name='confirmed'
-            )
-            db.add(participant)
+            ))
             message = "Индивидуальная тренировка создана и клиент записан"
         else:
-            if not allowed_subscription_type_ids:
-                db.delete(new_training)
-                db.commit()
-                return RedirectResponse(url="/manager/dashboard?error=Для групповой тренировки необходимо выбрать тип абонемента", status_code=303)
-            
             allowed_subs = db.query(models.SubscriptionType).filter(
                 models.SubscriptionType.id.in_(allowed_subscription_type_ids)
             ).all()
@@ -220,7 +313,73 @@ async def add_training_by_manager(
         db.commit()
         return RedirectResponse(url=f"/manager/dashboard?message={message}", status_code=303)
 
+    except (schedule.ScheduleConflict, series.SeriesError) as e:
+        db.rollback()
+        return RedirectResponse(url=f"/manager/dashboard?error={e}", status_code=303)
     except Exception as e:
         db.rollback()
+        conflict = schedule.conflict_message(e)
+        if conflict:
+            return RedirectResponse(url=f"/manager/dashboard?error={conflict}", status_code=303)
         print(f"ОШИБКА при создании тренировки менеджером: {e}")
-        return RedirectResponse(url=f"/manager/dashboard?error=Произошла ошибка при создании тренировки", status_code=303)
\ No newline at end of file
+        return RedirectResponse(url=f"/manager/dashboard?error=Произошла ошибка при создании тренировки", status_code=303)
+
+
+@router.get("/series/{series_id}/edit", response_class=HTMLResponse)
+def edit_series_form(request: Request, series_id: str, user: CurrentUser = Depends(require_role("manager")), db: Session = Depends(get_db)):
+    if not isinstance(user, CurrentUser):
+        return user
+    training_series = db.get(models.TrainingSeries, series_id)
+    if not training_series:
+        return RedirectResponse(url="/manager/dashboard?tab=trainings&error=Серия не найдена", status_code=303)
+    upcoming = series.get_upcoming(db, series_id, datetime.now())
+    context = {
+        "request": request,
+        "series": training_series,
+        "rule_text": series.describe(training_series.rule),
+        "upcoming": upcoming,
+        "trainers": db.query(models.Staff).join(models.Position).filter(models.Position.name == 'Тренер').all(),
+    }
+    return request.app.state.templates.TemplateResponse("edit_series.html", context)
+
+@router.post("/series/{series_id}/edit")
+def update_series(
+    series_id: str,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(require_role("manager")),
+    name: str = Form(...),
+    trainer_id: Optional[str] = Form(None),
+    max_participants: int = Form(...),
+    start_at: Optional[str] = Form(None),
+    duration_minutes: Optional[str] = Form(None)
+):
+    if not isinstance(user, CurrentUser):
+        return user
+    try:
+        # Пустые поля формы — «оставить как есть».
+        start_at_value = time.fromisoformat(start_at) if start_at else None
+        duration_value = int(duration_minutes) if duration_minutes else None
+        count = series.update_series(db, series_id, datetime.now(), name, trainer_id or None, max_participants,
+                                     start_at_value, duration_value)
+        db.commit()
+    except ValueError as e:
+        # ScheduleConflict и SeriesError — тоже ValueError.
+        db.rollback()
+        error = e if isinstance(e, (schedule.ScheduleConflict, series.SeriesError)) else "Некорректное время или длительность"
+        return RedirectResponse(url=f"/manager/series/{series_id}/edit?error={error}", status_code=303)
+    except Exception as e:
+        db.rollback()
+        conflict = schedule.conflict_message(e)
+        if conflict:
+            return RedirectResponse(url=f"/manager/series/{series_id}/edit?error={conflict}", status_code=303)
+        print(f"ОШИБКА при изменении серии: {e}")
+        return RedirectResponse(url=f"/manager/series/{series_id}/edit?error=Произошла ошибка при изменении серии", status_code=303)
+    return RedirectResponse(url=f"/manager/dashboard?tab=trainings&message=Серия обновлена: изменено тренировок — {count}", status_code=303)
+
+@router.post("/series/{series_id}/cancel")
+def cancel_series(series_id: str, db: Session = Depends(get_db), user: CurrentUser = Depends(require_role("manager"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    count = series.cancel_series(db, series_id, datetime.now())
+    db.commit()
+    return RedirectResponse(url=f"/manager/dashboard?tab=trainings&message=Серия отменена: удалено предстоящих тренировок — {count}", status_code=303)
@@ -5,20 +5,23 @@ from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from typing import Optional
 
-from database import crud, models, get_db
-from services.auth import require_role
+from database import crud, models, get_db, get_pool_stats, reference_data
+from services import http_cache, rate_limit, scheduler, sql_profiler, templating
+from services.auth import CurrentUser, get_hashing_stats, get_revocation_stats, require_role
 from services.utils import generate_id
 
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def tech_admin_dashboard(
+def tech_admin_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("tech_admin")),
+    user: CurrentUser = Depends(require_role("tech_admin")),
+    # Отметка об истёкшей гарантии зависит от текущей даты.
+    etag: Optional[str] = Depends(http_cache.etag_for("equipment", "sections", period=3600)),
     db: Session = Depends(get_db)
 ):
     equipment_list = db.query(models.Equipment).all()
-    sections = crud.get_sections(db)
+    sections = reference_data.get_sections(db)
 
     for item in equipment_list:
         if item.purchase_date and item.warranty_months:
@@ -33,12 +36,12 @@ async def tech_admin_dashboard(
         "sections": sections,
         "now": datetime.now().date()
     }
-    return request.app.state.templates.TemplateResponse("tech_admin.html", context)
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("tech_admin.html", context), etag)
 
 @router.post("/add_equipment")
-async def add_equipment(
+def add_equipment(
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("tech_admin")),
+    user: CurrentUser = Depends(require_role("tech_admin")),
     name: str = Form(...),
     model: str = Form(None),
     section_id: str = Form(...),
@@ -71,10 +74,10 @@ async def add_equipment(
     return RedirectResponse(url="/tech_admin/dashboard?message=Оборудование успешно добавлено", status_code=303)
 
 @router.post("/increase_quantity/{equipment_id}")
-async def increase_quantity(
+def increase_quantity(
     equipment_id: str,
     db: Session = Depends(get_db),
-    user: models.User = Depends(require_role("tech_admin")),
+    user: CurrentUser = Depends(require_role("tech_admin")),
     amount: int = Form(...)
 ):
     equipment = db.query(models.Equipment).filter_by(id=equipment_id).first()
@@ -86,4 +89,46 @@ async def increase_quantity(
 
     equipment.quantity += amount
     db.commit()
-    return RedirectResponse(url=f"/tech_admin/dashboard?message=Количество для '{equipment.name}' увеличено на {amount}", status_code=303)
\ No newline at end of file
+    return RedirectResponse(url=f"/tech_admin/dashboard?message=Количество для '{equipment.name}' увеличено на {amount}", status_code=303)
+
+@router.get("/stats/hashing")
+async def hashing_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return get_hashing_stats()
+
+@router.get("/stats/tokens")
+async def token_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return get_revocation_stats()
+
+@router.get("/stats/login")
+async def login_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return rate_limit.get_login_stats()
+
+@router.get("/stats/pool")
+async def pool_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return get_pool_stats()
+
+@router.get("/stats/queries")
+async def query_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return sql_profiler.get_query_stats()
+
+@router.get("/stats/jobs")
+async def job_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return scheduler.get_job_stats()
+
+@router.get("/stats/templates")
+async def template_stats(user: CurrentUser = Depends(require_role("tech_admin"))):
+    if not isinstance(user, CurrentUser):
+        return user
+    return templating.get_fragment_stats()
@@ -2,21 +2,26 @@ from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
+from typing import Optional
 
-from database import models, get_db
-from services.auth import require_role
+from database import crud, models, get_db
+from services import http_cache
+from services.auth import CurrentUser, require_role
 
 router = APIRouter()
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def trainer_dashboard(
+def trainer_dashboard(
     request: Request,
-    user: models.User = Depends(require_role("trainer")),
+    user: CurrentUser = Depends(require_role("trainer")),
+    # Список «ближайших» тренировок сдвигается со временем — ETag обновляется раз в минуту.
+    etag: Optional[str] = Depends(http_cache.etag_for(
+        "trainings", "training_participants", "sections", "clients", "staff", period=60
+    )),
     db: Session = Depends(get_db)
 ):
     my_upcoming_trainings = db.query(models.Training).options(
-        joinedload(models.Training.section),
-        joinedload(models.Training.participants).joinedload(models.TrainingParticipant.client)
+        joinedload(models.Training.section)
     ).filter(
         models.Training.trainer_id == user.staff_id,
         models.Training.start_time > datetime.now()
@@ -24,9 +29,14 @@ async def trainer_dashboard(
         models.Training.start_time
     ).all()
 
+    participant_names = crud.get_training_client_names(db, [t.id for t in my_upcoming_trainings])
+    trainer = db.query(models.Staff).filter_by(id=user.staff_id).first()
+
     context = {
         "request": request,
         "current_user": user,
-        "trainings": my_upcoming_trainings
+        "trainer": trainer,
+        "trainings": my_upcoming_trainings,
+        "participant_names": participant_names
     }
-    return request.app.state.templates.TemplateResponse("trainer.html", context)
\ No newline at end of file
+    return http_cache.with_etag(request.app.state.templates.TemplateResponse("trainer.html", context), etag)
\ No newline at end of file
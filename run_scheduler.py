@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+import database  # noqa: F401 — пакет database должен загрузиться раньше services
+from services import scheduler
+
+
+def main():
+    """
+    Запускает фоновые задачи отдельным процессом — для развёртывания, где в
+    приложении они выключены (SCHEDULER_ENABLED=false). С --once выполняет каждую
+    задачу один раз и печатает число изменённых строк (удобно для cron).
+    """
+    parser = argparse.ArgumentParser(description="Фоновые задачи обслуживания статусов")
+    parser.add_argument("--once", action="store_true", help="выполнить каждую задачу один раз и выйти")
+    parser.add_argument("--batch-size", type=int, default=scheduler.SCHEDULER_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not args.once:
+        print(f"Планировщик запущен: {len(scheduler.JOBS)} задач, интервал {scheduler.SCHEDULER_INTERVAL:g} с")
+        try:
+            asyncio.run(scheduler.run_forever(args.batch_size))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    failed = False
+    for job in scheduler.JOBS:
+        try:
+            rows = scheduler.run_job(job, args.batch_size)
+        except Exception as e:
+            failed = True
+            print(f"{job.name}: ОШИБКА {e}")
+            continue
+        print(f"{job.name}: " + ("пропущена, выполняется другим процессом" if rows is None else f"изменено строк — {rows}"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,27 @@
 from .auth import (
+    CurrentUser,
     authenticate_user,
     create_access_token,
     get_current_user_from_cookie,
     require_role,
-    get_password_hash
+    get_password_hash,
+    get_password_hash_async,
+    get_hashing_stats,
+    PasswordHashingBusy,
+    revoke_token
 )
 from .utils import generate_id
 
 __all__ = [
+    'CurrentUser',
     'authenticate_user',
     'create_access_token',
     'get_current_user_from_cookie',
     'require_role',
     'get_password_hash',
+    'get_password_hash_async',
+    'get_hashing_stats',
+    'PasswordHashingBusy',
+    'revoke_token',
     'generate_id'
 ]
\ No newline at end of file
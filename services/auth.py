@@ -1,13 +1,21 @@
 from fastapi import Depends, HTTPException, status, Request
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
 from passlib.context import CryptContext
-from typing import Optional
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 from fastapi.responses import RedirectResponse
-from database import crud, get_db, models
+from database import data_versions, get_async_db, models
+from services.metrics import Histogram
 
 load_dotenv()
 
@@ -15,51 +23,234 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Как часто перечитывать версии токенов и список отзыва, если о переменах не сообщил NOTIFY.
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "30"))
+USER_REVOCATION_PREFIX = "user:"
+
+# bcrypt занимает сотни миллисекунд CPU, поэтому выполняется в отдельном пуле потоков
+# (библиотека отпускает GIL), а не в цикле событий.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+
+class CurrentUser(NamedTuple):
+    """Снимок аутентифицированного пользователя, не привязанный к сессии БД."""
+    id: str
+    username: str
+    role: str
+    client_id: Optional[str]
+    staff_id: Optional[str]
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "CurrentUser":
+        return cls(user.id, user.username, user.role, user.client_id, user.staff_id)
+
+    @classmethod
+    def from_claims(cls, payload: dict) -> "CurrentUser":
+        return cls(payload["uid"], payload["sub"], payload["role"], payload.get("cid"), payload.get("sid"))
+
+
+# Проверка токена без обращения к базе: роль и привязки берутся из подписанных
+# claims, а актуальность — из снимка в памяти процесса: версии токенов
+# пользователей, у которых она не нулевая, и неистёкшие записи revoked_tokens.
+# Снимок перечитывается раз в TOKEN_REVOCATION_REFRESH_SECONDS либо сразу после
+# изменения users/revoked_tokens (в этом процессе или, при REFERENCE_CACHE_NOTIFY,
+# в любом другом — см. data_versions).
+_revocations = {"versions": {}, "revoked": {}, "loaded_at": None, "tables_version": None, "refreshes": 0}
+_revocations_lock = asyncio.Lock()
+REVOCATION_TABLES = ("users", "revoked_tokens")
+
+def _revocations_stale() -> bool:
+    loaded_at = _revocations["loaded_at"]
+    return (loaded_at is None or time.monotonic() - loaded_at > TOKEN_REVOCATION_REFRESH_SECONDS
+            or _revocations["tables_version"] != data_versions.version(*REVOCATION_TABLES))
+
+async def refresh_revocations(db: AsyncSession, force: bool = False):
+    """Перечитывает версии токенов и список отзыва, если снимок устарел (два коротких запроса)."""
+    if not force and not _revocations_stale():
+        return
+    async with _revocations_lock:
+        if not force and not _revocations_stale():
+            return
+        # Версия таблиц — до чтения: изменение во время загрузки вызовет ещё одну.
+        tables_version = data_versions.version(*REVOCATION_TABLES)
+        versions = await db.execute(
+            select(models.User.id, models.User.token_version).where(models.User.token_version > 0)
+        )
+        revoked = await db.execute(
+            select(models.RevokedToken.jti, models.RevokedToken.expires_at)
+            .where(models.RevokedToken.expires_at > datetime.utcnow())
+        )
+        _revocations.update(
+            versions=dict(versions.all()), revoked=dict(revoked.all()),
+            loaded_at=time.monotonic(), tables_version=tables_version,
+        )
+        _revocations["refreshes"] += 1
+
+def _token_is_current(payload: dict) -> bool:
+    revoked = _revocations["revoked"]
+    return (payload.get("ver") == _revocations["versions"].get(payload["uid"], 0)
+            and payload.get("jti") not in revoked
+            and USER_REVOCATION_PREFIX + payload["uid"] not in revoked)
+
+def get_revocation_stats() -> dict:
+    loaded_at = _revocations["loaded_at"]
+    return {
+        "users_with_version": len(_revocations["versions"]),
+        "revoked_tokens": len(_revocations["revoked"]),
+        "refreshes": _revocations["refreshes"],
+        "age_seconds": None if loaded_at is None else round(time.monotonic() - loaded_at, 1),
+    }
+
+@event.listens_for(models.User, "before_update")
+def _bump_token_version(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.token_version.history.has_changes():
+        return
+    if any(state.attrs[name].history.has_changes() for name in ("username", "password", "role", "client_id", "staff_id")):
+        target.token_version = (target.token_version or 0) + 1
+
+@event.listens_for(models.User, "after_delete")
+def _revoke_deleted_user(mapper, connection, target):
+    # Строки пользователя больше нет — его токены отзываются записью 'user:<id>' до истечения самого позднего.
+    connection.execute(insert(models.RevokedToken).values(
+        jti=USER_REVOCATION_PREFIX + target.id,
+        expires_at=datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    ))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+_hash_stats_lock = threading.Lock()
+_hash_stats = {"in_flight": 0, "completed": 0, "failed": 0, "rejected": 0}
+HASH_QUEUE_WAIT = Histogram()
+HASH_DURATION = Histogram()
+
+
+class PasswordHashingBusy(Exception):
+    """Очередь на хеширование паролей переполнена — запрос нужно отклонить."""
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+def _change_hash_stat(name: str, delta: int):
+    with _hash_stats_lock:
+        _hash_stats[name] += delta
+
+async def _run_in_hash_pool(func, *args):
+    if not _hash_slots.acquire(blocking=False):
+        _change_hash_stat("rejected", 1)
+        raise PasswordHashingBusy()
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        HASH_QUEUE_WAIT.observe(started - submitted)
+        try:
+            return func(*args)
+        finally:
+            HASH_DURATION.observe(time.perf_counter() - started)
+
+    _change_hash_stat("in_flight", 1)
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(_hash_executor, job)
+    except BaseException:
+        # В том числе отмена запроса: операция не завершилась успешно.
+        _change_hash_stat("failed", 1)
+        raise
+    finally:
+        _change_hash_stat("in_flight", -1)
+        _hash_slots.release()
+    _change_hash_stat("completed", 1)
+    return result
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+def get_hashing_stats() -> dict:
+    with _hash_stats_lock:
+        stats = dict(_hash_stats)
+    stats.update({
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "queue_wait_seconds": HASH_QUEUE_WAIT.snapshot(),
+        "duration_seconds": HASH_DURATION.snapshot(),
+    })
+    return stats
+
+def create_access_token(user: models.User) -> str:
+    """Токен с ролью и привязками пользователя: проверка роли обходится без запроса к users."""
+    now = datetime.utcnow()
+    to_encode = {
+        "sub": user.username, "uid": user.id, "role": user.role,
+        "cid": user.client_id, "sid": user.staff_id, "ver": user.token_version or 0,
+        "jti": uuid.uuid4().hex, "iat": now, "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    user = crud.get_user_by_username(db, username)
-    if not user:
-        return None
-    if not verify_password(password, user.password):
-        return None
-    return user
-
-async def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("access_token")
+def _decode_token(token: Optional[str]) -> Optional[dict]:
     if not token:
         return None
-
     if token.startswith("Bearer "):
         token = token.split(" ")[1]
-
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
     except JWTError:
         return None
-    
-    user = crud.get_user_by_username(db, username=username)
+    # Токены старого формата (только sub) не принимаются — пользователь войдёт заново.
+    if not all(payload.get(claim) for claim in ("sub", "uid", "role")):
+        return None
+    return payload
+
+async def revoke_token(db: AsyncSession, token: Optional[str]):
+    """Отзывает токен до истечения его срока (выход из системы)."""
+    payload = _decode_token(token)
+    if payload is None or not payload.get("jti") or payload["jti"] in _revocations["revoked"]:
+        return
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    db.add(models.RevokedToken(jti=payload["jti"], expires_at=expires_at))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Токен уже отозван (повторный выход с копией cookie, другой воркер ещё не перечитал список).
+        await db.rollback()
+    _revocations["revoked"][payload["jti"]] = expires_at
+
+async def _get_user_by_username(db: AsyncSession, username: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[models.User]:
+    user = await _get_user_by_username(db, username)
+    if not user:
+        # Проверка с фиктивным хешем той же стоимости: по времени ответа не понять, существует ли имя.
+        await _run_in_hash_pool(pwd_context.dummy_verify)
+        return None
+    if not await verify_password_async(password, user.password):
+        return None
     return user
 
+async def get_current_user_from_cookie(request: Request, db: AsyncSession = Depends(get_async_db)):
+    payload = _decode_token(request.cookies.get("access_token"))
+    if payload is None:
+        return None
+    await refresh_revocations(db)
+    if not _token_is_current(payload):
+        return None
+    return CurrentUser.from_claims(payload)
+
 def require_role(required_role: str):
     """Фабрика зависимостей для проверки роли пользователя."""
-    async def role_checker(request: Request, user: models.User = Depends(get_current_user_from_cookie)):
+    async def role_checker(request: Request, user: CurrentUser = Depends(get_current_user_from_cookie)):
         if not user:
             return RedirectResponse(url="/?error=Требуется аутентификация", status_code=303)
         if user.role != required_role and user.role != 'admin':
@@ -0,0 +1,99 @@
+"""
+Запись клиентов на тренировки с учётом вместимости и листом ожидания.
+
+Все изменения записей одной тренировки выполняются под блокировкой строки
+trainings (SELECT ... FOR UPDATE), поэтому проверка счётчика свободных мест
+и вставка участника атомарны: при одновременной записи на последнее место одна
+транзакция ждёт другую и попадает в лист ожидания. При отмене подтверждённой
+записи освободившееся место в той же транзакции получает первый из очереди.
+"""
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import models
+
+CONFIRMED = "confirmed"
+WAITLISTED = "waitlisted"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (CONFIRMED, WAITLISTED)
+
+
+class BookingError(ValueError):
+    pass
+
+
+def _lock_training(db: Session, training_id: str) -> models.Training:
+    query = db.query(models.Training).filter(models.Training.id == training_id).populate_existing()
+    if db.get_bind().dialect.name == "sqlite":
+        # В SQLite нет блокировок строк: пустое обновление сразу берёт блокировку записи всей базы.
+        db.execute(update(models.Training).where(models.Training.id == training_id).values(id=models.Training.id))
+    else:
+        query = query.with_for_update()
+    training = query.one_or_none()
+    if training is None:
+        db.rollback()
+        raise BookingError("Тренировка не найдена.")
+    return training
+
+def _get_participant(db: Session, training_id: str, client_id: str):
+    return db.get(models.TrainingParticipant, (training_id, client_id), populate_existing=True)
+
+def _promote_waitlist(db: Session, training: models.Training) -> List[str]:
+    db.flush()
+    free_places = training.free_places
+    if free_places <= 0:
+        return []
+    waiting = db.query(models.TrainingParticipant).filter_by(
+        training_id=training.id, status_name=WAITLISTED
+    ).order_by(models.TrainingParticipant.booked_at, models.TrainingParticipant.client_id).limit(free_places).all()
+    for participant in waiting:
+        participant.status_name = CONFIRMED
+    return [participant.client_id for participant in waiting]
+
+
+def book(db: Session, training_id: str, client_id: str, allow_waitlist: bool = True) -> str:
+    """
+    Записывает клиента и фиксирует транзакцию. Возвращает CONFIRMED, если место было,
+    или WAITLISTED, если клиент поставлен в очередь. Ошибки — BookingError.
+    """
+    training = _lock_training(db, training_id)
+    if training.start_time <= datetime.now():
+        db.rollback()
+        raise BookingError("Запись на начавшуюся тренировку невозможна.")
+    participant = _get_participant(db, training_id, client_id)
+    if participant is not None and participant.status_name in ACTIVE_STATUSES:
+        db.rollback()
+        if participant.status_name == WAITLISTED:
+            raise BookingError("Вы уже в листе ожидания этой тренировки.")
+        raise BookingError("Вы уже записаны на эту тренировку.")
+
+    status = CONFIRMED if training.free_places > 0 else WAITLISTED
+    if status == WAITLISTED and not allow_waitlist:
+        db.rollback()
+        raise BookingError("Свободных мест нет.")
+    if participant is None:
+        participant = models.TrainingParticipant(training_id=training_id, client_id=client_id)
+        db.add(participant)
+    participant.status_name = status
+    participant.booked_at = datetime.now()
+    db.commit()
+    return status
+
+def cancel(db: Session, training_id: str, client_id: str) -> List[str]:
+    """Отменяет запись клиента и фиксирует транзакцию; возвращает id клиентов, переведённых из очереди."""
+    training = _lock_training(db, training_id)
+    participant = _get_participant(db, training_id, client_id)
+    if participant is None or participant.status_name not in ACTIVE_STATUSES:
+        db.rollback()
+        raise BookingError("Запись на тренировку не найдена.")
+    if training.start_time <= datetime.now():
+        db.rollback()
+        raise BookingError("Нельзя отменить запись на начавшуюся тренировку.")
+    was_confirmed = participant.status_name == CONFIRMED
+    participant.status_name = CANCELLED
+    promoted = _promote_waitlist(db, training) if was_confirmed else []
+    db.commit()
+    return promoted
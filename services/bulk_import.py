@@ -0,0 +1,185 @@
+"""
+Массовый импорт клиентов и сотрудников из CSV/XLSX.
+
+Файл читается потоково, строки проверяются теми же правилами, что и формы,
+и вставляются пакетами (COPY на Postgres). Каждый пакет фиксируется отдельно;
+если пакет отклонён базой, он повторяется построчно в точках сохранения, чтобы
+сообщить номер и причину каждой ошибочной строки, не теряя остальные.
+"""
+import codecs
+import csv
+import itertools
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from database import crud, models
+from services.utils import generate_id
+from services.validators import validate_client, validate_staff
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Русские заголовки столбцов, которые можно использовать вместо имён полей.
+COLUMN_ALIASES = {
+    "фамилия": "last_name", "имя": "first_name", "отчество": "middle_name",
+    "дата регистрации": "reg_date", "скидка": "discount", "телефон": "phone", "email": "email",
+    "дата рождения": "birth_date", "пол": "gender", "инн": "inn", "снилс": "snils",
+    "дата приема": "hire_date", "должность": "position_id", "оклад": "salary",
+    "образование": "education", "адрес": "address",
+    "серия паспорта": "passport_series", "номер паспорта": "passport_number",
+}
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.errors: List[Tuple[int, str]] = []  # (номер строки файла, сообщение)
+
+    def summary(self, limit: int = 5) -> str:
+        text = f"Импортировано: {self.imported}, с ошибками: {len(self.errors)}."
+        if self.errors:
+            details = "; ".join(f"строка {row}: {message}" for row, message in self.errors[:limit])
+            more = f" и ещё {len(self.errors) - limit}" if len(self.errors) > limit else ""
+            text += f" {details}{more}"
+        return text
+
+
+def _column_name(header) -> str:
+    name = str(header or "").strip().lower()
+    return COLUMN_ALIASES.get(name, name)
+
+def _cell_value(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        # Excel хранит ИНН/СНИЛС/телефоны как числа.
+        return str(int(value))
+    return value
+
+def _iter_csv(stream) -> Iterator[Tuple[int, dict]]:
+    text = codecs.getreader("utf-8-sig")(stream)
+    header_line = text.readline()
+    delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+    reader = csv.reader(itertools.chain([header_line], text), delimiter=delimiter)
+    columns = [_column_name(name) for name in next(reader, [])]
+    for row in reader:
+        if any(cell.strip() for cell in row):
+            yield reader.line_num, dict(zip(columns, row))
+
+def _iter_xlsx(stream) -> Iterator[Tuple[int, dict]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Для импорта XLSX установите пакет openpyxl.")
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = [_column_name(name) for name in next(rows, ())]
+        for row_number, row in enumerate(rows, start=2):
+            if any(cell is not None and str(cell).strip() for cell in row):
+                yield row_number, {column: _cell_value(cell) for column, cell in zip(columns, row)}
+    finally:
+        workbook.close()
+
+def iter_rows(stream, filename: str) -> Iterator[Tuple[int, dict]]:
+    """Построчно читает бинарный поток CSV или XLSX; возвращает (номер строки, словарь полей)."""
+    if filename.lower().endswith(".xlsx"):
+        return _iter_xlsx(stream)
+    if filename.lower().endswith((".csv", ".txt")):
+        return _iter_csv(stream)
+    raise ValueError("Поддерживаются только файлы CSV и XLSX.")
+
+
+def _db_error_message(error: Exception) -> str:
+    text = str(getattr(error, "orig", error)).lower()
+    if "inn" in text:
+        return "Сотрудник с таким ИНН уже существует."
+    if "snils" in text:
+        return "Сотрудник с таким СНИЛС уже существует."
+    if "foreign key" in text or "position" in text:
+        return "Ссылка на несуществующую запись (проверьте должность)."
+    return str(getattr(error, "orig", error)).splitlines()[0]
+
+def _load(db: Session, rows: Iterable[Tuple[int, dict]], prepare: Callable, insert_batch: Callable,
+          batch_size: int) -> ImportReport:
+    report = ImportReport()
+    driver_errors = (DBAPIError, db.get_bind().dialect.dbapi.Error)
+
+    def flush(batch):
+        try:
+            with db.begin_nested():
+                insert_batch(db, [payload for _, payload in batch])
+            db.commit()
+            report.imported += len(batch)
+            return
+        except driver_errors:
+            db.rollback()
+        # Пакет отклонён целиком — ищем виновные строки по одной.
+        for row_number, payload in batch:
+            try:
+                with db.begin_nested():
+                    insert_batch(db, [payload])
+                report.imported += 1
+            except driver_errors as e:
+                report.errors.append((row_number, _db_error_message(e)))
+        db.commit()
+
+    batch = []
+    for row_number, data in rows:
+        try:
+            batch.append((row_number, prepare(data)))
+        except ValueError as e:
+            report.errors.append((row_number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return report
+
+
+def _prepare_client(data: dict) -> dict:
+    client = validate_client(data)
+    client["id"] = generate_id()
+    return client
+
+def _insert_clients(db: Session, clients: List[dict]):
+    crud.bulk_insert(db, models.Client, [
+        {key: client[key] for key in ("id", "last_name", "first_name", "middle_name", "reg_date", "discount")}
+        for client in clients
+    ])
+    crud.bulk_insert(db, models.ClientContact, [
+        {"client_id": client["id"], "contact_type": contact_type, "contact_value": client[contact_type]}
+        for client in clients
+        for contact_type in ("phone", "email")
+        if client[contact_type]
+    ])
+
+def _prepare_staff(data: dict) -> dict:
+    staff = validate_staff(data)
+    staff["id"] = generate_id()
+    return staff
+
+def _insert_staff(db: Session, staff: List[dict]):
+    crud.bulk_insert(db, models.Staff, staff)
+
+IMPORTERS = {
+    "clients": (_prepare_client, _insert_clients),
+    "staff": (_prepare_staff, _insert_staff),
+}
+
+def import_rows(db: Session, kind: str, rows: Iterable[Tuple[int, dict]],
+                batch_size: int = DEFAULT_BATCH_SIZE) -> ImportReport:
+    if kind not in IMPORTERS:
+        raise ValueError(f"Неизвестный тип импорта: {kind}")
+    prepare, insert_batch = IMPORTERS[kind]
+    return _load(db, rows, prepare, insert_batch, batch_size)
+
+def import_file(db: Session, kind: str, stream, filename: str,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> ImportReport:
+    return import_rows(db, kind, iter_rows(stream, filename), batch_size)
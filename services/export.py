@@ -0,0 +1,144 @@
+"""
+Потоковая выгрузка клиентов, платежей и посещаемости тренировок в CSV/JSON.
+
+Строки читаются курсором на стороне сервера (yield_per → stream_results) и
+сразу отдаются клиенту порциями, поэтому память не зависит от объёма выгрузки.
+Генераторы открывают собственную сессию: зависимости FastAPI с yield
+закрываются до того, как StreamingResponse начнёт отправку тела.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased
+
+from database import SessionLocal, models
+
+EXPORT_CHUNK_ROWS = 1000
+FORMATS = {"csv": "text/csv; charset=utf-8", "json": "application/json"}
+
+
+def _clients_query(date_from: Optional[date], date_to: Optional[date]):
+    phone = aliased(models.ClientContact)
+    email = aliased(models.ClientContact)
+    query = (
+        select(
+            models.Client.id, models.Client.last_name, models.Client.first_name,
+            models.Client.middle_name, models.Client.reg_date, models.Client.discount,
+            phone.contact_value.label("phone"), email.contact_value.label("email"),
+        )
+        .outerjoin(phone, and_(phone.client_id == models.Client.id, phone.contact_type == "phone"))
+        .outerjoin(email, and_(email.client_id == models.Client.id, email.contact_type == "email"))
+        .order_by(models.Client.id)
+    )
+    if date_from:
+        query = query.where(models.Client.reg_date >= date_from)
+    if date_to:
+        query = query.where(models.Client.reg_date <= date_to)
+    return query
+
+def _payments_query(date_from: Optional[date], date_to: Optional[date]):
+    query = (
+        select(
+            models.Payment.id, models.Payment.date, models.Payment.amount,
+            models.PaymentMethod.name.label("method"),
+            models.Client.id.label("client_id"), models.Client.last_name, models.Client.first_name,
+            models.SubscriptionType.name.label("subscription_type"),
+            models.ClientSubscription.start_date, models.ClientSubscription.end_date,
+        )
+        .join(models.PaymentMethod, models.PaymentMethod.id == models.Payment.method_id)
+        .join(models.ClientSubscription, models.ClientSubscription.id == models.Payment.client_subscription_id)
+        .join(models.Client, models.Client.id == models.ClientSubscription.client_id)
+        .join(models.SubscriptionType, models.SubscriptionType.id == models.ClientSubscription.subscription_type_id)
+        .order_by(models.Payment.date, models.Payment.id)
+    )
+    if date_from:
+        query = query.where(models.Payment.date >= date_from)
+    if date_to:
+        query = query.where(models.Payment.date <= date_to)
+    return query
+
+def _trainings_query(date_from: Optional[date], date_to: Optional[date]):
+    """Одна строка на участника тренировки; тренировки без записей выгружаются с пустым клиентом."""
+    query = (
+        select(
+            models.Training.id, models.Training.name, models.Training.start_time, models.Training.end_time,
+            models.Section.name.label("section"),
+            models.Staff.last_name.label("trainer_last_name"),
+            models.Client.id.label("client_id"), models.Client.last_name.label("client_last_name"),
+            models.Client.first_name.label("client_first_name"),
+            models.TrainingParticipant.status_name.label("participant_status"),
+        )
+        .join(models.Section, models.Section.id == models.Training.section_id)
+        .outerjoin(models.Staff, models.Staff.id == models.Training.trainer_id)
+        .outerjoin(models.TrainingParticipant, models.TrainingParticipant.training_id == models.Training.id)
+        .outerjoin(models.Client, models.Client.id == models.TrainingParticipant.client_id)
+        .order_by(models.Training.start_time, models.Training.id)
+    )
+    if date_from:
+        query = query.where(models.Training.start_time >= date_from)
+    if date_to:
+        query = query.where(models.Training.start_time < datetime.combine(date_to, datetime.max.time()))
+    return query
+
+QUERIES = {
+    "clients": _clients_query,
+    "payments": _payments_query,
+    "trainings": _trainings_query,
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+def _encode_csv(columns, partitions) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл кириллицу без выбора кодировки.
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _encode_json(columns, partitions) -> Iterator[bytes]:
+    separator = "[\n"
+    for rows in partitions:
+        chunk = ",\n".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) for row in rows
+        )
+        yield (separator + chunk).encode("utf-8")
+        separator = ",\n"
+    yield ("[]" if separator == "[\n" else "\n]").encode("utf-8")
+
+def stream_export(kind: str, fmt: str, date_from: Optional[date] = None,
+                  date_to: Optional[date] = None) -> Iterator[bytes]:
+    """Генератор байтов выгрузки; kind — ключ QUERIES, fmt — ключ FORMATS."""
+    if kind not in QUERIES:
+        raise ValueError(f"Неизвестный тип выгрузки: {kind}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    query = QUERIES[kind](date_from, date_to).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    encode = _encode_csv if fmt == "csv" else _encode_json
+
+    def generate():
+        db = SessionLocal()
+        try:
+            result = db.execute(query)
+            yield from encode(list(result.keys()), result.partitions())
+            result.close()
+        finally:
+            db.close()
+    return generate()
@@ -0,0 +1,82 @@
+"""
+Условные GET для дашбордов и JSON-списков: слабый ETag по версиям таблиц.
+
+Зависимость etag_for("clients", "payments", ...) строит ETag из пользователя,
+адреса запроса (путь и параметры) и версий перечисленных таблиц из
+database.data_versions — это чтение нескольких чисел из памяти. Если клиент
+прислал такой же If-None-Match, зависимость сразу отвечает 304: маршрут не
+выполняет ни одного запроса к базе и не отрисовывает шаблон. Иначе маршрут
+получает ETag и прикрепляет его к ответу через with_etag().
+
+Версии таблиц свои у каждого процесса, поэтому в ETag входит идентификатор
+процесса: ответ другого воркера просто не совпадёт и придёт целиком. Страницы,
+содержимое которых зависит от текущего времени («ближайшие тренировки»),
+передают period — ETag меняется не реже раза в period секунд.
+
+Записи других процессов (воркеры uvicorn, run_scheduler.py, import_data.py,
+refresh_reports.py) меняют здешние версии только через NOTIFY — при
+REFERENCE_CACHE_NOTIFY=1 на Postgres. Без него каждый ETag дополнительно живёт
+не дольше HTTP_ETAG_MAX_AGE секунд (30): на столько страница может отстать от
+изменений, сделанных вне этого процесса.
+"""
+import hashlib
+import os
+import time
+import uuid
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from database import data_versions, engine, reference_data
+from services.auth import CurrentUser, get_current_user_from_cookie
+
+# Кэшировать у себя, но перед каждым показом сверять с сервером.
+CACHE_CONTROL = "private, no-cache"
+HTTP_ETAG_MAX_AGE = int(os.getenv("HTTP_ETAG_MAX_AGE", "30"))
+_INSTANCE = uuid.uuid4().hex
+
+
+def _versions_shared() -> bool:
+    """Видит ли процесс записи остальных процессов (версии таблиц рассылаются через NOTIFY)."""
+    return reference_data.REFERENCE_CACHE_NOTIFY and engine.dialect.name == "postgresql"
+
+def _effective_period(period: Optional[int]) -> Optional[int]:
+    if _versions_shared():
+        return period
+    return min(period, HTTP_ETAG_MAX_AGE) if period else HTTP_ETAG_MAX_AGE
+
+
+def compute_etag(request: Request, user: CurrentUser, tables, period: Optional[int] = None) -> str:
+    parts = [_INSTANCE, user.username, user.role, request.url.path, request.url.query,
+             repr(data_versions.version(*tables))]
+    period = _effective_period(period)
+    if period:
+        parts.append(str(int(time.time() // period)))
+    return 'W/"' + hashlib.sha1("\x1f".join(parts).encode()).hexdigest()[:20] + '"'
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Сравнение слабое: W/ и кавычки не учитываются (RFC 9110, 13.1.2).
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def etag_for(*tables: str, period: Optional[int] = None):
+    """Зависимость: ETag страницы (None для анонимного запроса); на совпадение — 304 без обращения к базе."""
+    async def dependency(request: Request, user: CurrentUser = Depends(get_current_user_from_cookie)) -> Optional[str]:
+        if not isinstance(user, CurrentUser):
+            return None
+        etag = compute_etag(request, user, tables, period)
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+        return etag
+    return dependency
+
+def with_etag(response, etag: Optional[str]):
+    """Прикрепляет ETag к успешному ответу маршрута."""
+    if etag and response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
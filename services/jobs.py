@@ -0,0 +1,104 @@
+"""
+Периодические задачи обслуживания статусов (запускаются services/scheduler.py).
+
+Каждая задача — набор UPDATE (или DELETE) по пакетам: выбираются ключи очередной
+порции строк (по индексу на статусе и дате), обновляются одним выражением и
+фиксируются отдельной короткой транзакцией. Задачи идемпотентны: повторный запуск ничего не
+меняет, поэтому после сбоя их можно просто перезапустить. Возвращают число
+изменённых строк.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import delete, exists, or_, tuple_, update
+from sqlalchemy.orm import Session
+
+from database import models, training_counters
+
+ACTIVE = "active"
+PENDING = "pending"
+EXPIRED = "expired"
+
+
+def subscription_status(start_date: date, end_date: date, today: date) -> str:
+    """Статус оплаченного абонемента по датам (так же считает триггер update_client_subscription_status)."""
+    if end_date < today:
+        return EXPIRED
+    if start_date > today:
+        return PENDING
+    return ACTIVE
+
+def _update_in_batches(db: Session, key_columns, conditions, values: dict, batch_size: int, on_batch=None) -> int:
+    """Обновляет подходящие под conditions строки порциями по batch_size, фиксируя каждую порцию."""
+    model = key_columns[0].class_
+    key = tuple_(*key_columns) if len(key_columns) > 1 else key_columns[0]
+    total = 0
+    while True:
+        keys = db.query(*key_columns).filter(*conditions).limit(batch_size).all()
+        if not keys:
+            break
+        keys = [tuple(row) if len(key_columns) > 1 else row[0] for row in keys]
+        db.execute(update(model).where(key.in_(keys)).values(values), execution_options={"synchronize_session": False})
+        if on_batch is not None:
+            on_batch(keys)
+        db.commit()
+        total += len(keys)
+        if len(keys) < batch_size:
+            break
+    return total
+
+
+def expire_subscriptions(db: Session, batch_size: int, today: date = None) -> int:
+    """Активные и ожидающие абонементы с прошедшей датой окончания → expired."""
+    today = today or datetime.now().date()
+    return _update_in_batches(db, (models.ClientSubscription.id,), (
+        models.ClientSubscription.status_name.in_((ACTIVE, PENDING)),
+        models.ClientSubscription.end_date < today,
+    ), {"status_name": EXPIRED}, batch_size)
+
+def activate_subscriptions(db: Session, batch_size: int, today: date = None) -> int:
+    """
+    Оплаченные ожидающие абонементы, срок которых начался, → active. Оплаченным считается
+    абонемент с платежом или проданный бесплатно (нулевая цена или скидка 100%).
+    """
+    today = today or datetime.now().date()
+    subscription = models.ClientSubscription
+    paid = or_(
+        exists().where(models.Payment.client_subscription_id == subscription.id),
+        exists().where(models.SubscriptionType.id == subscription.subscription_type_id, models.SubscriptionType.cost <= 0),
+        exists().where(models.Client.id == subscription.client_id, models.Client.discount >= 100),
+    )
+    return _update_in_batches(db, (subscription.id,), (
+        subscription.status_name == PENDING,
+        subscription.start_date <= today,
+        subscription.end_date >= today,
+        paid,
+    ), {"status_name": ACTIVE}, batch_size)
+
+def cancel_stale_waitlist(db: Session, batch_size: int, now: datetime = None) -> int:
+    """Лист ожидания начавшихся тренировок больше не нужен: записи → cancelled, счётчики пересчитываются."""
+    now = now or datetime.now()
+    participant = models.TrainingParticipant
+    started = exists().where(models.Training.id == participant.training_id, models.Training.start_time <= now)
+    return _update_in_batches(
+        db, (participant.training_id, participant.client_id),
+        (participant.status_name == "waitlisted", started),
+        {"status_name": "cancelled"}, batch_size,
+        # UPDATE идёт в обход ORM-событий — счётчики тренировок порции пересчитываются в той же транзакции.
+        on_batch=lambda keys: training_counters.recount(db, {training_id for training_id, _ in keys}),
+    )
+
+def purge_revoked_tokens(db: Session, batch_size: int, now: datetime = None) -> int:
+    """Записи об отозванных токенах после истечения срока самих токенов больше не нужны."""
+    now = now or datetime.utcnow()
+    token = models.RevokedToken
+    total = 0
+    while True:
+        keys = [row[0] for row in db.query(token.jti).filter(token.expires_at <= now).limit(batch_size).all()]
+        if not keys:
+            break
+        db.execute(delete(token).where(token.jti.in_(keys)), execution_options={"synchronize_session": False})
+        db.commit()
+        total += len(keys)
+        if len(keys) < batch_size:
+            break
+    return total
@@ -0,0 +1,124 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Накопительная гистограмма длительностей (в секундах) с фиксированными границами корзин."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict:
+        """Состояние гистограммы: корзины накопительные, как в формате Prometheus."""
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets, self._counts):
+                running += count
+                cumulative[str(bound)] = running
+            cumulative["+Inf"] = self.count
+            return {
+                "count": self.count,
+                "sum": round(self.sum, 6),
+                "max": round(self.max, 6),
+                "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+                "buckets": cumulative,
+            }
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class PrometheusWriter:
+    """Собирает метрики в текстовом формате Prometheus (exposition format 0.0.4)."""
+
+    def __init__(self):
+        self.lines = []
+
+    def _family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def counter(self, name: str, help_text: str, samples):
+        """samples — пары (метки, значение)."""
+        self._family(name, "counter", help_text)
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def gauge(self, name: str, help_text: str, samples):
+        self._family(name, "gauge", help_text)
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def histogram(self, name: str, help_text: str, samples):
+        """samples — пары (метки, Histogram.snapshot())."""
+        self._family(name, "histogram", help_text)
+        for labels, snapshot in samples:
+            for bound, count in snapshot["buckets"].items():
+                self.lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+            self.lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+            self.lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+def render_prometheus() -> str:
+    """Все метрики приложения: SQL по маршрутам, пулы соединений, хеширование паролей, отзыв токенов, попытки входа, фоновые задачи, кэш фрагментов."""
+    # Импорт здесь: эти модули сами импортируют services.metrics.
+    from database import get_pool_stats
+    from services import rate_limit, scheduler, sql_profiler, templating
+    from services.auth import get_hashing_stats, get_revocation_stats
+
+    writer = PrometheusWriter()
+    sql_profiler.write_metrics(writer)
+
+    pools = {label: stats for label, stats in get_pool_stats().items() if label != "settings"}
+    writer.gauge("db_pool_checked_out", "Соединения, выданные из пула",
+                 [({"pool": label}, stats["checked_out"]) for label, stats in pools.items() if "checked_out" in stats])
+    writer.counter("db_pool_timeouts_total", "Таймауты ожидания соединения из пула",
+                   [({"pool": label}, stats["timeouts"]) for label, stats in pools.items()])
+    writer.histogram("db_pool_wait_seconds", "Ожидание свободного соединения из пула",
+                     [({"pool": label}, stats["wait_seconds"]) for label, stats in pools.items() if stats["wait_seconds"]])
+
+    hashing = get_hashing_stats()
+    writer.gauge("password_hash_in_flight", "Операции хеширования в очереди и в работе", [({}, hashing["in_flight"])])
+    writer.counter("password_hash_rejected_total", "Отклонённые из-за переполнения очереди операции хеширования",
+                   [({}, hashing["rejected"])])
+    writer.counter("password_hash_failed_total", "Операции хеширования, завершившиеся ошибкой",
+                   [({}, hashing["failed"])])
+    writer.histogram("password_hash_queue_wait_seconds", "Ожидание в очереди хеширования",
+                     [({}, hashing["queue_wait_seconds"])])
+    writer.histogram("password_hash_duration_seconds", "Длительность хеширования и проверки пароля",
+                     [({}, hashing["duration_seconds"])])
+
+    revocations = get_revocation_stats()
+    writer.gauge("auth_revoked_tokens", "Неистёкшие отозванные токены в памяти процесса", [({}, revocations["revoked_tokens"])])
+    writer.counter("auth_revocation_refreshes_total", "Перечитывания списка отзыва и версий токенов",
+                   [({}, revocations["refreshes"])])
+    rate_limit.write_metrics(writer)
+
+    scheduler.write_metrics(writer)
+    templating.write_metrics(writer)
+    return writer.render()
@@ -0,0 +1,151 @@
+"""
+Ограничение частоты попыток входа (token bucket) до проверки пароля.
+
+Каждая попытка списывает по жетону из корзин IP-адреса и имени пользователя;
+успешный вход корзину имени восстанавливает — так перебор паролей к одной
+учётной записи с разных адресов упирается в её лимит, а владелец, вводящий
+верный пароль, лимит не тратит. Жетон списывается до проверки пароля, чтобы
+параллельные попытки не проскочили лимит, пока идёт bcrypt. Отклонённая
+попытка не доходит ни до запроса к users, ни до bcrypt.
+
+Корзины хранятся в памяти процесса (MemoryBucketStore), поэтому при нескольких
+воркерах лимит действует в каждом отдельно. Общее хранилище (Redis, таблица в
+базе) подключается через configure_store(): достаточно объекта с методами
+take(), reset() и __len__() той же семантики.
+
+Адрес клиента берётся из request.client: за обратным прокси uvicorn нужно
+запускать с --proxy-headers и --forwarded-allow-ips.
+
+Настройки окружения:
+    LOGIN_IP_BURST            — попыток подряд с одного адреса (20);
+    LOGIN_IP_PER_MINUTE       — восстановление корзины адреса, попыток в минуту (10);
+    LOGIN_USER_BURST          — попыток подряд для одного имени без успешного входа (5);
+    LOGIN_USER_PER_MINUTE     — восстановление корзины имени, попыток в минуту (2);
+    LOGIN_LIMIT_MAX_KEYS      — корзин в памяти, не больше (100000).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "10"))
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "2"))
+LOGIN_LIMIT_MAX_KEYS = int(os.getenv("LOGIN_LIMIT_MAX_KEYS", "100000"))
+
+
+@dataclass(frozen=True)
+class BucketLimit:
+    capacity: float
+    per_second: float
+
+
+class MemoryBucketStore:
+    """Корзины в памяти процесса; при переполнении сначала выбрасываются полные, затем самые старые."""
+
+    def __init__(self, max_keys: int = LOGIN_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (жетоны, момент подсчёта, лимит)
+        self._lock = threading.Lock()
+
+    def take(self, key: tuple, limit: BucketLimit, now: Optional[float] = None) -> float:
+        """Списывает жетон; возвращает 0, если он был, иначе — сколько секунд ждать следующего."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._tokens(key, limit, now)
+            if tokens < 1:
+                return (1 - tokens) / limit.per_second
+            self._buckets[key] = (tokens - 1, now, limit)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._evict(now)
+            return 0.0
+
+    def reset(self, key: tuple):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _tokens(self, key, limit: BucketLimit, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return limit.capacity
+        tokens, updated, _ = bucket
+        return min(limit.capacity, tokens + (now - updated) * limit.per_second)
+
+    def _evict(self, now: float):
+        # Полная корзина ничем не отличается от отсутствующей — её удаление лимит не ослабляет.
+        # Чистка идёт с запасом в 10%, чтобы при потоке новых адресов не просматривать всё на каждой вставке.
+        full = [key for key, (_, _, limit) in self._buckets.items() if self._tokens(key, limit, now) >= limit.capacity]
+        for key in full:
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys * 0.9:
+            self._buckets.popitem(last=False)
+
+
+IP_LIMIT = BucketLimit(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+USER_LIMIT = BucketLimit(LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60)
+
+_store = MemoryBucketStore()
+_stats_lock = threading.Lock()
+_stats = {"success": 0, "failure": 0, "limited_ip": 0, "limited_user": 0}
+
+
+class LoginRateLimited(Exception):
+    """Попытка входа отклонена лимитом; retry_after — секунд до следующей разрешённой."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def configure_store(store):
+    """Заменяет хранилище корзин (например, общим для всех воркеров)."""
+    global _store
+    _store = store
+
+def _user_key(username: str) -> tuple:
+    # Регистр и пробелы по краям не дают обойти лимит вариантами написания имени.
+    return ("user", username.strip().casefold())
+
+def _count(result: str):
+    with _stats_lock:
+        _stats[result] += 1
+
+def check_login(ip: Optional[str], username: str):
+    """Вызывается до поиска пользователя и bcrypt; бросает LoginRateLimited."""
+    wait = _store.take(("ip", ip or "unknown"), IP_LIMIT)
+    if wait:
+        _count("limited_ip")
+        raise LoginRateLimited(wait)
+    wait = _store.take(_user_key(username), USER_LIMIT)
+    if wait:
+        _count("limited_user")
+        raise LoginRateLimited(wait)
+
+def record_login(username: str, success: bool):
+    if success:
+        _store.reset(_user_key(username))
+    _count("success" if success else "failure")
+
+def get_login_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        "buckets": len(_store),
+        "ip_limit": {"burst": LOGIN_IP_BURST, "per_minute": LOGIN_IP_PER_MINUTE},
+        "user_limit": {"burst": LOGIN_USER_BURST, "per_minute": LOGIN_USER_PER_MINUTE},
+    })
+    return stats
+
+def write_metrics(writer):
+    stats = get_login_stats()
+    writer.counter("login_attempts_total", "Попытки входа по результату",
+                   [({"result": result}, stats[result]) for result in ("success", "failure", "limited_ip", "limited_user")])
+    writer.gauge("login_rate_limit_buckets", "Корзины ограничения попыток входа в памяти", [({}, stats["buckets"])])
@@ -0,0 +1,189 @@
+"""
+Пересечения в расписании: тренер, секция (зал) и клиент индивидуальной
+тренировки не могут быть заняты двумя тренировками одновременно.
+
+На Postgres занятость хранится как tsrange(start_time, end_time) в GiST-индексах
+ограничений исключения ex_trainings_trainer_period и ex_trainings_section_period
+(sql_objects.sql): поиск пересечений — это индексный запрос по оператору &&,
+а одновременные вставки, проскочившие проверку, отсекает само ограничение. На
+других СУБД используется B-tree (тренер/секция, start_time): длительность
+тренировки ограничена MAX_TRAINING_DURATION, поэтому пересекающиеся тренировки
+начинаются в окне [начало − MAX_TRAINING_DURATION, конец) и просмотр не уходит
+в историю.
+
+Интервалы полуоткрытые: тренировка, начинающаяся в момент окончания другой,
+с ней не пересекается.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import and_, func, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import models
+
+MAX_TRAINING_DURATION = timedelta(hours=12)
+ACTIVE_PARTICIPANT_STATUSES = ("confirmed", "waitlisted")
+CONSTRAINT_MESSAGES = {
+    "ex_trainings_trainer_period": "Тренер уже занят в это время",
+    "ex_trainings_section_period": "Секция уже занята в это время",
+}
+CONFLICT_REASONS = {"trainer": "тренер занят", "section": "секция занята", "client": "клиент записан на другую тренировку"}
+
+
+class ScheduleConflict(ValueError):
+    pass
+
+
+class BusyInterval(NamedTuple):
+    training_id: str
+    name: str
+    start_time: datetime
+    end_time: datetime
+    reasons: tuple
+
+
+def validate_period(start_time: datetime, end_time: datetime):
+    if end_time <= start_time:
+        raise ScheduleConflict("Время окончания должно быть позже времени начала")
+    if end_time - start_time > MAX_TRAINING_DURATION:
+        raise ScheduleConflict(f"Тренировка не может длиться дольше {MAX_TRAINING_DURATION.seconds // 3600} ч")
+
+def _overlaps(db: Session, start_time: datetime, end_time: datetime):
+    training = models.Training
+    if db.get_bind().dialect.name == "postgresql":
+        # То же выражение, что в ограничениях исключения, — планировщик использует их GiST-индексы.
+        return func.tsrange(training.start_time, training.end_time).op("&&")(func.tsrange(start_time, end_time))
+    return and_(
+        training.start_time < end_time,
+        training.start_time > start_time - MAX_TRAINING_DURATION,
+        training.end_time > start_time,
+    )
+
+def _busy_query(db: Session, start_time: datetime, end_time: datetime,
+                trainer_id: Optional[str], section_id: Optional[str], client_id: Optional[str]):
+    training = models.Training
+    reasons, filters = [], []
+    if trainer_id:
+        reasons.append(("trainer", training.trainer_id == trainer_id))
+    if section_id:
+        reasons.append(("section", training.section_id == section_id))
+    if client_id:
+        client_trainings = select(models.TrainingParticipant.training_id).where(
+            models.TrainingParticipant.client_id == client_id,
+            models.TrainingParticipant.status_name.in_(ACTIVE_PARTICIPANT_STATUSES),
+        )
+        reasons.append(("client", training.id.in_(client_trainings)))
+    columns = [training.id, training.name, training.start_time, training.end_time]
+    columns += [condition.label(f"is_{kind}") for kind, condition in reasons]
+    return select(*columns).where(
+        _overlaps(db, start_time, end_time), or_(*(condition for _, condition in reasons))
+    ).order_by(training.start_time), [kind for kind, _ in reasons]
+
+def find_busy(db: Session, start_time: datetime, end_time: datetime, trainer_id: Optional[str] = None,
+              section_id: Optional[str] = None, client_id: Optional[str] = None,
+              exclude_training_id: Optional[str] = None, exclude_series_id: Optional[str] = None) -> List[BusyInterval]:
+    """Тренировки, пересекающие [start_time, end_time) по тренеру, секции или клиенту, — одним запросом."""
+    if not (trainer_id or section_id or client_id):
+        return []
+    query, kinds = _busy_query(db, start_time, end_time, trainer_id, section_id, client_id)
+    if exclude_training_id:
+        query = query.where(models.Training.id != exclude_training_id)
+    if exclude_series_id:
+        query = query.where(or_(models.Training.series_id.is_(None), models.Training.series_id != exclude_series_id))
+    return [
+        BusyInterval(row.id, row.name, row.start_time, row.end_time,
+                     tuple(kind for kind in kinds if getattr(row, f"is_{kind}")))
+        for row in db.execute(query)
+    ]
+
+def _lock_for_schedule(db: Session, client_id: Optional[str]):
+    """Сериализует проверку и вставку: ограничения исключения не покрывают пересечения по клиенту."""
+    if db.get_bind().dialect.name == "sqlite":
+        # Пустое обновление сразу берёт блокировку записи всей базы (как в services/booking.py).
+        db.execute(update(models.Training).where(literal(False)).values(id=models.Training.id))
+    elif client_id:
+        db.query(models.Client.id).filter(models.Client.id == client_id).with_for_update().first()
+
+def check_free(db: Session, start_time: datetime, end_time: datetime, trainer_id: Optional[str] = None,
+               section_id: Optional[str] = None, client_id: Optional[str] = None,
+               exclude_training_id: Optional[str] = None):
+    """Проверяет период и отсутствие пересечений в текущей транзакции; иначе ScheduleConflict."""
+    validate_period(start_time, end_time)
+    _lock_for_schedule(db, client_id)
+    busy = find_busy(db, start_time, end_time, trainer_id, section_id, client_id, exclude_training_id)
+    if busy:
+        raise _conflict(busy)
+
+def check_free_periods(db: Session, periods: List[tuple], trainer_id: Optional[str] = None,
+                       section_id: Optional[str] = None, exclude_series_id: Optional[str] = None):
+    """
+    check_free для набора периодов (вхождений серии): занятость за весь охват
+    серии читается одним запросом, пересечения с каждым периодом ищутся в памяти.
+    """
+    for start_time, end_time in periods:
+        validate_period(start_time, end_time)
+    if not periods:
+        return
+    _lock_for_schedule(db, None)
+    busy = find_busy(db, min(start for start, _ in periods), max(end for _, end in periods),
+                     trainer_id, section_id, exclude_series_id=exclude_series_id)
+    conflicts = [b for b in busy if any(b.start_time < end and b.end_time > start for start, end in periods)]
+    if conflicts:
+        raise _conflict(conflicts)
+
+def _conflict(busy: List[BusyInterval]) -> ScheduleConflict:
+    first = busy[0]
+    reasons = ", ".join(CONFLICT_REASONS[kind] for kind in first.reasons)
+    more = f" и ещё {len(busy) - 1}" if len(busy) > 1 else ""
+    return ScheduleConflict(f"Пересечение с «{first.name}» {first.start_time:%d.%m.%Y %H:%M}–"
+                            f"{first.end_time:%H:%M} ({reasons}){more}")
+
+def conflict_message(error: Exception) -> Optional[str]:
+    """Текст для нарушения ограничения исключения (вставка, проскочившая проверку check_free)."""
+    # COPY (crud.bulk_insert) поднимает исключение драйвера без обёртки SQLAlchemy.
+    diag = getattr(getattr(error, "orig", error), "diag", None)
+    return CONSTRAINT_MESSAGES.get(getattr(diag, "constraint_name", None))
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def free_slots(db: Session, week_start_day: date, trainer_id: Optional[str] = None, section_id: Optional[str] = None,
+               client_id: Optional[str] = None, slot_minutes: int = 60, day_start: int = 8, day_end: int = 22) -> dict:
+    """
+    Сетка свободных слотов недели для тренера, секции и/или клиента. Все занятые
+    интервалы недели читаются одним запросом, сетка строится в памяти.
+    """
+    if not (trainer_id or section_id or client_id):
+        raise ScheduleConflict("Укажите тренера, секцию или клиента")
+    if not 0 <= day_start < day_end <= 24:
+        raise ScheduleConflict("Некорректные часы работы")
+    period_start = datetime.combine(week_start_day, time())
+    period_end = period_start + timedelta(days=7)
+    busy = find_busy(db, period_start, period_end, trainer_id, section_id, client_id)
+
+    step = timedelta(minutes=slot_minutes)
+    days = []
+    for offset in range(7):
+        day = week_start_day + timedelta(days=offset)
+        slot = datetime.combine(day, time()) + timedelta(hours=day_start)
+        day_close = datetime.combine(day, time()) + timedelta(hours=day_end)
+        slots = []
+        while slot + step <= day_close:
+            slots.append({
+                "start": slot.strftime("%H:%M"),
+                "free": not any(b.start_time < slot + step and b.end_time > slot for b in busy),
+            })
+            slot += step
+        days.append({"date": day.isoformat(), "slots": slots})
+    return {
+        "week_start": week_start_day.isoformat(),
+        "slot_minutes": slot_minutes,
+        "days": days,
+        "busy": [
+            {"id": b.training_id, "name": b.name, "start_time": b.start_time.isoformat(),
+             "end_time": b.end_time.isoformat(), "reasons": list(b.reasons)}
+            for b in busy
+        ],
+    }
@@ -0,0 +1,166 @@
+"""
+Планировщик фоновых задач services/jobs.py.
+
+По умолчанию работает внутри приложения: lifespan в main.py запускает для каждой
+задачи asyncio-задачу, которая выполняет её в пуле потоков и засыпает на
+интервал. При нескольких процессах uvicorn на Postgres задачу в каждый момент
+выполняет только один из них (pg_try_advisory_lock), остальные пропускают запуск.
+Вместо встроенного режима можно выключить его (SCHEDULER_ENABLED=false) и запускать
+отдельный процесс: python run_scheduler.py.
+
+Настройки окружения:
+    SCHEDULER_ENABLED    — запускать задачи внутри приложения (true);
+    SCHEDULER_INTERVAL   — пауза между запусками задачи, секунд (300);
+    SCHEDULER_BATCH_SIZE — строк в одной транзакции UPDATE (1000).
+"""
+import asyncio
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import engine
+from services import jobs
+from services.metrics import Histogram
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+SCHEDULER_INTERVAL = float(os.getenv("SCHEDULER_INTERVAL", "300"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "1000"))
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    func: Callable[[Session, int], int]
+    interval: float = SCHEDULER_INTERVAL
+
+    @property
+    def lock_key(self) -> int:
+        return zlib.crc32(self.name.encode())
+
+JOBS = (
+    Job("expire_subscriptions", jobs.expire_subscriptions),
+    Job("activate_subscriptions", jobs.activate_subscriptions),
+    Job("cancel_stale_waitlist", jobs.cancel_stale_waitlist),
+    Job("purge_revoked_tokens", jobs.purge_revoked_tokens),
+)
+
+
+class _JobStats:
+    def __init__(self):
+        self.duration = Histogram()
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.rows = 0
+        self.last_rows = None
+        self.last_success = None
+        self.last_error = None
+
+_stats = {job.name: _JobStats() for job in JOBS}
+_stats_lock = threading.Lock()
+
+
+def run_job(job: Job, batch_size: int = SCHEDULER_BATCH_SIZE):
+    """Выполняет задачу один раз; возвращает число изменённых строк или None, если её уже выполняет другой процесс."""
+    stats = _stats[job.name]
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        use_lock = connection.dialect.name == "postgresql"
+        if use_lock:
+            locked = connection.execute(select(func.pg_try_advisory_lock(job.lock_key))).scalar()
+            connection.commit()
+            if not locked:
+                with _stats_lock:
+                    stats.skipped += 1
+                return None
+        try:
+            # Сессия на том же соединении: блокировка держится, пока идут все пакеты задачи.
+            with Session(bind=connection) as db:
+                rows = job.func(db, batch_size)
+        except Exception as e:
+            with _stats_lock:
+                stats.runs += 1
+                stats.failures += 1
+                stats.last_error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if use_lock:
+                connection.rollback()
+                connection.execute(select(func.pg_advisory_unlock(job.lock_key)))
+                connection.commit()
+            stats.duration.observe(time.perf_counter() - started)
+    with _stats_lock:
+        stats.runs += 1
+        stats.rows += rows
+        stats.last_rows = rows
+        stats.last_success = time.time()
+    return rows
+
+async def _job_loop(job: Job, batch_size: int):
+    while True:
+        try:
+            await asyncio.to_thread(run_job, job, batch_size)
+        except Exception as e:
+            print(f"ОШИБКА фоновой задачи {job.name}: {e}")
+        await asyncio.sleep(job.interval)
+
+_tasks = []
+
+def start(batch_size: int = SCHEDULER_BATCH_SIZE):
+    """Запускает задачи в текущем цикле событий (вызывается из lifespan)."""
+    if _tasks:
+        return
+    _tasks.extend(asyncio.create_task(_job_loop(job, batch_size), name=f"job:{job.name}") for job in JOBS)
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+async def run_forever(batch_size: int = SCHEDULER_BATCH_SIZE):
+    start(batch_size)
+    await asyncio.gather(*_tasks)
+
+
+def get_job_stats() -> dict:
+    """Статистика задач для /tech_admin/stats/jobs."""
+    with _stats_lock:
+        result = {
+            job.name: {
+                "interval_seconds": job.interval,
+                "runs": _stats[job.name].runs,
+                "failures": _stats[job.name].failures,
+                "skipped": _stats[job.name].skipped,
+                "rows_total": _stats[job.name].rows,
+                "rows_last_run": _stats[job.name].last_rows,
+                "last_success": _stats[job.name].last_success,
+                "last_error": _stats[job.name].last_error,
+            }
+            for job in JOBS
+        }
+    for name, stats in result.items():
+        stats["duration_seconds"] = _stats[name].duration.snapshot()
+    return {"enabled_in_app": SCHEDULER_ENABLED, "batch_size": SCHEDULER_BATCH_SIZE, "jobs": result}
+
+def write_metrics(writer):
+    with _stats_lock:
+        stats = {name: (s.runs, s.failures, s.skipped, s.rows, s.last_success) for name, s in _stats.items()}
+    writer.counter("job_runs_total", "Запуски фоновых задач",
+                   [({"job": name}, runs) for name, (runs, _, _, _, _) in stats.items()])
+    writer.counter("job_failures_total", "Фоновые задачи, завершившиеся ошибкой",
+                   [({"job": name}, failures) for name, (_, failures, _, _, _) in stats.items()])
+    writer.counter("job_skipped_total", "Пропущенные запуски: задачу выполнял другой процесс",
+                   [({"job": name}, skipped) for name, (_, _, skipped, _, _) in stats.items()])
+    writer.counter("job_rows_total", "Строки, изменённые фоновыми задачами",
+                   [({"job": name}, rows) for name, (_, _, _, rows, _) in stats.items()])
+    writer.gauge("job_last_success_timestamp_seconds", "Время последнего успешного запуска (unix)",
+                 [({"job": name}, last) for name, (_, _, _, _, last) in stats.items() if last is not None])
+    writer.histogram("job_duration_seconds", "Длительность фоновой задачи",
+                     [({"job": name}, s.duration.snapshot()) for name, s in _stats.items()])
@@ -0,0 +1,181 @@
+"""
+Серии повторяющихся групповых тренировок («по Пн, Ср, Пт до 31 мая»).
+
+Серия хранит правило в формате RRULE (RFC 5545, разбирается dateutil) и при
+создании разворачивается в строки trainings: все вхождения проверяются на
+пересечения одним запросом (schedule.check_free_periods) и вставляются одной
+пакетной вставкой, ссылки на типы абонементов — второй. Изменение и отмена
+серии касаются только предстоящих вхождений и выполняются одним UPDATE/DELETE
+по series_id. Пакетные операции идут в обход событий ORM, поэтому агрегат
+посещаемости сдвигается явно через reports.shift_trainings().
+
+Функции не фиксируют транзакцию — это делает вызывающий.
+"""
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import List, Optional
+
+from dateutil.rrule import rrulestr
+from sqlalchemy import and_, delete, func, update
+from sqlalchemy.orm import Session
+
+from database import crud, models, reports
+from services import schedule
+from services.utils import generate_id
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+WEEKDAY_NAMES = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+MAX_OCCURRENCES = 200
+MAX_INTERVAL_WEEKS = 4
+
+
+class SeriesError(ValueError):
+    pass
+
+
+def build_rule(weekdays: List[int], until: date, interval: int = 1) -> str:
+    """Еженедельное правило: weekdays — номера дней (0 — понедельник), until включительно."""
+    days = sorted(set(weekdays))
+    if not days or not all(0 <= day <= 6 for day in days):
+        raise SeriesError("Выберите дни недели для повторения")
+    if not 1 <= interval <= MAX_INTERVAL_WEEKS:
+        raise SeriesError(f"Интервал повторения — от 1 до {MAX_INTERVAL_WEEKS} недель")
+    byday = ",".join(WEEKDAYS[day] for day in days)
+    return f"FREQ=WEEKLY;INTERVAL={interval};BYDAY={byday};UNTIL={until:%Y%m%d}T235959"
+
+def describe(rule: str) -> str:
+    """Правило по-русски для интерфейса: «каждую неделю: Пн, Ср до 31.05.2027»."""
+    parts = dict(part.split("=", 1) for part in rule.split(";"))
+    days = ", ".join(WEEKDAY_NAMES[WEEKDAYS.index(day)] for day in parts.get("BYDAY", "").split(",") if day in WEEKDAYS)
+    interval = int(parts.get("INTERVAL", 1))
+    period = "каждую неделю" if interval == 1 else f"раз в {interval} недели"
+    until = f" до {datetime.strptime(parts['UNTIL'][:8], '%Y%m%d'):%d.%m.%Y}" if "UNTIL" in parts else ""
+    return f"{period}: {days}{until}"
+
+def occurrences(rule: str, start_time: datetime, end_time: datetime) -> List[tuple]:
+    """Периоды (начало, конец) всех вхождений серии; длительность — как у первого."""
+    schedule.validate_period(start_time, end_time)
+    try:
+        starts = list(islice(rrulestr(rule, dtstart=start_time), MAX_OCCURRENCES + 1))
+    except ValueError:
+        raise SeriesError("Некорректное правило повторения")
+    if not starts:
+        raise SeriesError("По правилу не получается ни одной тренировки")
+    if len(starts) > MAX_OCCURRENCES:
+        raise SeriesError(f"Серия не может содержать больше {MAX_OCCURRENCES} тренировок")
+    duration = end_time - start_time
+    return [(start, start + duration) for start in starts]
+
+
+def create_series(db: Session, name: str, rule: str, start_time: datetime, end_time: datetime, section_id: str,
+                  trainer_id: Optional[str], max_participants: int, subscription_type_ids: List[str]) -> tuple:
+    """Создаёт серию и все её вхождения; возвращает (series_id, число тренировок)."""
+    periods = occurrences(rule, start_time, end_time)
+    schedule.check_free_periods(db, periods, trainer_id=trainer_id, section_id=section_id)
+
+    series = models.TrainingSeries(id=generate_id(), name=name, rule=rule, created_at=datetime.now())
+    db.add(series)
+    db.flush()
+    trainings = [{
+        "id": generate_id(), "name": name, "section_id": section_id, "trainer_id": trainer_id,
+        "start_time": start, "end_time": end, "is_group": True, "max_participants": max_participants,
+        "confirmed_count": 0, "waitlisted_count": 0, "series_id": series.id,
+    } for start, end in periods]
+    crud.bulk_insert(db, models.Training, trainings)
+    crud.bulk_insert(db, models.training_subscription_access, [
+        {"training_id": training["id"], "subscription_type_id": subscription_type_id}
+        for training in trainings for subscription_type_id in dict.fromkeys(subscription_type_ids)
+    ])
+    reports.shift_trainings(db, models.Training.series_id == series.id, 1)
+    return series.id, len(trainings)
+
+def _upcoming_condition(series_id: str, now: datetime):
+    return and_(models.Training.series_id == series_id, models.Training.start_time >= now)
+
+def get_upcoming(db: Session, series_id: str, now: datetime, limit: Optional[int] = None) -> List[models.Training]:
+    query = db.query(models.Training).filter(_upcoming_condition(series_id, now)).order_by(models.Training.start_time)
+    return query.limit(limit).all() if limit else query.all()
+
+def _time_values(dialect_name: str, start_minutes: Optional[int], duration_minutes: Optional[int]) -> dict:
+    """
+    Новые start_time/end_time выражениями SQL, чтобы перенести все вхождения одним
+    UPDATE: начало — полночь дня вхождения + start_minutes (или прежнее), конец —
+    начало + duration_minutes (или прежняя длительность).
+    """
+    start, end = models.Training.start_time, models.Training.end_time
+    if dialect_name == "postgresql":
+        new_start = func.date_trunc("day", start) + timedelta(minutes=start_minutes) if start_minutes is not None else start
+        duration = timedelta(minutes=duration_minutes) if duration_minutes else end - start
+        values = {"end_time": new_start + duration}
+    elif dialect_name == "sqlite":
+        # Строка в формате хранения DateTime SQLite: значения сравниваются лексикографически.
+        start_args = (start, "start of day", f"{start_minutes:+d} minutes") if start_minutes is not None else (start,)
+        duration = (f"{duration_minutes:+d} minutes" if duration_minutes else
+                    func.printf("%+d seconds", func.round((func.julianday(end) - func.julianday(start)) * 86400)))
+        new_start = func.strftime("%Y-%m-%d %H:%M:%S.000000", *start_args)
+        values = {"end_time": func.strftime("%Y-%m-%d %H:%M:%S.000000", *start_args, duration)}
+    else:
+        raise NotImplementedError(f"Изменение времени серии не поддерживает {dialect_name}")
+    if start_minutes is not None:
+        values["start_time"] = new_start
+    return values
+
+def update_series(db: Session, series_id: str, now: datetime, name: str, trainer_id: Optional[str],
+                  max_participants: int, start_at: Optional[time] = None,
+                  duration_minutes: Optional[int] = None) -> int:
+    """
+    Меняет предстоящие вхождения серии одним UPDATE: название, тренера, лимит и,
+    если заданы, время начала и длительность. Возвращает число изменённых тренировок.
+    """
+    if max_participants < 1:
+        raise SeriesError("Лимит участников должен быть не меньше 1")
+    rows = db.query(
+        models.Training.id, models.Training.section_id, models.Training.start_time,
+        models.Training.end_time, models.Training.confirmed_count
+    ).filter(_upcoming_condition(series_id, now)).all()
+    if not rows:
+        raise SeriesError("В серии не осталось предстоящих тренировок")
+    booked = max(row.confirmed_count for row in rows)
+    if max_participants < booked:
+        raise SeriesError(f"На одну из тренировок уже записано {booked} человек — лимит не может быть меньше")
+
+    periods = []
+    for row in rows:
+        start = datetime.combine(row.start_time.date(), start_at) if start_at else row.start_time
+        duration = timedelta(minutes=duration_minutes) if duration_minutes else row.end_time - row.start_time
+        periods.append((start, start + duration))
+    schedule.check_free_periods(db, periods, trainer_id=trainer_id, section_id=rows[0].section_id,
+                                exclude_series_id=series_id)
+
+    values = {"name": name, "trainer_id": trainer_id, "max_participants": max_participants}
+    if start_at or duration_minutes:
+        start_minutes = start_at.hour * 60 + start_at.minute if start_at else None
+        values.update(_time_values(db.get_bind().dialect.name, start_minutes, duration_minutes))
+
+    # Выбранные строки, а не условие по времени: после переноса вхождение могло оказаться в прошлом.
+    condition = models.Training.id.in_([row.id for row in rows])
+    reports.shift_trainings(db, condition, -1)
+    db.execute(update(models.Training).where(condition).values(values),
+               execution_options={"synchronize_session": False})
+    reports.shift_trainings(db, condition, 1)
+    db.execute(update(models.TrainingSeries).where(models.TrainingSeries.id == series_id).values(name=name))
+    return len(rows)
+
+def cancel_series(db: Session, series_id: str, now: datetime) -> int:
+    """
+    Отменяет предстоящие вхождения серии: удаляет их записи, доступы и сами
+    тренировки — по одному DELETE на таблицу. Прошедшие вхождения остаются в
+    истории; серия без вхождений удаляется. Возвращает число отменённых тренировок.
+    """
+    condition = _upcoming_condition(series_id, now)
+    upcoming_ids = db.query(models.Training.id).filter(condition).scalar_subquery()
+    reports.shift_trainings(db, condition, -1)
+    db.execute(delete(models.TrainingParticipant).where(models.TrainingParticipant.training_id.in_(upcoming_ids)),
+               execution_options={"synchronize_session": False})
+    db.execute(delete(models.training_subscription_access).where(
+        models.training_subscription_access.c.training_id.in_(upcoming_ids)))
+    cancelled = db.execute(delete(models.Training).where(condition),
+                           execution_options={"synchronize_session": False}).rowcount
+    if not db.query(models.Training.id).filter(models.Training.series_id == series_id).first():
+        db.execute(delete(models.TrainingSeries).where(models.TrainingSeries.id == series_id))
+    return cancelled
@@ -0,0 +1,202 @@
+"""
+Учёт SQL по HTTP-запросам: число выражений, суммарное время в базе и
+повторяющиеся выражения (признак N+1).
+
+QueryStatsMiddleware кладёт объект QueryStats в contextvar, а события движка
+(подписка на класс Engine — и синхронный, и асинхронный движок) дописывают в него
+каждое выполненное выражение. Обработчики в пуле потоков видят тот же объект через
+копию контекста. Итог уходит в заголовки Server-Timing и X-DB-Query-Count и в
+гистограммы по шаблону маршрута, которые отдаёт /metrics.
+
+Настройки окружения:
+    SQL_REPEAT_THRESHOLD — сколько одинаковых выражений за запрос считать N+1 (5);
+    SQL_QUERY_BUDGET     — предупреждать, если запрос выполнил больше выражений (0 — выкл.).
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from services.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50, 100, 200)
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(\?|%s|%\(\w+\)s|\$\d+|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст выражения: списки параметров IN и литералы свёрнуты."""
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    statement = _LITERAL.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """SQL-статистика одного запроса или блока query_budget()."""
+    __slots__ = ("count", "db_time", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.db_time += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> dict:
+        """Выражения, выполненные threshold и более раз: {отпечаток: сколько раз}."""
+        return {sql: n for sql, n in self.fingerprints.items() if n >= threshold}
+
+_current = ContextVar("sql_query_stats", default=None)
+_STARTED_KEY = "sql_profiler_started"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info[_STARTED_KEY] = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.pop(_STARTED_KEY, None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Проверяет, что блок выполнил не больше max_queries SQL-выражений в текущем
+    потоке, иначе поднимает QueryBudgetExceeded. Для маршрутов удобнее смотреть
+    заголовок X-DB-Query-Count (так делает benchmarks/load_test.py --query-budget).
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if stats.count > max_queries:
+        repeated = ", ".join(f"{n}× {sql[:80]}" for sql, n in stats.repeated(2).items())
+        raise QueryBudgetExceeded(f"выполнено {stats.count} SQL-выражений при бюджете {max_queries}"
+                                  + (f"; повторы: {repeated}" if repeated else ""))
+
+
+class _RouteStats:
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_time = Histogram()
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.repeated = 0
+        self.over_budget = 0
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+def _record_request(route: str, stats: QueryStats, duration: float):
+    repeated = stats.repeated()
+    over_budget = SQL_QUERY_BUDGET and stats.count > SQL_QUERY_BUDGET
+    with _routes_lock:
+        route_stats = _routes.get(route)
+        if route_stats is None:
+            route_stats = _routes[route] = _RouteStats()
+        route_stats.repeated += bool(repeated)
+        route_stats.over_budget += bool(over_budget)
+    route_stats.duration.observe(duration)
+    route_stats.db_time.observe(stats.db_time)
+    route_stats.queries.observe(stats.count)
+    for sql, n in repeated.items():
+        logger.warning("%s: выражение выполнено %d раз за запрос (N+1?): %s", route, n, sql[:300])
+    if over_budget:
+        logger.warning("%s: %d SQL-выражений при бюджете %d", route, stats.count, SQL_QUERY_BUDGET)
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware: собирает QueryStats на время запроса и добавляет заголовки с итогами."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = QueryStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.db_time * 1000:.1f};desc="{stats.count} queries", '
+                                                f'app;dur={elapsed * 1000:.1f}')
+                headers.append(QUERY_COUNT_HEADER, str(stats.count))
+            await send(message)
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            _record_request(_route_label(scope), stats, time.perf_counter() - started)
+
+
+def get_query_stats() -> dict:
+    """Статистика по маршрутам для /tech_admin/stats/queries."""
+    with _routes_lock:
+        routes = dict(_routes)
+        counters = {route: (s.repeated, s.over_budget) for route, s in routes.items()}
+    return {
+        "repeat_threshold": SQL_REPEAT_THRESHOLD,
+        "query_budget": SQL_QUERY_BUDGET or None,
+        "routes": {
+            route: {
+                "queries": s.queries.snapshot(),
+                "db_time_seconds": s.db_time.snapshot(),
+                "duration_seconds": s.duration.snapshot(),
+                "requests_with_repeats": counters[route][0],
+                "requests_over_budget": counters[route][1],
+            }
+            for route, s in sorted(routes.items())
+        },
+    }
+
+def write_metrics(writer):
+    with _routes_lock:
+        routes = sorted(_routes.items())
+    writer.histogram("http_request_duration_seconds", "Длительность HTTP-запроса",
+                     [({"route": route}, s.duration.snapshot()) for route, s in routes])
+    writer.histogram("db_queries_per_request", "Число SQL-выражений за HTTP-запрос",
+                     [({"route": route}, s.queries.snapshot()) for route, s in routes])
+    writer.histogram("db_time_per_request_seconds", "Суммарное время SQL за HTTP-запрос",
+                     [({"route": route}, s.db_time.snapshot()) for route, s in routes])
+    writer.counter("db_repeated_statement_requests_total",
+                   f"Запросы, где одно выражение выполнено {SQL_REPEAT_THRESHOLD}+ раз (N+1)",
+                   [({"route": route}, s.repeated) for route, s in routes])
+    writer.counter("db_query_budget_exceeded_total", "Запросы сверх бюджета SQL_QUERY_BUDGET",
+                   [({"route": route}, s.over_budget) for route, s in routes])
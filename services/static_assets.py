@@ -0,0 +1,128 @@
+"""
+Статика с хешем содержимого в имени и заранее сжатыми вариантами.
+
+При старте HashedStaticFiles обходит каталог, для каждого файла считает хеш
+содержимого и запоминает адрес вида /static/styles.3f2a9c0d1b7e.css — шаблоны
+получают его через static_url('styles.css'). Такой адрес меняется вместе с
+файлом, поэтому отдаётся с Cache-Control: immutable на год; обращение по
+исходному имени по-прежнему работает, но браузер каждый раз перепроверяет файл.
+
+Для текстовых файлов рядом создаются .gz и (если установлен пакет brotli) .br,
+которые отдаются вместо исходника, когда клиент их принимает. Если каталог
+недоступен для записи, варианты не создаются — сжатием займётся GZipMiddleware.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import stat
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+MIN_COMPRESS_SIZE = 256
+HASH_LENGTH = 12
+
+# Порядок — предпочтение при выборе варианта.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class HashedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, mount_path: str = "/static", **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.mount_path = mount_path.rstrip("/")
+        self._urls = {}
+        self._originals = {}
+        self._encodings = {}
+        self._build()
+
+    def _build(self):
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                    continue
+                full_path = os.path.join(root, filename)
+                name = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+                stem, extension = os.path.splitext(name)
+                hashed = f"{stem}.{digest}{extension}"
+                self._urls[name] = f"{self.mount_path}/{hashed}"
+                self._originals[hashed] = name
+                if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+                    self._encodings[name] = self._precompress(full_path, data)
+
+    def _precompress(self, full_path: str, data: bytes) -> tuple:
+        available = []
+        source_mtime = os.stat(full_path).st_mtime
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            variant = full_path + suffix
+            try:
+                if not os.path.exists(variant) or os.stat(variant).st_mtime < source_mtime:
+                    with open(variant, "wb") as f:
+                        f.write(_compress(data, encoding))
+            except OSError:
+                continue
+            available.append((encoding, suffix))
+        return tuple(available)
+
+    def url(self, name: str) -> str:
+        """Адрес файла с хешем содержимого (для шаблонов: static_url('styles.css'))."""
+        return self._urls.get(name, f"{self.mount_path}/{name}")
+
+    async def get_response(self, path: str, scope):
+        name = path.replace(os.sep, "/")
+        immutable = name in self._originals
+        name = self._originals.get(name, name)
+        response = None
+        variants = self._encodings.get(name, ())
+        if variants and scope["method"] in ("GET", "HEAD"):
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            response = self._variant_response(name, variants, accept_encoding, scope)
+        if response is None:
+            response = await super().get_response(name.replace("/", os.sep), scope)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+    def _variant_response(self, name: str, variants: tuple, accept_encoding: str, scope):
+        for encoding, suffix in variants:
+            if not _accepts(accept_encoding, encoding):
+                continue
+            full_path, stat_result = self.lookup_path(name.replace("/", os.sep) + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            # Тип — по исходному файлу, иначе styles.css.br ушёл бы как application/octet-stream.
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            response = FileResponse(full_path, stat_result=stat_result, media_type=media_type)
+            response.headers["Content-Encoding"] = encoding
+            # Несжатым ответам Vary добавляет GZipMiddleware.
+            response.headers.add_vary_header("Accept-Encoding")
+            if self.is_not_modified(response.headers, Headers(scope=scope)):
+                return NotModifiedResponse(response.headers)
+            return response
+        return None
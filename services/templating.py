@@ -0,0 +1,108 @@
+"""
+Настройка Jinja2: кэш байткода шаблонов и кэш фрагментов страниц.
+
+Скомпилированные шаблоны сохраняются в TEMPLATE_CACHE_DIR, поэтому новый воркер
+не компилирует их заново, а warm_up() загружает все шаблоны при старте.
+
+Фрагменты — редко меняющиеся блоки (списки клиентов, тренеров, типов
+абонементов в формах) — кэшируются тегом
+
+    {% cache "имя", "таблица", ... %} ... {% endcache %}
+
+Ключ — имя фрагмента и версии перечисленных таблиц из database.data_versions,
+поэтому запись в любую из них сразу даёт промах. Данные для таких блоков
+маршруты передают функциями (см. lazy()): запрос к базе выполняется только при
+промахе. Внутри фрагмента нельзя использовать данные пользователя или запроса.
+
+Настройки окружения:
+    TEMPLATE_CACHE_DIR     — каталог кэша байткода (.jinja_cache; пусто — выкл.);
+    TEMPLATE_AUTO_RELOAD   — проверять изменение файлов шаблонов (true);
+    FRAGMENT_CACHE_SIZE    — сколько фрагментов хранить (256; 0 — выкл.);
+    FRAGMENT_CACHE_TTL     — срок жизни фрагмента, секунд (300); ограничивает
+                             отставание от изменений в других воркерах без NOTIFY.
+"""
+import os
+from datetime import datetime
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from database import data_versions
+from services.cache import TTLCache
+
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").strip().lower() in ("1", "true", "yes", "on")
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))
+FRAGMENT_CACHE_TTL = float(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+
+_fragments = TTLCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
+
+
+class FragmentCacheExtension(Extension):
+    """Тег {% cache "имя", "таблица", ... %}: отрисовывает тело один раз на версию данных."""
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        if not FRAGMENT_CACHE_SIZE:
+            return caller()
+        name, *tables = args
+        # Версию берём до отрисовки: запись, зафиксированная во время неё, сменит ключ, а не испортит его.
+        key = (name, data_versions.version(*tables))
+        html = _fragments.get(key)
+        if html is None:
+            html = caller()
+            _fragments.set(key, html)
+        return Markup(html)
+
+
+def lazy(loader):
+    """Откладывает запрос до обращения из шаблона; результат запоминается на одну отрисовку."""
+    result = []
+    def load():
+        if not result:
+            result.append(loader())
+        return result[0]
+    return load
+
+def datetime_format_filter(value, format='%d.%m.%Y %H:%M'):
+    if isinstance(value, datetime): return value.strftime(format)
+    return value
+
+def create_templates(directory: str = "templates") -> Jinja2Templates:
+    bytecode_cache = None
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    templates = Jinja2Templates(directory=directory)
+    templates.env.bytecode_cache = bytecode_cache
+    templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+    templates.env.add_extension(FragmentCacheExtension)
+    templates.env.filters['datetimeformat'] = datetime_format_filter
+    return templates
+
+def warm_up(templates: Jinja2Templates):
+    """Компилирует (или берёт из кэша байткода) все шаблоны заранее, а не на первом запросе."""
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+
+
+def get_fragment_stats() -> dict:
+    return {
+        "size": len(_fragments), "max_size": FRAGMENT_CACHE_SIZE, "ttl_seconds": FRAGMENT_CACHE_TTL,
+        "hits": _fragments.hits, "misses": _fragments.misses,
+    }
+
+def write_metrics(writer):
+    writer.counter("template_fragment_cache_hits_total", "Попадания в кэш фрагментов шаблонов", [({}, _fragments.hits)])
+    writer.counter("template_fragment_cache_misses_total", "Промахи кэша фрагментов шаблонов", [({}, _fragments.misses)])
+    writer.gauge("template_fragment_cache_size", "Фрагментов в кэше", [({}, len(_fragments))])
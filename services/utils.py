@@ -1,4 +1,22 @@
+import base64
+import json
 import uuid
 
 def generate_id():
-    return str(uuid.uuid4())[:12]
\ No newline at end of file
+    return str(uuid.uuid4())[:12]
+
+def encode_cursor(payload: dict) -> str:
+    """Упаковывает позицию страницы в непрозрачный токен для передачи клиенту."""
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> dict:
+    """Распаковывает токен, созданный encode_cursor. При повреждённом токене бросает ValueError."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Некорректный курсор")
+    return payload
@@ -0,0 +1,116 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta
+
+# Все функции бросают ValueError с текстом, который можно показать пользователю.
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Оставляет в номере только цифры и '+'; формат: '+' и 11 цифр либо 11 цифр. Пустой номер — None."""
+    if not phone or not phone.strip():
+        return None
+    cleaned_phone = "".join(filter(lambda char: char.isdigit() or char == '+', phone))
+    if cleaned_phone.startswith('+'):
+        if len(cleaned_phone) != 12 or not cleaned_phone[1:].isdigit():
+            raise ValueError("Неверный формат телефона: +7 и 11 цифр.")
+    else:
+        if len(cleaned_phone) != 11 or not cleaned_phone.isdigit():
+            raise ValueError("Неверный формат телефона: 11 цифр.")
+    return cleaned_phone
+
+def parse_date(value, field_name: str) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{field_name}: неверный формат даты. Используйте ГГГГ-ММ-ДД.")
+
+def _optional(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _required(data: dict, field: str, title: str) -> str:
+    value = _optional(data.get(field))
+    if not value:
+        raise ValueError(f"Не заполнено поле «{title}».")
+    return value
+
+def validate_client(data: dict) -> dict:
+    """Проверяет данные клиента (ФИО, скидка, телефон) и приводит их к типам модели."""
+    discount_raw = _optional(data.get("discount"))
+    try:
+        discount = Decimal(discount_raw.replace(",", ".")) if discount_raw else Decimal(0)
+    except InvalidOperation:
+        raise ValueError("Скидка должна быть числом.")
+    if not 0 <= discount <= 100:
+        raise ValueError("Скидка должна быть от 0 до 100%.")
+    reg_date_raw = _optional(data.get("reg_date"))
+    email = _optional(data.get("email"))
+    if email and len(email) > 254:
+        raise ValueError("Слишком длинный email.")
+    return {
+        "last_name": _required(data, "last_name", "Фамилия"),
+        "first_name": _required(data, "first_name", "Имя"),
+        "middle_name": _optional(data.get("middle_name")),
+        "reg_date": parse_date(reg_date_raw, "Дата регистрации") if reg_date_raw else datetime.now().date(),
+        "discount": discount,
+        "phone": normalize_phone(_optional(data.get("phone"))),
+        "email": email,
+    }
+
+def validate_staff(data: dict) -> dict:
+    """Правила добавления сотрудника из панели администратора; возвращает данные для crud.create_staff."""
+    position_id = _optional(data.get("position_id"))
+    inn = _optional(data.get("inn"))
+    snils = _optional(data.get("snils"))
+    passport_series = _optional(data.get("passport_series"))
+    passport_number = _optional(data.get("passport_number"))
+
+    if not position_id:
+        raise ValueError("Необходимо выбрать должность.")
+    if not (inn and inn.isdigit() and len(inn) == 12):
+        raise ValueError("ИНН должен состоять ровно из 12 цифр.")
+    if not (snils and snils.isdigit() and len(snils) == 11):
+        raise ValueError("СНИЛС должен состоять ровно из 11 цифр.")
+    if passport_series and not (passport_series.isdigit() and len(passport_series) == 4):
+        raise ValueError("Серия паспорта должна состоять ровно из 4 цифр.")
+    if passport_number and not (passport_number.isdigit() and len(passport_number) == 6):
+        raise ValueError("Номер паспорта должен состоять ровно из 6 цифр.")
+    try:
+        birth_date_obj = datetime.strptime(str(data.get("birth_date") or "").strip(), '%Y-%m-%d').date()
+        hire_date_obj = datetime.strptime(str(data.get("hire_date") or "").strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("Неверный формат даты. Используйте ГГГГ-ММ-ДД.")
+    if hire_date_obj > datetime.now().date():
+        raise ValueError("Дата приема на работу не может быть в будущем.")
+    if relativedelta(datetime.now().date(), birth_date_obj).years < 18:
+        raise ValueError("Сотруднику должно быть не менее 18 лет.")
+
+    salary_raw = _optional(data.get("salary"))
+    try:
+        salary = Decimal(salary_raw.replace(",", ".")) if salary_raw else None
+    except InvalidOperation:
+        raise ValueError("Оклад должен быть числом.")
+
+    return {
+        "last_name": _required(data, "last_name", "Фамилия"),
+        "first_name": _required(data, "first_name", "Имя"),
+        "middle_name": _optional(data.get("middle_name")),
+        "birth_date": birth_date_obj,
+        "gender": _required(data, "gender", "Пол"),
+        "inn": inn, "snils": snils,
+        "hire_date": hire_date_obj,
+        "position_id": position_id,
+        "phone": _optional(data.get("phone")),
+        "salary": salary,
+        "education": _optional(data.get("education")),
+        "address": _optional(data.get("address")),
+        "passport_series": passport_series,
+        "passport_number": passport_number,
+    }
@@ -0,0 +1,130 @@
+// Подсказка клиентов при вводе: фамилия, имя или телефон ищутся на сервере
+// (GET <data-client-search>?q=...), выбранный клиент попадает в скрытое поле data-name.
+// С атрибутом data-multiple выбирается несколько клиентов (значки с кнопкой удаления),
+// data-required не даёт отправить форму без выбранного клиента.
+(function () {
+  const DEBOUNCE_MS = 200;
+  const MIN_LENGTH = 2;
+
+  const escapeHtml = (value) =>
+    String(value ?? "").replace(/[&<>"']/g, (char) => ({
+      "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+    })[char]);
+
+  function init(root) {
+    const input = root.querySelector("input[type=search]");
+    const results = root.querySelector(".client-search-results");
+    const selected = root.querySelector(".client-search-selected");
+    const multiple = "multiple" in root.dataset;
+    let hidden = null;
+    let items = [];
+    let active = -1;
+    let request = 0;
+    let timer = null;
+
+    if (!multiple) {
+      hidden = document.createElement("input");
+      hidden.type = "hidden";
+      hidden.name = root.dataset.name;
+      root.appendChild(hidden);
+    }
+
+    const hide = () => {
+      results.classList.add("d-none");
+      active = -1;
+    };
+
+    const hasSelection = () =>
+      multiple ? selected.querySelector("input[type=hidden]") !== null : hidden.value !== "";
+
+    function render() {
+      if (!items.length) {
+        results.innerHTML = `<div class="list-group-item text-muted">Ничего не найдено</div>`;
+      } else {
+        results.innerHTML = items.map((client, index) => `
+          <button type="button" class="list-group-item list-group-item-action${index === active ? " active" : ""}" data-index="${index}">
+            ${escapeHtml(client.name)}${client.phone ? `<small class="ms-2 text-muted">${escapeHtml(client.phone)}</small>` : ""}
+          </button>`).join("");
+      }
+      results.classList.remove("d-none");
+    }
+
+    async function search() {
+      const query = input.value.trim();
+      if (query.length < MIN_LENGTH) {
+        hide();
+        return;
+      }
+      const requestId = ++request;
+      const response = await fetch(`${root.dataset.clientSearch}?${new URLSearchParams({ q: query })}`, {
+        headers: { Accept: "application/json" },
+      });
+      if (requestId !== request) return;
+      items = response.ok ? await response.json() : [];
+      active = items.length ? 0 : -1;
+      render();
+    }
+
+    function choose(client) {
+      input.classList.remove("is-invalid");
+      if (multiple) {
+        if (!selected.querySelector(`input[value="${CSS.escape(client.id)}"]`)) {
+          selected.insertAdjacentHTML("beforeend", `
+            <span class="badge bg-light text-dark border me-1 mb-1">
+              ${escapeHtml(client.name)}
+              <input type="hidden" name="${escapeHtml(root.dataset.name)}" value="${escapeHtml(client.id)}">
+              <button type="button" class="btn-close ms-1" style="font-size: 0.6em" aria-label="Убрать"></button>
+            </span>`);
+        }
+        input.value = "";
+      } else {
+        hidden.value = client.id;
+        input.value = client.name;
+      }
+      hide();
+    }
+
+    input.addEventListener("input", () => {
+      if (!multiple) hidden.value = "";
+      clearTimeout(timer);
+      timer = setTimeout(search, DEBOUNCE_MS);
+    });
+    input.addEventListener("keydown", (event) => {
+      if (results.classList.contains("d-none") || !items.length) return;
+      if (event.key === "ArrowDown" || event.key === "ArrowUp") {
+        event.preventDefault();
+        active = (active + (event.key === "ArrowDown" ? 1 : items.length - 1)) % items.length;
+        render();
+      } else if (event.key === "Enter" && active >= 0) {
+        event.preventDefault();
+        choose(items[active]);
+      } else if (event.key === "Escape") {
+        hide();
+      }
+    });
+    input.addEventListener("blur", () => setTimeout(hide, 150));
+    // mousedown, а не click: иначе blur спрячет список раньше выбора.
+    results.addEventListener("mousedown", (event) => {
+      const button = event.target.closest("[data-index]");
+      if (button) {
+        event.preventDefault();
+        choose(items[Number(button.dataset.index)]);
+      }
+    });
+    if (selected) {
+      selected.addEventListener("click", (event) => {
+        if (event.target.classList.contains("btn-close")) event.target.closest(".badge").remove();
+      });
+    }
+    // Обязательность задаёт атрибут data-required (его может переключать форма).
+    input.form.addEventListener("submit", (event) => {
+      if ("required" in root.dataset && !hasSelection()) {
+        event.preventDefault();
+        input.classList.add("is-invalid");
+        input.focus();
+      }
+    });
+  }
+
+  document.querySelectorAll("[data-client-search]").forEach(init);
+})();